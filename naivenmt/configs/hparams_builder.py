@@ -53,8 +53,9 @@ class HParamsBuilder(object):
   def _check_model_params(self):
     """Check neural network's parameters."""
     enc_type = self.configs['encoder_type']
-    if enc_type not in ['uni', 'bi', 'gnmt']:
-      raise ValueError("encoder type must be one of ['uni', 'bi', 'gnmt'].")
+    if enc_type not in ['uni', 'bi', 'gnmt', 'conv']:
+      raise ValueError(
+        "encoder type must be one of ['uni', 'bi', 'gnmt', 'conv'].")
 
     attn = self.configs['attention']
     if attn not in ['', 'luong', 'scaled_luong', 'bahdanau', 'normed_bahdanau']:
@@ -70,10 +71,63 @@ class HParamsBuilder(object):
     if num_enc_layers != num_dec_layers:
       self.configs['pass_hidden_state'] = False
 
+    bi_encoder_devices = self.configs['bi_encoder_devices']
+    if bi_encoder_devices and len(bi_encoder_devices.split(",")) != 2:
+      raise ValueError(
+        "bi_encoder_devices must be 2 comma separated devices.")
+
+    if self.configs['precision'] not in ["float32", "float16", "bfloat16"]:
+      raise ValueError(
+        "precision must be one of ['float32', 'float16', 'bfloat16'].")
+
+    if not 0.0 <= self.configs['ema_decay'] < 1.0:
+      raise ValueError("ema_decay must be in [0, 1).")
+
+    if self.configs['max_pending_ckpts'] < 1:
+      raise ValueError("max_pending_ckpts must be > 0.")
+
+    if self.configs['accumulate_steps'] < 1:
+      raise ValueError("accumulate_steps must be > 0.")
+
+    num_replicas = self.configs['num_replicas']
+    if num_replicas < 1:
+      raise ValueError("num_replicas must be > 0.")
+    replica_devices = self.configs['replica_devices']
+    if replica_devices and len(replica_devices.split(",")) != num_replicas:
+      raise ValueError(
+        "replica_devices must be num_replicas comma separated devices.")
+
+    num_workers = self.configs['num_workers']
+    if not 0 <= self.configs['worker_index'] < num_workers:
+      raise ValueError("worker_index must be in [0, num_workers).")
+    worker_addresses = self.configs['worker_addresses']
+    if num_workers > 1 and len(worker_addresses.split(",")) != num_workers:
+      raise ValueError(
+        "worker_addresses must be num_workers comma separated addresses.")
+    if self.configs['ring_timeout_secs'] <= 0:
+      raise ValueError("ring_timeout_secs must be > 0.")
+    if num_workers > 1 and num_replicas > 1:
+      raise ValueError("num_workers and num_replicas can not be both > 1.")
+    if self.configs['task_type'] not in ["ps", "worker"]:
+      raise ValueError("task_type must be one of ['ps', 'worker'].")
+    if self.configs['cluster_file'] and (num_workers > 1 or num_replicas > 1):
+      raise ValueError(
+        "cluster_file can not be set with num_workers or num_replicas > 1.")
+
     if enc_type == "bi" and num_enc_layers % 2 != 0:
       raise ValueError(
         "num_encoder_layers must be even when encoder_type is %s." % enc_type)
 
+    if self.configs['conv_kernel_width'] < 1:
+      raise ValueError("conv_kernel_width must be > 0.")
+
+    if self.configs['attention_chunk_size'] < 0:
+      raise ValueError("attention_chunk_size must be >= 0.")
+    for layer_id in self.configs['chunked_attention_layers'].split(","):
+      if layer_id.strip() and not layer_id.strip().isdigit():
+        raise ValueError(
+          "chunked_attention_layers must be comma separated layer ids.")
+
     attn_arch = self.configs.get('attention_architecture', None)
     if attn_arch in ["gnmt"] and num_enc_layers < 2:
       raise ValueError("For gnmt attention architecture, "
@@ -238,19 +292,88 @@ class HParamsBuilder(object):
       "residual": True,
       "num_encoder_layers": 2,
       "num_decoder_layers": 2,
+      "num_heads": 8,
+      "ffn_dim": 2048,
+      "max_position_len": 1024,
+      "conv_kernel_width": 3,  # kernel width of the `conv` encoder's layers
+      "attention_chunk_size": 0,
+      "chunked_attention_layers": "",  # comma separated layer ids
+      # recompute layers' activations in backprop instead of keeping them
+      "recompute_grad": False,
+      "encoder_parallel_iterations": 32,
+      # comma separated devices of the forward and backward directions of
+      # bidirectional encoder layers, e.g. "/cpu:0,/cpu:1"
+      "bi_encoder_devices": "",
+      # comma separated devices that stacked rnn layers are placed on round
+      # robin, e.g. "/cpu:0,/cpu:1,/cpu:2,/cpu:3"
+      "layer_devices": "",
+      # number of CPU devices the host is split into
+      "num_cpu_devices": 1,
+      # number of synchronous data parallel replicas in training
+      "num_replicas": 1,
+      # comma separated devices of the replicas, e.g. "/gpu:0,/gpu:1",
+      # "/cpu:0,...,/cpu:<num_replicas - 1>" by default
+      "replica_devices": "",
+      # number of training processes, whose gradients are ring all-reduced
+      "num_workers": 1,
+      # index of this training process
+      "worker_index": 0,
+      # comma separated host:port addresses of the ring of training processes
+      "worker_addresses": "",
+      # seconds a worker waits for its neighbours of the ring before failing
+      "ring_timeout_secs": 600,
+      # JSON file of the parameter server cluster of asynchronous training
+      "cluster_file": "",
+      # task of this process in the cluster, "ps" or "worker"
+      "task_type": "worker",
+      "task_index": 0,
+      # number of partitions of each embedding, placed on the parameter servers
+      "num_embedding_partitions": 0,
+      "inter_op_parallelism_threads": 0,  # 0 for the system default
+      "intra_op_parallelism_threads": 0,  # 0 for the system default
       "infer_mode": "greedy",
+      # stop the beam search of a sentence once its best finished hypothesis
+      # can no longer be beaten
+      "beam_early_stopping": True,
+      # keep one copy of the attention memory per sentence in beam search,
+      # broadcast over its beams, instead of tiling it by beam_width
+      "beam_broadcast_memory": False,
+      # memory cap of cached translations in serving, 0 disables the cache
+      "translation_cache_max_bytes": 64 * 1024 * 1024,
       "attention": "",
       "attention_architecture": "standard",
       "output_attention": True,
       "pass_hidden_state": True,
       "optimizer": "sgd",
       "learning_rate": 1.0,
+      # compile the encoder, the decoder with the attention and the loss with
+      # XLA, for static shapes sequences are padded to their length buckets
+      "xla_jit": False,
+      # dtype of activations in training, "float32", "float16" or "bfloat16",
+      # variables are float32, evaluation and inference run in float32
+      "precision": "float32",
+      # scale the loss dynamically in training of reduced precision
+      "dynamic_loss_scaling": True,
+      # decay of the moving averages of weights maintained in training, which
+      # are used in evaluation, prediction and export, e.g. 0.9999, 0 disables
+      "ema_decay": 0.0,
+      # number of micro-batches whose gradients are applied as one update,
+      # train_steps and the learning rate schedule count updates
+      "accumulate_steps": 1,
       "subword_option": "",
       "log_device_placement": False,
       "train_steps": 1000000,
       "steps_per_stats": 100,
       "steps_per_external_eval": 500,
       "steps_per_eval": 100,
+      "log_step_count_steps": 100,
+      "save_ckpt_steps": 1000,
+      "keep_ckpt_max": 5,
+      # write checkpoints from a background thread, the training loop only
+      # copies the variables to host memory
+      "async_ckpt": False,
+      # number of checkpoint copies waiting to be written before saves block
+      "max_pending_ckpts": 1,
       "average_ckpts": False
     }
 
@@ -17,6 +17,8 @@ import abc
 
 import tensorflow as tf
 
+from naivenmt.decoders.beam_search_decoder import EarlyStoppingBeamSearchDecoder
+
 
 class DecoderInterface(abc.ABC):
   """Decoder interface."""
@@ -27,9 +29,10 @@ class DecoderInterface(abc.ABC):
 
     Args:
       mode: mode
-      encoder_outputs: A tensor, encoder's output
+      encoder_outputs: A tensor, encoder's output, shape is [T, B, D] if the
+        decoder is time major, else [B, T, D]
       encoder_state: A tensor, encoder's state
-      labels: A dict of tensors.
+      labels: A dict of tensors, in the same major as encoder_outputs.
       src_seq_len: A tensor, source sequence length
 
     Returns:
@@ -69,6 +72,7 @@ class AbstractDecoder(DecoderInterface):
     self.time_major = params.time_major
     self.beam_width = params.beam_width
     self.length_penalty_weight = params.length_penalty_weight
+    self.beam_early_stopping = params.beam_early_stopping
     self.infer_batch_size = params.infer_batch_size
     self.target_vocab_size = params.target_vocab_size
     self.tgt_max_len_infer = params.tgt_max_len_infer
@@ -107,10 +111,22 @@ class AbstractDecoder(DecoderInterface):
         length_penalty_weight = self.length_penalty_weight
 
         max_iteration = self._get_max_infer_iterations(src_seq_len)
-        start_tokens = tf.fill([self.infer_batch_size], self.sos_id)
+        # the last batch may be smaller than infer_batch_size
+        start_tokens = tf.fill([tf.size(src_seq_len)], self.sos_id)
         end_token = self.eos_id
 
-        if beam_width > 0:
+        if beam_width > 0 and self.beam_early_stopping:
+          decoder = EarlyStoppingBeamSearchDecoder(
+            cell=cell,
+            embedding=self.embedding,
+            start_tokens=start_tokens,
+            end_token=end_token,
+            initial_state=decoder_initial_state,
+            beam_width=beam_width,
+            maximum_iterations=max_iteration,
+            output_layer=output_layer,
+            length_penalty_weight=length_penalty_weight)
+        elif beam_width > 0:
           decoder = tf.contrib.seq2seq.BeamSearchDecoder(
             cell=cell,
             embedding=self.embedding,
@@ -15,6 +15,7 @@
 
 import tensorflow as tf
 
+from naivenmt.decoders import beam_attention
 from naivenmt.decoders.basic_decoder import BasicDecoder
 
 
@@ -28,7 +29,7 @@ class AttentionDecoder(BasicDecoder):
                eos_id,
                scope="attention_decoder",
                dtype=tf.float32):
-    super(BasicDecoder, self).__init__(
+    super(AttentionDecoder, self).__init__(
       params=params,
       embedding=embedding,
       sos_id=sos_id,
@@ -42,6 +43,7 @@ class AttentionDecoder(BasicDecoder):
     self.attention_architecture = params.attention_architecture
     self.output_attention = params.output_attention
     self.pass_hidden_state = params.pass_hidden_state
+    self.beam_broadcast_memory = params.beam_broadcast_memory
 
   def _build_decoder_cell(self,
                           mode,
@@ -52,31 +54,26 @@ class AttentionDecoder(BasicDecoder):
     attention_architecture = self.attention_architecture
     assert attention_architecture == "standard"
 
+    # attention mechanisms take batch major memory
     if self.time_major:
       memory = tf.transpose(encoder_outputs, [1, 0, 2])
     else:
       memory = encoder_outputs
 
-    if mode == tf.estimator.ModeKeys.PREDICT and self.beam_width > 0:
-      memory = tf.contrib.seq2seq.tile_batch(
-        memory, multiplier=self.beam_width)
-      sequence_length = tf.contrib.seq2seq.tile_batch(
-        sequence_length, multiplier=self.beam_width)
-      encoder_state = tf.contrib.seq2seq.tile_batch(
-        encoder_state, multiplier=self.beam_width)
-      batch_size = tf.size(sequence_length) * self.beam_width
-    else:
-      batch_size = tf.size(sequence_length)
+    memory, sequence_length, encoder_state, batch_size, beam_width = (
+      self._tile_for_beam_search(
+        mode, memory, sequence_length, encoder_state))
 
     attention_mechanism = self._attention_mechanism_fn(
-      attention_option, self.num_units, memory, sequence_length)
+      attention_option, self.num_units, memory, sequence_length, beam_width)
 
     cell = self._create_rnn_cell(mode)
     alignment_history = (
         mode == tf.estimator.ModeKeys.PREDICT and self.beam_width == 0)
-    cell = tf.contrib.seq2seq.AttentionWrapper(
+    cell = self._attention_wrapper(
       cell,
       attention_mechanism,
+      beam_width,
       attention_layer_size=self.num_units,
       alignment_history=alignment_history,
       output_attention=self.output_attention,
@@ -90,11 +87,62 @@ class AttentionDecoder(BasicDecoder):
 
     return cell, decoder_initial_state
 
+  def _tile_for_beam_search(self,
+                            mode,
+                            memory,
+                            sequence_length,
+                            encoder_state):
+    """Tile the inputs of the decoder cell for the beams of beam search.
+
+    With `beam_broadcast_memory`, the memory and its length keep one copy per
+    sentence, and attention broadcasts them over the beams instead.
+
+    Args:
+      mode: A string constant, mode
+      memory: A tensor, batch major encoder's outputs
+      sequence_length: A tensor, source sequence length
+      encoder_state: A tensor, encoder's state
+
+    Returns:
+      memory: A tensor, memory of attention
+      sequence_length: A tensor, length of memory
+      encoder_state: A tensor, encoder's state, tiled for beam search
+      batch_size: A scalar tensor, batch size of the decoder cell
+      beam_width: A integer, beam width that attention broadcasts memory over,
+        0 if memory is tiled or not used by beam search
+    """
+    batch_size = tf.size(sequence_length)
+    if mode != tf.estimator.ModeKeys.PREDICT or self.beam_width <= 0:
+      return memory, sequence_length, encoder_state, batch_size, 0
+
+    encoder_state = tf.contrib.seq2seq.tile_batch(
+      encoder_state, multiplier=self.beam_width)
+    batch_size *= self.beam_width
+    if self.beam_broadcast_memory:
+      return (memory, sequence_length, encoder_state, batch_size,
+              self.beam_width)
+    memory = tf.contrib.seq2seq.tile_batch(
+      memory, multiplier=self.beam_width)
+    sequence_length = tf.contrib.seq2seq.tile_batch(
+      sequence_length, multiplier=self.beam_width)
+    return memory, sequence_length, encoder_state, batch_size, 0
+
+  @staticmethod
+  def _attention_wrapper(cell, attention_mechanism, beam_width=0, **kwargs):
+    """Create `AttentionWrapper`, or `BeamAttentionWrapper` if attention
+    broadcasts memory over `beam_width` beams."""
+    if beam_width > 0:
+      return beam_attention.BeamAttentionWrapper(
+        cell, attention_mechanism, beam_width, **kwargs)
+    return tf.contrib.seq2seq.AttentionWrapper(
+      cell, attention_mechanism, **kwargs)
+
   @staticmethod
   def _attention_mechanism_fn(option,
                               num_units,
                               memory,
-                              sequence_length):
+                              sequence_length,
+                              beam_width=0):
     """Create attention mechanism.
 
     Args:
@@ -102,7 +150,22 @@ class AttentionDecoder(BasicDecoder):
       num_units: A integer, number of units
       memory: A tensor, encoder's outputs
       sequence_length: A tensor, source sequence length
+      beam_width: A integer, beam width that memory is broadcast over, 0 for
+        memory of the same batch size as queries
     """
+    if beam_width > 0:
+      if option in ["luong", "scaled_luong"]:
+        return beam_attention.BeamLuongAttention(
+          num_units, memory, beam_width,
+          memory_sequence_length=sequence_length,
+          scale=(option == "scaled_luong"))
+      elif option in ["bahdanau", "normed_bahdanau"]:
+        return beam_attention.BeamBahdanauAttention(
+          num_units, memory, beam_width,
+          memory_sequence_length=sequence_length,
+          normalize=(option == "normed_bahdanau"))
+      raise ValueError("Invalid attention option: %s" % option)
+
     if option == "luong":
       mechanism = tf.contrib.seq2seq.LuongAttention(
         num_units, memory, memory_sequence_length=sequence_length)
@@ -16,6 +16,8 @@
 import tensorflow as tf
 
 from naivenmt.decoders.abstract_decoder import AbstractDecoder
+from naivenmt.layers import rnn_cells
+from naivenmt.utils import device_utils
 
 
 class BasicDecoder(AbstractDecoder):
@@ -44,6 +46,8 @@ class BasicDecoder(AbstractDecoder):
     self.dropout = params.dropout
     self.beam_width = params.beam_width
     self.infer_mode = params.infer_mode
+    # devices that stacked layers are placed on round robin
+    self.layer_devices = device_utils.parse_devices(params.layer_devices)
 
   def _build_decoder_cell(self,
                           mode,
@@ -60,6 +64,11 @@ class BasicDecoder(AbstractDecoder):
     return cells, decoder_initial_state
 
   def _create_rnn_cell(self, mode, residual_fn=None):
+    return tf.contrib.rnn.MultiRNNCell(
+      self._create_rnn_cell_list(mode, residual_fn))
+
+  def _create_rnn_cell_list(self, mode, residual_fn=None):
+    """Create a cell for each layer, placed round robin on `layer_devices`."""
     cells = []
     for i in range(self.num_decoder_layers):
       res = (i >= self.num_decoder_layers - self.num_decoder_residual_layers)
@@ -71,9 +80,11 @@ class BasicDecoder(AbstractDecoder):
         mode=mode,
         residual_connection=res,
         residual_fn=residual_fn)
+      if self.layer_devices:
+        cell = tf.nn.rnn_cell.DeviceWrapper(
+          cell, device_utils.layer_device(self.layer_devices, i))
       cells.append(cell)
-    # cells = cells[0] if len(cells) == 1 else cells
-    return tf.contrib.rnn.MultiRNNCell(cells)
+    return cells
 
   @staticmethod
   def _build_single_cell(unit_type,
@@ -88,11 +99,20 @@ class BasicDecoder(AbstractDecoder):
     if unit_type == "lstm":
       single_cell = tf.nn.rnn_cell.LSTMCell(
         num_units, forget_bias=forget_bias)
+    elif unit_type in ["lstm_block", "lstm_block_fused"]:
+      # `LSTMBlockFusedCell` can not be stepped, its variables are the same as
+      # `LSTMBlockCell`'s, which is used for the stepped cells.
+      single_cell = tf.contrib.rnn.LSTMBlockCell(
+        num_units, forget_bias=forget_bias)
     elif unit_type == "gru":
       single_cell = tf.nn.rnn_cell.GRUCell(num_units)
+    elif unit_type == "gru_block":
+      single_cell = tf.contrib.rnn.GRUBlockCellV2(num_units)
     elif unit_type == "layer_norm_lstm":
-      single_cell = tf.contrib.rnn.LayerNormBasicLSTMCell(
-        num_units, forget_bias=forget_bias, layer_norm=True)
+      single_cell = rnn_cells.LayerNormLSTMCell(
+        num_units, forget_bias=forget_bias)
+    elif unit_type == "sru":
+      single_cell = rnn_cells.SRUCell(num_units, forget_bias=forget_bias)
     elif unit_type == "nas":
       single_cell = tf.contrib.rnn.NASCell(num_units)
     else:
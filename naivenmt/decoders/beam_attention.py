@@ -0,0 +1,212 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Attention of beam search over untiled memory.
+
+The memory, its keys and lengths keep one copy per sentence, [B, T, D], while
+queries, alignments and states are [B * beam_width, ...], in the order of
+`tile_batch` and `BeamSearchDecoder`. Beams of a sentence are broadcast over
+its memory, so the memory and the projection of keys do not grow with the
+beam width. Variables are the same as the tiled attention's.
+"""
+
+import math
+
+import tensorflow as tf
+
+
+class _BeamAttentionMixin(object):
+  """Scores of beams against the untiled memory."""
+
+  def _init_beams(self, beam_width, memory_sequence_length):
+    self.beam_width = beam_width
+    self._beam_memory_sequence_length = memory_sequence_length
+
+  def _split_beams(self, t):
+    """[B * beam_width, D] -> [B, beam_width, D]"""
+    return tf.reshape(t, [-1, self.beam_width, t.get_shape()[-1].value])
+
+  def _beam_alignments(self, score):
+    """Masked softmax of score [B, beam_width, T], merged to [B * beam, T]."""
+    max_time = tf.shape(score)[2]
+    if self._beam_memory_sequence_length is not None:
+      mask = tf.sequence_mask(self._beam_memory_sequence_length, max_time)
+      mask = tf.tile(tf.expand_dims(mask, 1), [1, self.beam_width, 1])
+      score_mask_values = tf.fill(
+        tf.shape(score), score.dtype.as_numpy_dtype(-math.inf))
+      score = tf.where(mask, score, score_mask_values)
+    alignments = tf.nn.softmax(score)
+    return tf.reshape(alignments, [-1, max_time])
+
+
+class BeamLuongAttention(_BeamAttentionMixin,
+                         tf.contrib.seq2seq.LuongAttention):
+  """`LuongAttention` of beams over untiled memory."""
+
+  def __init__(self,
+               num_units,
+               memory,
+               beam_width,
+               memory_sequence_length=None,
+               scale=False,
+               name="LuongAttention"):
+    super(BeamLuongAttention, self).__init__(
+      num_units, memory,
+      memory_sequence_length=memory_sequence_length,
+      scale=scale,
+      name=name)
+    self._init_beams(beam_width, memory_sequence_length)
+
+  def __call__(self, query, state):
+    with tf.variable_scope(None, "luong_attention", [query]):
+      # [B, beam, D] x [B, T, D] -> [B, beam, T]
+      score = tf.matmul(self._split_beams(query), self.keys, transpose_b=True)
+      if self._scale:
+        g = tf.get_variable(
+          "attention_g", dtype=score.dtype,
+          initializer=tf.ones_initializer(), shape=())
+        score = g * score
+    alignments = self._beam_alignments(score)
+    return alignments, alignments
+
+
+class BeamBahdanauAttention(_BeamAttentionMixin,
+                            tf.contrib.seq2seq.BahdanauAttention):
+  """`BahdanauAttention` of beams over untiled memory."""
+
+  def __init__(self,
+               num_units,
+               memory,
+               beam_width,
+               memory_sequence_length=None,
+               normalize=False,
+               name="BahdanauAttention"):
+    super(BeamBahdanauAttention, self).__init__(
+      num_units, memory,
+      memory_sequence_length=memory_sequence_length,
+      normalize=normalize,
+      name=name)
+    self._init_beams(beam_width, memory_sequence_length)
+
+  def __call__(self, query, state):
+    with tf.variable_scope(None, "bahdanau_attention", [query]):
+      processed_query = self.query_layer(query) if self.query_layer else query
+      # [B, beam, 1, D] + [B, 1, T, D] -> [B, beam, T, D]
+      processed_query = tf.expand_dims(self._split_beams(processed_query), 2)
+      keys = tf.expand_dims(self.keys, 1)
+      num_units = self.keys.get_shape()[2].value
+      dtype = processed_query.dtype
+      v = tf.get_variable("attention_v", [num_units], dtype=dtype)
+      if self._normalize:
+        g = tf.get_variable(
+          "attention_g", dtype=dtype,
+          initializer=tf.constant_initializer(math.sqrt(1.0 / num_units)),
+          shape=())
+        b = tf.get_variable(
+          "attention_b", [num_units], dtype=dtype,
+          initializer=tf.zeros_initializer())
+        normed_v = g * v * tf.rsqrt(tf.reduce_sum(tf.square(v)))
+        score = tf.reduce_sum(
+          normed_v * tf.tanh(keys + processed_query + b), [3])
+      else:
+        score = tf.reduce_sum(v * tf.tanh(keys + processed_query), [3])
+    alignments = self._beam_alignments(score)
+    return alignments, alignments
+
+
+class BeamAttentionWrapper(tf.contrib.seq2seq.AttentionWrapper):
+  """`AttentionWrapper` of a cell stepping [B * beam_width] beams, whose
+  attention mechanisms hold the untiled memory of B sentences."""
+
+  def __init__(self, cell, attention_mechanism, beam_width, **kwargs):
+    super(BeamAttentionWrapper, self).__init__(
+      cell, attention_mechanism, **kwargs)
+    self._beam_width = beam_width
+
+  def _batch_size_checks(self, batch_size, error_message):
+    return [tf.assert_equal(
+      batch_size, attention_mechanism.batch_size * self._beam_width,
+      message=error_message)
+      for attention_mechanism in self._attention_mechanisms]
+
+  def _compute_attention(self,
+                         attention_mechanism,
+                         cell_output,
+                         attention_state,
+                         attention_layer):
+    alignments, next_attention_state = attention_mechanism(
+      cell_output, state=attention_state)
+    values = attention_mechanism.values
+    # [B, beam, T] x [B, T, D] -> [B, beam, D]
+    context = tf.matmul(
+      tf.reshape(alignments, [-1, self._beam_width, tf.shape(alignments)[1]]),
+      values)
+    context = tf.reshape(context, [-1, values.get_shape()[-1].value])
+    if attention_layer is not None:
+      attention = attention_layer(tf.concat([cell_output, context], 1))
+    else:
+      attention = context
+    return attention, alignments, next_attention_state
+
+  def call(self, inputs, state):
+    """The same as `AttentionWrapper.call`, with the context of each beam
+    computed over the memory of its sentence."""
+    cell_inputs = self._cell_input_fn(inputs, state.attention)
+    cell_output, next_cell_state = self._cell(cell_inputs, state.cell_state)
+
+    cell_batch_size = (
+      cell_output.shape[0].value or tf.shape(cell_output)[0])
+    error_message = (
+      "When applying BeamAttentionWrapper %s: " % self.name +
+      "Non-matching batch sizes between the memory (encoder output) times "
+      "beam_width and the query (decoder output).")
+    with tf.control_dependencies(
+            self._batch_size_checks(cell_batch_size, error_message)):
+      cell_output = tf.identity(cell_output, name="checked_cell_output")
+
+    if self._is_multi:
+      previous_attention_state = state.attention_state
+      previous_alignment_history = state.alignment_history
+    else:
+      previous_attention_state = [state.attention_state]
+      previous_alignment_history = [state.alignment_history]
+
+    all_alignments = []
+    all_attentions = []
+    all_attention_states = []
+    maybe_all_histories = []
+    for i, attention_mechanism in enumerate(self._attention_mechanisms):
+      attention, alignments, next_attention_state = self._compute_attention(
+        attention_mechanism, cell_output, previous_attention_state[i],
+        self._attention_layers[i] if self._attention_layers else None)
+      alignment_history = previous_alignment_history[i].write(
+        state.time, alignments) if self._alignment_history else ()
+
+      all_attention_states.append(next_attention_state)
+      all_alignments.append(alignments)
+      all_attentions.append(attention)
+      maybe_all_histories.append(alignment_history)
+
+    attention = tf.concat(all_attentions, 1)
+    next_state = tf.contrib.seq2seq.AttentionWrapperState(
+      time=state.time + 1,
+      cell_state=next_cell_state,
+      attention=attention,
+      attention_state=self._item_or_tuple(all_attention_states),
+      alignments=self._item_or_tuple(all_alignments),
+      alignment_history=self._item_or_tuple(maybe_all_histories))
+
+    if self._output_attention:
+      return attention, next_state
+    return cell_output, next_state
@@ -0,0 +1,111 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import tensorflow as tf
+
+
+def length_penalty(sequence_length, penalty_weight):
+  """Length penalty of https://arxiv.org/abs/1609.08144, the same as
+  `BeamSearchDecoder`'s."""
+  return tf.pow((5.0 + tf.to_float(sequence_length)) / 6.0, penalty_weight)
+
+
+def early_stopping_mask(log_probs,
+                        finished,
+                        lengths,
+                        length_penalty_weight,
+                        maximum_iterations):
+  """Whether the search of each sentence can stop.
+
+  Log probabilities only decrease as hypotheses grow, so the score of an alive
+  hypothesis is bounded by its log probability normalized by the length
+  penalty of `maximum_iterations`. The search of a sentence can stop once its
+  best finished hypothesis scores at least the best bound of alive ones.
+
+  Args:
+    log_probs: A tensor of shape [B, beam_width], log probabilities of beams
+    finished: A bool tensor of shape [B, beam_width]
+    lengths: A tensor of shape [B, beam_width], lengths of beams
+    length_penalty_weight: A float, length penalty weight
+    maximum_iterations: A integer or scalar tensor, max decoding steps
+
+  Returns:
+    A bool tensor of shape [B]
+  """
+  lowest = tf.fill(tf.shape(log_probs), log_probs.dtype.min)
+  finished_scores = tf.where(
+    finished, log_probs / length_penalty(lengths, length_penalty_weight),
+    lowest)
+  alive_bounds = tf.where(
+    finished, lowest,
+    log_probs / length_penalty(maximum_iterations, length_penalty_weight))
+  return tf.greater_equal(
+    tf.reduce_max(finished_scores, axis=1),
+    tf.reduce_max(alive_bounds, axis=1))
+
+
+class EarlyStoppingBeamSearchDecoder(tf.contrib.seq2seq.BeamSearchDecoder):
+  """`BeamSearchDecoder` that finishes the search of each sentence once its
+  best finished hypothesis can no longer be beaten.
+
+  All beams of a stopped sentence are marked finished, so they only emit EOS
+  and leave their scores unchanged, and `dynamic_decode` returns as soon as
+  every sentence stopped, instead of waiting for every beam to end.
+  """
+
+  def __init__(self,
+               cell,
+               embedding,
+               start_tokens,
+               end_token,
+               initial_state,
+               beam_width,
+               maximum_iterations,
+               output_layer=None,
+               length_penalty_weight=0.0):
+    """Init decoder.
+
+    Args:
+      cell: A RNNCell
+      embedding: A tensor, target embedding
+      start_tokens: A tensor of shape [B], start tokens
+      end_token: A scalar tensor, end token
+      initial_state: Initial state of the cell, tiled by beam_width
+      beam_width: A integer, beam width
+      maximum_iterations: A integer or scalar tensor, max decoding steps,
+        which bounds the length penalty of alive hypotheses
+      output_layer: A layer, applied to the cell's outputs
+      length_penalty_weight: A float, length penalty weight
+    """
+    super(EarlyStoppingBeamSearchDecoder, self).__init__(
+      cell=cell,
+      embedding=embedding,
+      start_tokens=start_tokens,
+      end_token=end_token,
+      initial_state=initial_state,
+      beam_width=beam_width,
+      output_layer=output_layer,
+      length_penalty_weight=length_penalty_weight)
+    self._maximum_iterations = maximum_iterations
+
+  def step(self, time, inputs, state, name=None):
+    outputs, next_state, next_inputs, finished = super(
+      EarlyStoppingBeamSearchDecoder, self).step(time, inputs, state, name)
+    stopped = early_stopping_mask(
+      next_state.log_probs, finished, next_state.lengths,
+      self._length_penalty_weight, self._maximum_iterations)
+    finished = tf.logical_or(finished, tf.expand_dims(stopped, 1))
+    next_state = next_state._replace(finished=finished)
+    return outputs, next_state, next_inputs, finished
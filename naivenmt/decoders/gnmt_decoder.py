@@ -29,7 +29,7 @@ class GNMTDecoder(AttentionDecoder):
                eos_id,
                scope="gnmt_decoder",
                dtype=tf.float32):
-    super(AttentionDecoder, self).__init__(
+    super(GNMTDecoder, self).__init__(
       params=params,
       embedding=embedding,
       sos_id=sos_id,
@@ -45,36 +45,31 @@ class GNMTDecoder(AttentionDecoder):
     attention_option = self.attention
     attention_architecture = self.attention_architecture
     if attention_architecture == "standard":
-      return super(AttentionDecoder, self)._build_decoder_cell(
+      return super(GNMTDecoder, self)._build_decoder_cell(
         mode, encoder_outputs, encoder_state, sequence_length)
 
+    # attention mechanisms take batch major memory
     if self.time_major:
       memory = tf.transpose(encoder_outputs, [1, 0, 2])
     else:
       memory = encoder_outputs
 
-    if mode == tf.estimator.ModeKeys.PREDICT and self.beam_width > 0:
-      memory = tf.contrib.seq2seq.tile_batch(
-        memory, multiplier=self.beam_width)
-      sequence_length = tf.contrib.seq2seq.tile_batch(
-        sequence_length, multiplier=self.beam_width)
-      encoder_state = tf.contrib.seq2seq.tile_batch(
-        encoder_state, multiplier=self.beam_width)
-      batch_size = tf.size(sequence_length) * self.beam_width
-    else:
-      batch_size = tf.size(sequence_length)
+    memory, sequence_length, encoder_state, batch_size, beam_width = (
+      self._tile_for_beam_search(
+        mode, memory, sequence_length, encoder_state))
 
     attention_mechanism = self._attention_mechanism_fn(
-      attention_option, self.num_units, memory, sequence_length)
+      attention_option, self.num_units, memory, sequence_length, beam_width)
 
-    cell_list = self._create_rnn_cell(mode, residual_fn=self._residual_fn)
+    cell_list = self._create_rnn_cell_list(mode, residual_fn=self._residual_fn)
     attention_cell = cell_list.pop(0)
 
     alignment_history = (
         mode == tf.estimator.ModeKeys.PREDICT and self.beam_width == 0)
-    attention_cell = tf.contrib.seq2seq.AttentionWrapper(
+    attention_cell = self._attention_wrapper(
       attention_cell,
       attention_mechanism,
+      beam_width,
       attention_layer_size=self.num_units,
       alignment_history=alignment_history,
       output_attention=self.output_attention,
@@ -1,79 +1,313 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import functools
+
 import tensorflow as tf
 
-from naivenmt.decoders import DecoderInterface
+from naivenmt.decoders.abstract_decoder import DecoderInterface
 from naivenmt.layers import transformer
+from naivenmt.utils import recompute_utils
 
 
 class TransformerDecoder(DecoderInterface):
+  """Transformer decoder, as described in https://arxiv.org/abs/1706.03762."""
 
   def __init__(self,
+               params,
                embedding,
-               num_layers=6,
-               model_dim=512,
-               num_heads=8,
-               ffn_dim=2948,
-               dropout=0.2,
-               dtype=None,
-               scope=None):
-    self.embedding = embedding
-    self.num_layers = num_layers
-    self.model_dim = model_dim
-    self.num_heads = num_heads
-    self.ffn_dim = ffn_dim
-    self.dropout = dropout
-    self.dtype = dtype or tf.float32
-    self.scope = scope or "decoder"
-
-  def decode(self,
-             mode,
-             encoder_outputs,
-             encoder_state,
-             labels,
-             src_seq_len):
-    self.dropout = self.dropout if mode == tf.estimator.ModeKeys.TRAIN else 0.0
-
-    with tf.variable_scope(self.scope, dtype=self.dtype) as scope:
-      decoder_embedding_input = self.embedding.decoder_embedding_input(
-        labels.target_input_ids)
-      decoder_embedding_input += transformer.positional_encoding(
-        decoder_embedding_input, self.model_dim)
-
-      padding_mask = transformer.padding_mask(
-        decoder_embedding_input, decoder_embedding_input, self.num_heads)
-
-      sequence_mask = transformer.sequence_mask(
-        decoder_embedding_input, self.num_heads, self.dtype)
-
-      self_attention_mask = tf.greater(padding_mask + sequence_mask, 0)
-      context_attention_mask = transformer.padding_mask(
-        encoder_outputs, decoder_embedding_input, self.num_heads)
-
-      self_attentions = []
-      ctx_attentions = []
-      output = decoder_embedding_input
-      for i in range(self.num_layers):
-        output, self_attn, ctx_attn = self.decoder_layer(
-          output, encoder_outputs, self_attention_mask, context_attention_mask)
-        self_attentions.append(self_attn)
-        ctx_attentions.append(ctx_attn)
-
-    return output, self_attentions, ctx_attentions
+               sos_id,
+               eos_id,
+               scope="transformer_decoder",
+               dtype=tf.float32):
+    """Init decoder.
+
+    Args:
+      params: A python object, hparams
+      embedding: A instance of Embedding
+      sos_id: A constant, int64 id of SOS token
+      eos_id: A constant, int64 id of EOS token
+      scope: A constant string, variables scope
+      dtype: A dtype, variables dtype
+    """
+    self.sos_id = tf.to_int32(sos_id)
+    self.eos_id = tf.to_int32(eos_id)
+    self.scope = scope
+    self.dtype = dtype
+
+    self.embedding = embedding.decoder_embedding
+
+    # Transformer always works on batch major tensors.
+    self.time_major = False
+    self.num_layers = params.num_decoder_layers
+    self.model_dim = params.num_units
+    self.num_heads = params.num_heads
+    self.ffn_dim = params.ffn_dim
+    self.max_position_len = params.max_position_len
+    self.attention_chunk_size = params.attention_chunk_size
+    self.chunked_attention_layers = [
+      int(i) for i in params.chunked_attention_layers.split(",") if i.strip()]
+    self.dropout = params.dropout
+    self.recompute_grad = params.recompute_grad
+    self.target_vocab_size = params.target_vocab_size
+    self.tgt_max_len_infer = params.tgt_max_len_infer
+    self.beam_width = params.beam_width
+
+  def decode(self, mode, encoder_outputs, encoder_state, labels, src_seq_len):
+    dropout = self.dropout if mode == tf.estimator.ModeKeys.TRAIN else 0.0
+
+    with tf.variable_scope(self.scope, dtype=self.dtype, reuse=tf.AUTO_REUSE):
+      output_layer = tf.layers.Dense(
+        self.target_vocab_size, use_bias=False, name="output_projection")
+
+      if mode != tf.estimator.ModeKeys.PREDICT:
+        outputs = self._decode_inputs(
+          inputs=labels['tgt_in'],
+          inputs_length=labels['tgt_len'],
+          encoder_outputs=encoder_outputs,
+          src_seq_len=src_seq_len,
+          dropout=dropout,
+          recompute=(self.recompute_grad and
+                     mode == tf.estimator.ModeKeys.TRAIN))
+        logits = output_layer(outputs)
+        sample_id = tf.argmax(logits, axis=-1, output_type=tf.int32)
+      else:
+        if self.beam_width > 0:
+          raise ValueError("Beam search is not supported by the transformer "
+                           "decoder, set beam_width to 0 for greedy decoding.")
+        logits, sample_id, outputs = self._greedy_decode(
+          encoder_outputs, src_seq_len, output_layer)
+
+    return logits, sample_id, outputs
+
+  def _decode_inputs(self,
+                     inputs,
+                     inputs_length,
+                     encoder_outputs,
+                     src_seq_len,
+                     dropout,
+                     recompute=False):
+    """Run the decoder stack over the whole target inputs in parallel.
+
+    Args:
+      inputs: A tensor, embedded target inputs, shape is [B, T, D]
+      inputs_length: A tensor, target inputs' length, shape is [B]
+      encoder_outputs: A tensor, encoder's outputs, shape is [B, S, D]
+      src_seq_len: A tensor, source sequence length, shape is [B]
+      dropout: A python float, dropout rate
+      recompute: A python boolean, recompute the activations of decoder layers
+        in backprop instead of keeping them
+
+    Returns:
+      The outputs of the top decoder layer, shape is [B, T, D]
+    """
+    output = inputs * (self.model_dim ** 0.5)
+    output += transformer.positional_encoding(
+      output, self.model_dim, self.max_position_len)
+    output = tf.nn.dropout(output, 1.0 - dropout)
+
+    time_steps = tf.shape(output)[1]
+    padding_mask = transformer.padding_mask(
+      inputs_length, time_steps, self.dtype)
+    sequence_mask = transformer.sequence_mask(time_steps, self.dtype)
+    self_attention_mask = padding_mask * sequence_mask
+    context_attention_mask = transformer.padding_mask(
+      src_seq_len, tf.shape(encoder_outputs)[1], self.dtype)
+
+    for i in range(self.num_layers):
+      with tf.variable_scope("layer_%d" % i):
+        if recompute:
+          # dropout ops are seeded to draw the same masks when recomputed
+          layer_fn = functools.partial(
+            self.decoder_layer,
+            dropout=dropout,
+            self_attn_mask=self_attention_mask,
+            ctx_attn_mask=context_attention_mask,
+            chunk_size=self._attention_chunk_size(i),
+            seed=10 * i + 5)
+          output = recompute_utils.recompute_grad(
+            lambda x, memory, fn=layer_fn: fn(x, memory)[0],
+            output, encoder_outputs)
+        else:
+          output, _, _ = self.decoder_layer(
+            output, encoder_outputs, dropout,
+            self_attention_mask, context_attention_mask,
+            self._attention_chunk_size(i))
+    return output
+
+  def _decode_step(self,
+                   ids,
+                   step,
+                   encoder_outputs,
+                   caches,
+                   context_attention_mask):
+    """Run the decoder stack over the latest target position only.
+
+    Keys and values of the previous positions are taken from `caches`, so a
+    step costs O(T) instead of re-running the whole prefix.
+
+    Args:
+      ids: A tensor, ids of the latest position, shape is [B, 1]
+      step: A scalar tensor, the latest position
+      encoder_outputs: A tensor, encoder's outputs, shape is [B, S, D]
+      caches: A list of dicts per layer, attention caches, updated in place
+      context_attention_mask: A tensor, padding mask of the source
+
+    Returns:
+      The outputs of the top decoder layer, shape is [B, 1, D]
+    """
+    output = tf.nn.embedding_lookup(self.embedding, ids) * (
+      self.model_dim ** 0.5)
+    output += transformer.positional_encoding(
+      output, self.model_dim, self.max_position_len, offset=step)
+    for i in range(self.num_layers):
+      with tf.variable_scope("layer_%d" % i):
+        output, _, _ = self.decoder_layer(
+          output, encoder_outputs, 0.0,
+          ctx_attn_mask=context_attention_mask,
+          cache=caches[i])
+    return output
+
+  def _init_caches(self, encoder_outputs):
+    """Attention caches of the layers, with the keys and values of attention
+    to `encoder_outputs` computed once, and no previous positions."""
+    batch_size = tf.shape(encoder_outputs)[0]
+    depth = self.model_dim // self.num_heads
+    caches = []
+    for i in range(self.num_layers):
+      with tf.variable_scope("layer_%d" % i):
+        with tf.variable_scope("context_attention"):
+          memory_keys, memory_values = transformer.memory_keys_values(
+            encoder_outputs, self.model_dim, self.num_heads)
+      empty = tf.zeros([batch_size, self.num_heads, 0, depth], self.dtype)
+      caches.append({
+        "self_attention": {"keys": empty, "values": empty},
+        "context_attention": {"keys": memory_keys, "values": memory_values}
+      })
+    return caches
+
+  def _cache_shape_invariants(self):
+    shape = tf.TensorShape([None, self.num_heads, None,
+                            self.model_dim // self.num_heads])
+    return [{
+      "self_attention": {"keys": shape, "values": shape},
+      "context_attention": {"keys": shape, "values": shape}
+    } for _ in range(self.num_layers)]
+
+  def _greedy_decode(self, encoder_outputs, src_seq_len, output_layer):
+    """Greedy decoding, one position at a time with cached keys and values.
+
+    Args:
+      encoder_outputs: A tensor, encoder's outputs, shape is [B, S, D]
+      src_seq_len: A tensor, source sequence length, shape is [B]
+      output_layer: The output projection layer
+
+    Returns:
+      logits: A tensor, shape is [B, T, V]
+      sample_id: A tensor, predicted ids, shape is [B, T]
+      outputs: A tensor, the outputs of the top decoder layer, shape is [B, T, D]
+    """
+    batch_size = tf.shape(encoder_outputs)[0]
+    max_iterations = self._get_max_infer_iterations(src_seq_len)
+    context_attention_mask = transformer.padding_mask(
+      src_seq_len, tf.shape(encoder_outputs)[1], self.dtype)
+
+    def _cond(step, ids, logits, outputs, finished, caches):
+      return tf.logical_and(step < max_iterations,
+                            tf.logical_not(tf.reduce_all(finished)))
+
+    def _body(step, ids, logits, outputs, finished, caches):
+      step_outputs = self._decode_step(
+        ids[:, -1:], step, encoder_outputs, caches,
+        context_attention_mask)  # [B,1,D]
+      step_logits = output_layer(step_outputs)  # [B,1,V]
+      step_ids = tf.argmax(step_logits[:, 0, :], axis=-1, output_type=tf.int32)
+      step_ids = tf.where(
+        finished, tf.fill([batch_size], self.eos_id), step_ids)
+      finished = tf.logical_or(finished, tf.equal(step_ids, self.eos_id))
+      ids = tf.concat([ids, tf.expand_dims(step_ids, 1)], axis=1)
+      logits = tf.concat([logits, step_logits], axis=1)
+      outputs = tf.concat([outputs, step_outputs], axis=1)
+      return step + 1, ids, logits, outputs, finished, caches
+
+    loop_vars = (
+      tf.constant(0),
+      tf.fill([batch_size, 1], self.sos_id),
+      tf.zeros([batch_size, 0, self.target_vocab_size], dtype=self.dtype),
+      tf.zeros([batch_size, 0, self.model_dim], dtype=self.dtype),
+      tf.zeros([batch_size], dtype=tf.bool),
+      self._init_caches(encoder_outputs))
+    shape_invariants = (
+      tf.TensorShape([]),
+      tf.TensorShape([None, None]),
+      tf.TensorShape([None, None, self.target_vocab_size]),
+      tf.TensorShape([None, None, self.model_dim]),
+      tf.TensorShape([None]),
+      self._cache_shape_invariants())
+    _, ids, logits, outputs, _, _ = tf.while_loop(
+      _cond, _body, loop_vars,
+      shape_invariants=shape_invariants,
+      back_prop=False)
+    # drop the SOS token
+    return logits, ids[:, 1:], outputs
 
   def decoder_layer(self,
                     decoder_inputs,
                     encoder_outputs,
+                    dropout,
                     self_attn_mask=None,
-                    ctx_attn_mask=None):
+                    ctx_attn_mask=None,
+                    chunk_size=0,
+                    seed=None,
+                    cache=None):
+    """A decoder layer, of the positions of `decoder_inputs` at once, or of
+    the latest position with the attention caches of the layer in `cache`."""
+    if cache is None:
+      cache = {}
     decoder_output, self_attn = transformer.multihead_attention(
-      decoder_inputs, decoder_inputs, decoder_inputs,
-      self.num_heads, self.dropout, self_attn_mask)
+      decoder_inputs, None,
+      self.num_heads, dropout, self_attn_mask, chunk_size, seed,
+      cache=cache.get("self_attention"),
+      scope="self_attention")
 
     decoder_output, ctx_attn = transformer.multihead_attention(
-      encoder_outputs, encoder_outputs, decoder_output,
-      self.num_heads, self.dropout, ctx_attn_mask)
+      decoder_output, encoder_outputs,
+      self.num_heads, dropout, ctx_attn_mask, chunk_size,
+      None if seed is None else seed + 2,
+      cache=cache.get("context_attention"),
+      scope="context_attention")
 
     decoder_output = transformer.positional_wise_feed_forward_network(
-      decoder_output, self.model_dim,
-      self.ffn_dim, self.dropout)
+      decoder_output, self.model_dim, self.ffn_dim, dropout,
+      None if seed is None else seed + 4)
 
     return decoder_output, self_attn, ctx_attn
+
+  def _attention_chunk_size(self, layer_id):
+    """Chunk size of attention in layer `layer_id`, 0 for full attention."""
+    if (self.chunked_attention_layers and
+            layer_id not in self.chunked_attention_layers):
+      return 0
+    return self.attention_chunk_size
+
+  def _get_max_infer_iterations(self, sequence_length):
+    if self.tgt_max_len_infer:
+      max_iterations = self.tgt_max_len_infer
+    else:
+      decoding_length_factor = 2.0
+      max_encoder_length = tf.reduce_max(sequence_length)
+      max_iterations = tf.to_int32(tf.round(
+        tf.to_float(max_encoder_length) * decoding_length_factor))
+    return max_iterations
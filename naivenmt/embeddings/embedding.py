@@ -20,6 +20,8 @@ import numpy as np
 import tensorflow as tf
 from tensorflow.python.ops import lookup_ops
 
+from naivenmt.utils import precision_utils
+
 VOCAB_SIZE_THRESHOLD = 50000
 
 
@@ -88,6 +90,9 @@ class Embedding(EmbeddingInterface):
     self.tgt_embedding_file = tgt_embedding_file
     self.num_partitions = num_partitions
     self.dtype = dtype or tf.float32
+    # embeddings of reduced precision models are stored in float32, and the
+    # looked up rows are cast to dtype, which keeps their gradients sparse
+    self.variable_dtype = precision_utils.variable_dtype(self.dtype)
     self.scope = scope or "embedding"
     self._encoder_embedding = None
     self._decoder_embedding = None
@@ -115,7 +120,7 @@ class Embedding(EmbeddingInterface):
       raise ValueError(
         "Can't set num_partitions > 1 when using pretrained embedding")
 
-    with tf.variable_scope(self.scope, dtype=self.dtype,
+    with tf.variable_scope(self.scope, dtype=self.variable_dtype,
                            partitioner=partitioner,
                            reuse=tf.AUTO_REUSE) as scope:
       self._encoder_embedding = self._create_or_load_embeddings(
@@ -124,7 +129,7 @@ class Embedding(EmbeddingInterface):
         embedding_file=self.src_embedding_file,
         vocab_size=self.src_vocab_size,
         embedding_size=self.src_embedding_size,
-        dtype=self.dtype)
+        dtype=self.variable_dtype)
       if self.share_vocab:
         if self.src_vocab_size != self.tgt_vocab_size:
           raise ValueError("Share embedding but different src/tgt vocab size.")
@@ -136,7 +141,7 @@ class Embedding(EmbeddingInterface):
           vocab_size=self.tgt_vocab_size,
           embedding_file=self.tgt_embedding_file,
           embedding_size=self.tgt_embedding_size,
-          dtype=self.dtype)
+          dtype=self.variable_dtype)
       return self._encoder_embedding, self._decoder_embedding
 
   def _create_or_load_embeddings(self,
@@ -222,8 +227,10 @@ class Embedding(EmbeddingInterface):
 
   def encoder_embedding_input(self, inputs):
     inputs_ids = self.src_str2idx_table.lookup(inputs)
-    return tf.nn.embedding_lookup(self.encoder_embedding, inputs_ids)
+    return tf.cast(
+      tf.nn.embedding_lookup(self.encoder_embedding, inputs_ids), self.dtype)
 
   def decoder_embedding_input(self, inputs):
     inputs_ids = self.tgt_str2idx_table.lookup(inputs)
-    return tf.nn.embedding_lookup(self.decoder_embedding, inputs_ids)
+    return tf.cast(
+      tf.nn.embedding_lookup(self.decoder_embedding, inputs_ids), self.dtype)
@@ -16,7 +16,9 @@
 from .abstract_encoder import AbstractEncoder
 from .abstract_encoder import EncoderInterface
 from .basic_encoder import BasicEncoder
+from .conv_encoder import ConvEncoder
 from .gnmt_encoder import GNMTEncoder
 from .transformer_encoder import TransformerEncoder
 
-__all__ = ["AbstractEncoder", "BasicEncoder", "GNMTEncoder", "EncoderInterface", "TransformerEncoder"]
+__all__ = ["AbstractEncoder", "BasicEncoder", "ConvEncoder", "GNMTEncoder",
+           "EncoderInterface", "TransformerEncoder"]
@@ -14,9 +14,14 @@
 # ==============================================================================
 
 import abc
+import functools
 
 import tensorflow as tf
 
+from naivenmt.layers import rnn_cells
+from naivenmt.utils import device_utils
+from naivenmt.utils import recompute_utils
+
 
 class EncoderInterface(abc.ABC):
   """Encoder interface."""
@@ -27,7 +32,8 @@ class EncoderInterface(abc.ABC):
 
     Args:
       mode: mode
-      sequence_inputs: A tensor, embedding representation of inputs sequence
+      sequence_inputs: A tensor, embedding representation of inputs sequence,
+        shape is [T, B, D] if the encoder is time major, else [B, T, D]
       sequence_length: A tensor, input sequences' length
 
     Returns:
@@ -63,39 +69,37 @@ class AbstractEncoder(EncoderInterface):
     self.num_units = params.num_units
     self.forget_bias = params.forget_bias
     self.dropout = params.dropout
+    self.recompute_grad = params.recompute_grad
+    self.parallel_iterations = params.encoder_parallel_iterations
+    # devices of the forward and backward directions of bidirectional layers
+    self.bi_encoder_devices = (
+      device_utils.parse_devices(params.bi_encoder_devices) or ["", ""])
+    # devices that stacked layers are placed on round robin
+    self.layer_devices = device_utils.parse_devices(params.layer_devices)
 
   def encode(self, mode, sequence_inputs, sequence_length):
     num_layers = self.num_encoder_layers
     num_residual_layers = self.num_encoder_residual_layers
 
     with tf.variable_scope(self.scope, dtype=self.dtype, reuse=tf.AUTO_REUSE):
-      if self.time_major:
-        sequence_inputs = tf.transpose(sequence_inputs, perm=[1, 0, 2])
-
       if self.encoder_type == "uni":
-        cell = self._build_encoder_cell(mode, num_layers, num_residual_layers)
-        encoder_outputs, encoder_state = tf.nn.dynamic_rnn(
-          cell=cell,
+        encoder_outputs, encoder_state = self._stacked_dynamic_rnn(
+          mode=mode,
           inputs=sequence_inputs,
-          dtype=self.dtype,
           sequence_length=sequence_length,
-          time_major=self.time_major,
+          num_layers=num_layers,
+          num_residual_layers=num_residual_layers,
           swap_memory=True)
       elif self.encoder_type == "bi":
         num_bi_layers = int(num_layers / 2)
         num_bi_residual_layers = int(num_residual_layers / 2)
 
-        fw_cell, bw_cell = self._build_bidirectional_encoder_cell(
+        bi_outputs, bi_encoder_state = self._stacked_bidirectional_dynamic_rnn(
           mode=mode,
-          num_bi_layers=num_bi_layers,
-          num_bi_residual_layers=num_bi_residual_layers)
-        bi_outputs, bi_encoder_state = tf.nn.bidirectional_dynamic_rnn(
-          cell_fw=fw_cell,
-          cell_bw=bw_cell,
           inputs=sequence_inputs,
-          dtype=self.dtype,
           sequence_length=sequence_length,
-          time_major=self.time_major,
+          num_bi_layers=num_bi_layers,
+          num_bi_residual_layers=num_bi_residual_layers,
           swap_memory=True)
         encoder_outputs = tf.concat(bi_outputs, -1)
         # flatten states
@@ -110,43 +114,323 @@ class AbstractEncoder(EncoderInterface):
         raise ValueError("Invalid encoder type: %s" % self.encoder_type)
       return encoder_outputs, encoder_state
 
+  def _stacked_dynamic_rnn(self,
+                           mode,
+                           inputs,
+                           sequence_length,
+                           num_layers,
+                           num_residual_layers,
+                           swap_memory=False,
+                           base_layer_id=0):
+    """Run stacked rnn layers, the same as `tf.nn.dynamic_rnn` over the cell
+    of `_build_encoder_cell`.
+
+    Layers are placed round robin on `layer_devices`, so that successive
+    layers work on successive time steps concurrently.
+
+    Layers are run one by one with `recompute_grad` in training, where the
+    activations of each layer are recomputed in backprop, and with
+    `lstm_block_fused` and `sru` units, which run over whole sequences.
+    Variables keep the names of `MultiRNNCell`, so checkpoints are shared by
+    all the ways.
+
+    Args:
+      mode: mode
+      inputs: A tensor, inputs of the first layer
+      sequence_length: A tensor, input sequences' length
+      num_layers: A integer, number of layers
+      num_residual_layers: A integer, number of residual layers
+      swap_memory: A boolean, swap memory from GPU to CPU in the rnn loop
+      base_layer_id: A integer, index of the first layer in the encoder, used
+        to place layers
+
+    Returns:
+      outputs: A tensor, outputs of the last layer
+      state: A tuple, final states of each layer
+    """
+    recompute = self.recompute_grad and mode == tf.estimator.ModeKeys.TRAIN
+    if not recompute and not self._runs_whole_sequences():
+      cells = self._build_encoder_cell_list(
+        mode, num_layers, num_residual_layers)
+      if self.layer_devices:
+        cells = [tf.nn.rnn_cell.DeviceWrapper(cell, device_utils.layer_device(
+          self.layer_devices, base_layer_id + i))
+          for i, cell in enumerate(cells)]
+      cell = tf.nn.rnn_cell.MultiRNNCell(cells)
+      return tf.nn.dynamic_rnn(
+        cell=cell,
+        inputs=inputs,
+        dtype=self.dtype,
+        parallel_iterations=self.parallel_iterations,
+        sequence_length=sequence_length,
+        time_major=self.time_major,
+        swap_memory=swap_memory)
+
+    with tf.variable_scope("rnn"):
+      # dropout ops are seeded to draw the same masks when recomputed
+      layer_fns = self._build_layer_fns(
+        mode, sequence_length, num_layers, num_residual_layers,
+        seed=1 if recompute else None,
+        swap_memory=swap_memory)
+      outputs = inputs
+      states = []
+      for i, layer_fn in enumerate(layer_fns):
+        device = device_utils.layer_device(
+          self.layer_devices, base_layer_id + i)
+        with tf.variable_scope("multi_rnn_cell/cell_%d" % i), tf.device(device):
+          if recompute:
+            outputs, state = recompute_utils.recompute_grad(layer_fn, outputs)
+          else:
+            outputs, state = layer_fn(outputs)
+        states.append(state)
+    return outputs, tuple(states)
+
+  def _stacked_bidirectional_dynamic_rnn(self,
+                                         mode,
+                                         inputs,
+                                         sequence_length,
+                                         num_bi_layers,
+                                         num_bi_residual_layers,
+                                         swap_memory=False):
+    """Run stacked bidirectional rnn layers, the same as
+    `tf.nn.bidirectional_dynamic_rnn` over a forward and a backward cell of
+    `_build_encoder_cell`.
+
+    The two directions are independent loops, placed on `bi_encoder_devices`
+    so that they run concurrently. Variables keep the names of
+    `tf.nn.bidirectional_dynamic_rnn`.
+
+    Args:
+      mode: mode
+      inputs: A tensor, inputs of the first layer
+      sequence_length: A tensor, input sequences' length
+      num_bi_layers: A integer, number of bidirectional layers
+      num_bi_residual_layers: A integer, number of bidirectional residual
+        layers
+      swap_memory: A boolean, swap memory from GPU to CPU in the rnn loop
+
+    Returns:
+      outputs: A tuple (outputs_fw, outputs_bw)
+      state: A tuple (states_fw, states_bw), final states of each layer
+    """
+    time_axis = 0 if self.time_major else 1
+    batch_axis = 1 if self.time_major else 0
+
+    def _reverse(x):
+      return tf.reverse_sequence(
+        x, sequence_length, seq_axis=time_axis, batch_axis=batch_axis)
+
+    outputs, states = [], []
+    with tf.variable_scope("bidirectional_rnn"):
+      for direction, device in zip(["fw", "bw"], self.bi_encoder_devices):
+        with tf.variable_scope(direction), tf.device(device):
+          direction_inputs = inputs if direction == "fw" else _reverse(inputs)
+          if self._runs_whole_sequences():
+            direction_outputs = direction_inputs
+            direction_states = []
+            layer_fns = self._build_layer_fns(
+              mode, sequence_length, num_bi_layers, num_bi_residual_layers)
+            for i, layer_fn in enumerate(layer_fns):
+              with tf.variable_scope("multi_rnn_cell/cell_%d" % i):
+                direction_outputs, state = layer_fn(direction_outputs)
+              direction_states.append(state)
+            direction_states = tuple(direction_states)
+          else:
+            cell = self._build_encoder_cell(
+              mode, num_bi_layers, num_bi_residual_layers)
+            direction_outputs, direction_states = self._dynamic_rnn_layer(
+              direction_inputs, cell, sequence_length, swap_memory)
+          if direction == "bw":
+            direction_outputs = _reverse(direction_outputs)
+        outputs.append(direction_outputs)
+        states.append(direction_states)
+    return tuple(outputs), tuple(states)
+
+  def _runs_whole_sequences(self):
+    """Whether layers of `unit_type` run over whole sequences at once, instead
+    of being stepped by `tf.nn.dynamic_rnn`."""
+    return self.unit_type in ["lstm_block_fused", "sru"]
+
+  def _build_layer_fns(self,
+                       mode,
+                       sequence_length,
+                       num_layers,
+                       num_residual_layers,
+                       seed=None,
+                       swap_memory=False):
+    """Create functions that run a single rnn layer over whole sequences.
+
+    Args:
+      mode: mode
+      sequence_length: A tensor, input sequences' length
+      num_layers: A integer, number of layers
+      num_residual_layers: A integer, number of residual layers
+      seed: A integer, dropout seed of the first layer, None for random seeds
+      swap_memory: A boolean, swap memory from GPU to CPU in the rnn loop
+
+    Returns:
+      A list of functions that map a layer's inputs to (outputs, state). They
+        must be called in the variable scope of the layer.
+    """
+    if self.unit_type == "lstm_block_fused":
+      return [functools.partial(
+        self._fused_lstm_layer,
+        mode=mode,
+        sequence_length=sequence_length,
+        residual=(i >= num_layers - num_residual_layers),
+        seed=None if seed is None else seed + i)
+        for i in range(num_layers)]
+    if self.unit_type == "sru":
+      return [functools.partial(
+        self._sru_layer,
+        mode=mode,
+        sequence_length=sequence_length,
+        residual=(i >= num_layers - num_residual_layers),
+        seed=None if seed is None else seed + i,
+        swap_memory=swap_memory)
+        for i in range(num_layers)]
+
+    cells = self._build_encoder_cell_list(
+      mode, num_layers, num_residual_layers, seed=seed)
+    return [functools.partial(
+      self._dynamic_rnn_layer,
+      cell=cell,
+      sequence_length=sequence_length,
+      swap_memory=swap_memory)
+      for cell in cells]
+
+  def _dynamic_rnn_layer(self,
+                         inputs,
+                         cell,
+                         sequence_length,
+                         swap_memory=False):
+    """Run `cell` by `tf.nn.dynamic_rnn` in the current variable scope."""
+    return tf.nn.dynamic_rnn(
+      cell=cell,
+      inputs=inputs,
+      dtype=self.dtype,
+      parallel_iterations=self.parallel_iterations,
+      sequence_length=sequence_length,
+      time_major=self.time_major,
+      swap_memory=swap_memory,
+      scope=tf.get_variable_scope())
+
+  def _fused_lstm_layer(self,
+                        inputs,
+                        mode,
+                        sequence_length,
+                        residual=False,
+                        seed=None):
+    """Run a `LSTMBlockFusedCell` layer, with the input dropout and residual
+    connection of the cells of `_build_encoder_cell_list`.
+
+    Variables have the same names as `LSTMBlockCell`'s and `LSTMCell`'s, so
+    checkpoints are shared with `lstm_block` and `lstm` units.
+
+    Args:
+      inputs: A tensor, inputs of the layer
+      mode: mode
+      sequence_length: A tensor, input sequences' length
+      residual: A boolean, add the inputs to the outputs or not
+      seed: A integer, seed of the dropout op, None for random seeds
+
+    Returns:
+      outputs: A tensor, outputs of the layer
+      state: A LSTMStateTuple, final state of the layer
+    """
+    dropout = self.dropout if mode != tf.estimator.ModeKeys.PREDICT else 0.0
+    layer_inputs = inputs
+    if dropout > 0.0:
+      layer_inputs = tf.nn.dropout(layer_inputs, 1.0 - dropout, seed=seed)
+    if not self.time_major:
+      layer_inputs = tf.transpose(layer_inputs, perm=[1, 0, 2])
+
+    cell = tf.contrib.rnn.LSTMBlockFusedCell(
+      self.num_units, forget_bias=self.forget_bias,
+      reuse=tf.AUTO_REUSE, name="lstm_cell")
+    outputs, (c, h) = cell(
+      layer_inputs, dtype=self.dtype, sequence_length=sequence_length)
+
+    if not self.time_major:
+      outputs = tf.transpose(outputs, perm=[1, 0, 2])
+    if residual:
+      outputs += inputs
+    return outputs, tf.nn.rnn_cell.LSTMStateTuple(c, h)
+
+  def _sru_layer(self,
+                 inputs,
+                 mode,
+                 sequence_length,
+                 residual=False,
+                 seed=None,
+                 swap_memory=False):
+    """Run a `SRUCell` layer by `dynamic_sru`, with the input dropout and
+    residual connection of the cells of `_build_encoder_cell_list`.
+
+    Args:
+      inputs: A tensor, inputs of the layer
+      mode: mode
+      sequence_length: A tensor, input sequences' length
+      residual: A boolean, add the inputs to the outputs or not
+      seed: A integer, seed of the dropout op, None for random seeds
+      swap_memory: A boolean, swap memory from GPU to CPU in the rnn loop
+
+    Returns:
+      outputs: A tensor, outputs of the layer
+      state: A tensor, final state of the layer
+    """
+    dropout = self.dropout if mode != tf.estimator.ModeKeys.PREDICT else 0.0
+    layer_inputs = inputs
+    if dropout > 0.0:
+      layer_inputs = tf.nn.dropout(layer_inputs, 1.0 - dropout, seed=seed)
+
+    cell = rnn_cells.SRUCell(
+      self.num_units, forget_bias=self.forget_bias,
+      reuse=tf.AUTO_REUSE, name="sru_cell")
+    outputs, state = rnn_cells.dynamic_sru(
+      cell, layer_inputs,
+      sequence_length=sequence_length,
+      dtype=self.dtype,
+      parallel_iterations=self.parallel_iterations,
+      swap_memory=swap_memory,
+      time_major=self.time_major)
+
+    if residual:
+      outputs += inputs
+    return outputs, state
+
   @abc.abstractmethod
-  def _build_encoder_cell(self,
-                          mode,
-                          num_layers,
-                          num_residual_layers):
-    """Create encoder cells.
+  def _build_encoder_cell_list(self,
+                               mode,
+                               num_layers,
+                               num_residual_layers,
+                               seed=None):
+    """Create a list of encoder cells, one for each layer.
 
     Args:
       mode: mode
       num_layers: A integer, number of layers
       num_residual_layers: A integer, number of residual layers
+      seed: A integer, dropout seed of the first layer, None for random seeds
 
     Returns:
-      Encoder's rnn cells.
+      A list of rnn cells.
     """
     raise NotImplementedError()
 
-  def _build_bidirectional_encoder_cell(self,
-                                        mode,
-                                        num_bi_layers,
-                                        num_bi_residual_layers):
-    """Create bi-directional cells.
+  def _build_encoder_cell(self,
+                          mode,
+                          num_layers,
+                          num_residual_layers):
+    """Create encoder cells.
 
     Args:
       mode: mode
-      num_bi_layers: A integer, number of bidirectional layers
-      num_bi_residual_layers: A integer, number of bidirectional residual layers
+      num_layers: A integer, number of layers
+      num_residual_layers: A integer, number of residual layers
 
     Returns:
-      Encoder's forward and backward rnn cells.
+      Encoder's rnn cells.
     """
-    forward_cell = self._build_encoder_cell(
-      mode=mode,
-      num_layers=num_bi_layers,
-      num_residual_layers=num_bi_residual_layers)
-    backward_cell = self._build_encoder_cell(
-      mode=mode,
-      num_layers=num_bi_layers,
-      num_residual_layers=num_bi_residual_layers)
-    return forward_cell, backward_cell
+    return tf.nn.rnn_cell.MultiRNNCell(self._build_encoder_cell_list(
+      mode, num_layers, num_residual_layers))
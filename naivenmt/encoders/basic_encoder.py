@@ -16,6 +16,7 @@
 import tensorflow as tf
 
 from naivenmt.encoders.abstract_encoder import AbstractEncoder
+from naivenmt.layers import rnn_cells
 
 
 class BasicEncoder(AbstractEncoder):
@@ -34,19 +35,21 @@ class BasicEncoder(AbstractEncoder):
     """
     super(BasicEncoder, self).__init__(params, scope, dtype)
 
-  def _build_encoder_cell(self,
-                          mode,
-                          num_layers,
-                          num_residual_layers):
-    """Create encoder cells.
+  def _build_encoder_cell_list(self,
+                               mode,
+                               num_layers,
+                               num_residual_layers,
+                               seed=None):
+    """Create a list of encoder cells, one for each layer.
 
     Args:
       mode: mode
       num_layers: A integer, number of layers
       num_residual_layers: A integer, number of residual layers
+      seed: A integer, dropout seed of the first layer, None for random seeds
 
     Returns:
-      Encoder's rnn cells.
+      A list of rnn cells.
     """
     cells = []
     for i in range(num_layers):
@@ -58,10 +61,10 @@ class BasicEncoder(AbstractEncoder):
         dropout=self.dropout,
         mode=mode,
         residual_conn=residual,
-        residual_fn=None)
+        residual_fn=None,
+        seed=None if seed is None else seed + i)
       cells.append(cell)
-    # cells = cells[0] if len(cells) == 1 else cells
-    return tf.nn.rnn_cell.MultiRNNCell(cells)
+    return cells
 
   @staticmethod
   def _build_single_cell(unit_type,
@@ -70,7 +73,8 @@ class BasicEncoder(AbstractEncoder):
                          dropout,
                          mode,
                          residual_conn=False,
-                         residual_fn=None):
+                         residual_fn=None,
+                         seed=None):
     """Build single rnn cell.
 
     Args:
@@ -81,6 +85,7 @@ class BasicEncoder(AbstractEncoder):
       residual_conn: A boolean, use residual connection or not
       residual_fn: The function to map raw cell inputs and raw cell
         outputs to the actual cell outputs of the residual network.
+      seed: A integer, seed of the dropout ops, None for random seeds
 
     Returns:
       A RNNCell or it's subclass
@@ -89,17 +94,27 @@ class BasicEncoder(AbstractEncoder):
     if unit_type == "lstm":
       single_cell = tf.nn.rnn_cell.LSTMCell(
         num_units, forget_bias=forget_bias)
+    elif unit_type in ["lstm_block", "lstm_block_fused"]:
+      # `LSTMBlockFusedCell` can not be stepped, its variables are the same as
+      # `LSTMBlockCell`'s, which is used for the stepped cells.
+      single_cell = tf.contrib.rnn.LSTMBlockCell(
+        num_units, forget_bias=forget_bias)
     elif unit_type == "gru":
       single_cell = tf.nn.rnn_cell.GRUCell(num_units)
+    elif unit_type == "gru_block":
+      single_cell = tf.contrib.rnn.GRUBlockCellV2(num_units)
     elif unit_type == "layer_norm_lstm":
-      single_cell = tf.contrib.rnn.LayerNormBasicLSTMCell(
-        num_units, forget_bias=forget_bias, layer_norm=True)
+      single_cell = rnn_cells.LayerNormLSTMCell(
+        num_units, forget_bias=forget_bias)
+    elif unit_type == "sru":
+      single_cell = rnn_cells.SRUCell(num_units, forget_bias=forget_bias)
     elif unit_type == "nas":
       single_cell = tf.contrib.rnn.NASCell(num_units)
     else:
       raise ValueError("Invalid unit type: %s" % unit_type)
     if dropout > 0.0:
-      single_cell = tf.nn.rnn_cell.DropoutWrapper(single_cell, 1.0 - dropout)
+      single_cell = tf.nn.rnn_cell.DropoutWrapper(
+        single_cell, 1.0 - dropout, seed=seed)
     if residual_conn:
       single_cell = tf.nn.rnn_cell.ResidualWrapper(single_cell, residual_fn)
     return single_cell
@@ -0,0 +1,116 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import tensorflow as tf
+
+from naivenmt.encoders.abstract_encoder import EncoderInterface
+from naivenmt.layers import transformer
+
+
+class ConvEncoder(EncoderInterface):
+  """Gated convolutional encoder, as described in
+  https://arxiv.org/abs/1705.03122.
+
+  All positions are encoded in parallel. The state is the masked mean of each
+  layer's outputs, in the state structure of the rnn decoders' `unit_type`,
+  so that decoders can be initialized by it.
+  """
+
+  def __init__(self,
+               params,
+               scope="conv_encoder",
+               dtype=tf.float32):
+    """Init encoder.
+
+    Args:
+      params: hparams
+      scope: variables scope
+      dtype: variables dtype
+    """
+    self.scope = scope
+    self.dtype = dtype
+
+    self.time_major = params.time_major
+    self.num_layers = params.num_encoder_layers
+    self.num_units = params.num_units
+    self.unit_type = params.unit_type
+    self.kernel_width = params.conv_kernel_width
+    self.max_position_len = params.max_position_len
+    self.dropout = params.dropout
+
+  def encode(self, mode, sequence_inputs, sequence_length):
+    """Encode source inputs.
+
+    Args:
+      mode: mode
+      sequence_inputs: A tensor, embedding representation of inputs sequence,
+        shape is [T, B, D] if the encoder is time major, else [B, T, D]
+      sequence_length: A tensor, input sequences' length
+
+    Returns:
+      encoder_outputs: A tensor of the same format as `sequence_inputs`, with
+        depth num_units
+      encoder_state: A tuple, pooled state of each layer
+    """
+    dropout = self.dropout if mode == tf.estimator.ModeKeys.TRAIN else 0.0
+
+    with tf.variable_scope(self.scope, dtype=self.dtype, reuse=tf.AUTO_REUSE):
+      inputs = sequence_inputs
+      if self.time_major:
+        inputs = tf.transpose(inputs, perm=[1, 0, 2])
+      mask = tf.expand_dims(tf.sequence_mask(
+        sequence_length, tf.shape(inputs)[1], dtype=self.dtype), -1)
+
+      output = tf.layers.dense(inputs, self.num_units, name="input_projection")
+      output += transformer.positional_encoding(
+        output, self.num_units, self.max_position_len)
+
+      states = []
+      for i in range(self.num_layers):
+        with tf.variable_scope("layer_%d" % i):
+          output = self.conv_layer(output, mask, dropout)
+        states.append(self._pooled_state(output, mask, sequence_length))
+
+      if self.time_major:
+        output = tf.transpose(output, perm=[1, 0, 2])
+      return output, tuple(states)
+
+  def conv_layer(self, inputs, mask, dropout):
+    """A gated linear unit convolution with a residual connection.
+
+    Args:
+      inputs: A tensor of shape [B, T, num_units]
+      mask: A tensor of shape [B, T, 1], 0 for padded positions
+      dropout: A float, dropout rate
+
+    Returns:
+      A tensor of shape [B, T, num_units]
+    """
+    # padded positions are zeroed, so they do not leak into valid positions
+    output = tf.nn.dropout(inputs * mask, 1.0 - dropout)
+    output = tf.layers.conv1d(
+      output, 2 * self.num_units, self.kernel_width, padding="same",
+      name="conv")
+    values, gates = tf.split(output, 2, axis=-1)
+    output = values * tf.sigmoid(gates)
+    return (output + inputs) * (0.5 ** 0.5)
+
+  def _pooled_state(self, outputs, mask, sequence_length):
+    """Mean of the valid positions of `outputs`, as the state of a layer."""
+    length = tf.cast(tf.maximum(sequence_length, 1), self.dtype)
+    pooled = tf.reduce_sum(outputs * mask, axis=1) / tf.expand_dims(length, -1)
+    if self.unit_type in ["gru", "gru_block", "sru"]:
+      return pooled
+    return tf.nn.rnn_cell.LSTMStateTuple(pooled, pooled)
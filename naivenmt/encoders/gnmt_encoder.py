@@ -16,6 +16,7 @@
 import tensorflow as tf
 
 from naivenmt.encoders.basic_encoder import BasicEncoder
+from naivenmt.utils import device_utils
 
 
 class GNMTEncoder(BasicEncoder):
@@ -46,38 +47,28 @@ class GNMTEncoder(BasicEncoder):
     num_uni_layers = self.num_encoder_layers - num_bi_layers
 
     with tf.variable_scope(self.scope, dtype=self.dtype, reuse=tf.AUTO_REUSE):
-      if self.time_major:
-        sequence_inputs = tf.transpose(sequence_inputs, perm=[1, 0, 2])
-
       # build bidirectional layer
-      cell_fw, cell_bw = self._build_bidirectional_encoder_cell(
-        mode=mode,
-        num_bi_layers=num_bi_layers,
-        num_bi_residual_layers=0)
-      bi_encoder_outputs, bi_encoder_state = tf.nn.bidirectional_dynamic_rnn(
-        cell_fw=cell_fw,
-        cell_bw=cell_bw,
-        inputs=sequence_inputs,
-        dtype=self.dtype,
-        sequence_length=sequence_length,
-        time_major=self.time_major,
-        swap_memory=True)
+      with tf.device(device_utils.layer_device(self.layer_devices, 0)):
+        bi_encoder_outputs, bi_encoder_state = (
+          self._stacked_bidirectional_dynamic_rnn(
+            mode=mode,
+            inputs=sequence_inputs,
+            sequence_length=sequence_length,
+            num_bi_layers=num_bi_layers,
+            num_bi_residual_layers=0,
+            swap_memory=True))
       bi_encoder_outputs = tf.concat(bi_encoder_outputs, -1)
       # bw states shape(lstm layer_norm_lstm, nas): (states_c, states_h)
       encoder_states_bw = bi_encoder_state[1]
 
       # build unidirectional layers
-      uni_cell = self._build_encoder_cell(
+      encoder_outputs, encoder_state = self._stacked_dynamic_rnn(
         mode=mode,
-        num_layers=num_uni_layers,
-        num_residual_layers=self.num_encoder_residual_layers)
-
-      encoder_outputs, encoder_state = tf.nn.dynamic_rnn(
-        cell=uni_cell,
         inputs=bi_encoder_outputs,
-        dtype=self.dtype,
         sequence_length=sequence_length,
-        time_major=self.time_major)
+        num_layers=num_uni_layers,
+        num_residual_layers=self.num_encoder_residual_layers,
+        base_layer_id=num_bi_layers)
 
       if num_uni_layers == 1:
         # shape: ((encoder_states_bw,), (encoder_states,))
@@ -1,40 +1,56 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import functools
+
 import tensorflow as tf
 
-from naivenmt.encoders import EncoderInterface
+from naivenmt.encoders.abstract_encoder import EncoderInterface
 from naivenmt.layers import transformer
+from naivenmt.utils import recompute_utils
 
 
 class TransformerEncoder(EncoderInterface):
+  """Transformer encoder, as described in https://arxiv.org/abs/1706.03762."""
 
   def __init__(self,
-               embedding,
-               num_layers,
-               model_dim=512,
-               num_heads=8,
-               ffn_dim=2048,
-               dropout=0.2,
-               dtype=tf.float32,
-               scope="transformer-encoder"):
-    """Init.
+               params,
+               scope="transformer_encoder",
+               dtype=tf.float32):
+    """Init encoder.
 
     Args:
-      embedding: word embedding layer
-      num_layers: A python integer, number of encoder layers
-      model_dim: A python integer, model dimension, the same as word embedding's dimension
-      num_heads: A python integer, number of heads
-      ffn_dim: A python integer, dimension of feed forward network
-      dropout: A python float, dropout rate
-      dtype: Data type, default is `tf.float32`
-      scope: A python string, variable scope
+      params: hparams
+      scope: variables scope
+      dtype: variables dtype
     """
-    self.embedding = embedding
-    self.num_layers = num_layers
-    self.model_dim = model_dim
-    self.num_heads = num_heads
-    self.ffn_dim = ffn_dim
-    self.dropout = dropout
-    self.dtype = dtype
     self.scope = scope
+    self.dtype = dtype
+
+    # Transformer always works on batch major tensors.
+    self.time_major = False
+    self.num_layers = params.num_encoder_layers
+    self.model_dim = params.num_units
+    self.num_heads = params.num_heads
+    self.ffn_dim = params.ffn_dim
+    self.max_position_len = params.max_position_len
+    self.attention_chunk_size = params.attention_chunk_size
+    self.chunked_attention_layers = [
+      int(i) for i in params.chunked_attention_layers.split(",") if i.strip()]
+    self.dropout = params.dropout
+    self.recompute_grad = params.recompute_grad
 
   def encode(self, mode, sequence_inputs, sequence_length):
     """Encode module.
@@ -45,32 +61,60 @@ class TransformerEncoder(EncoderInterface):
       sequence_length: A tensor, length of input, shape is [B]
 
     Returns:
-      A output tensor and attentions list.
+      A output tensor and attentions tuple. Attentions are None for the layers
+        whose activations are recomputed.
     """
-    self.dropout = self.dropout if mode == tf.estimator.ModeKeys.TRAIN else 0.0
-    # max_sequence_length = max(self.max_seq_len, features.source_sequence_length)
+    dropout = self.dropout if mode == tf.estimator.ModeKeys.TRAIN else 0.0
+    recompute = self.recompute_grad and mode == tf.estimator.ModeKeys.TRAIN
 
-    with tf.variable_scope(self.scope, dtype=self.dtype) as scope:
-      # word embedding
-      # encoder_embedding_input = self.embedding.encoder_embedding_input(sequence_inputs)
-      # positional embedding
-      sequence_inputs += transformer.positional_encoding(
-        sequence_inputs, self.model_dim)
+    with tf.variable_scope(self.scope, dtype=self.dtype, reuse=tf.AUTO_REUSE):
+      output = sequence_inputs * (self.model_dim ** 0.5)
+      output += transformer.positional_encoding(
+        output, self.model_dim, self.max_position_len)
+      output = tf.nn.dropout(output, 1.0 - dropout)
 
-      self_attention_mask = transformer.padding_mask(sequence_inputs, sequence_inputs, self.num_heads)
+      self_attention_mask = transformer.padding_mask(
+        sequence_length, tf.shape(output)[1], self.dtype)
 
       attentions = []
-      output = sequence_inputs
       for i in range(self.num_layers):
-        output, attention = self.encoder_layer(output, self_attention_mask)
+        with tf.variable_scope("layer_%d" % i):
+          if recompute:
+            # dropout ops are seeded to draw the same masks when recomputed
+            layer_fn = functools.partial(
+              self.encoder_layer,
+              attention_mask=self_attention_mask,
+              dropout=dropout,
+              chunk_size=self._attention_chunk_size(i),
+              seed=10 * i + 1)
+            output = recompute_utils.recompute_grad(
+              lambda x, fn=layer_fn: fn(x)[0], output)
+            attention = None
+          else:
+            output, attention = self.encoder_layer(
+              output, self_attention_mask, dropout,
+              self._attention_chunk_size(i))
         attentions.append(attention)
-    return output, attentions
+    return output, tuple(attentions)
 
-  def encoder_layer(self, inputs, attention_mask):
+  def encoder_layer(self,
+                    inputs,
+                    attention_mask,
+                    dropout,
+                    chunk_size=0,
+                    seed=None):
     output, attention = transformer.multihead_attention(
-      inputs, inputs, inputs, self.num_heads, self.dropout, attention_mask)
+      inputs, None, self.num_heads, dropout, attention_mask, chunk_size, seed)
 
     output = transformer.positional_wise_feed_forward_network(
-      output, self.model_dim, self.ffn_dim, self.dropout)
+      output, self.model_dim, self.ffn_dim, dropout,
+      None if seed is None else seed + 2)
 
     return output, attention
+
+  def _attention_chunk_size(self, layer_id):
+    """Chunk size of attention in layer `layer_id`, 0 for full attention."""
+    if (self.chunked_attention_layers and
+            layer_id not in self.chunked_attention_layers):
+      return 0
+    return self.attention_chunk_size
@@ -13,10 +13,18 @@
 # limitations under the License.
 # ==============================================================================
 
+from .allreduce_hooks import BroadcastVariablesHook
+from .ckpt_hooks import AsyncCheckpointSaverHook
 from .eval_hooks import SaveEvaluationPredictionsHook
 from .init_hook import InitHook
+from .jit_hook import JitCacheHook
 from .params_hooks import CountParamsHook
+from .throughput_hook import ThroughputHook
 
-__all__ = ["CountParamsHook",
+__all__ = ["AsyncCheckpointSaverHook",
+           "BroadcastVariablesHook",
+           "CountParamsHook",
            "SaveEvaluationPredictionsHook",
-           "InitHook"]
+           "InitHook",
+           "JitCacheHook",
+           "ThroughputHook"]
@@ -0,0 +1,47 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import tensorflow as tf
+
+from naivenmt.utils import allreduce_utils
+
+
+class BroadcastVariablesHook(tf.train.SessionRunHook):
+  """Broadcast variables of the first worker of the ring to the others, so
+  that all workers start training from the same values."""
+
+  def __init__(self, root=0):
+    self.root = root
+    self._variables = None
+    self._placeholders = None
+    self._assign_op = None
+
+  def begin(self):
+    self._variables = tf.global_variables()
+    self._placeholders = [
+      tf.placeholder(v.dtype.base_dtype, v.get_shape())
+      for v in self._variables]
+    self._assign_op = tf.group(*[
+      tf.assign(v, p) for v, p in zip(self._variables, self._placeholders)])
+
+  def after_create_session(self, session, coord):
+    ring = allreduce_utils.get_ring()
+    values = session.run(self._variables)
+    feed_dict = {
+      p: ring.broadcast(value, root=self.root)
+      for p, value in zip(self._placeholders, values)}
+    session.run(self._assign_op, feed_dict=feed_dict)
+    tf.logging.info("Broadcast %d variables from worker %d." %
+                    (len(self._variables), self.root))
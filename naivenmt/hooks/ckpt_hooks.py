@@ -0,0 +1,193 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import os
+import queue
+import threading
+
+import tensorflow as tf
+
+from naivenmt.utils import ckpt_utils
+
+
+class AsyncCheckpointSaverHook(tf.train.CheckpointSaverHook):
+  """Saves checkpoints every `save_steps` steps from a background thread.
+
+  At a checkpoint step, the training loop only waits for the variables to be
+  copied to host memory, a background thread writes them. At most
+  `max_pending_saves` copies wait to be written, further saves block the
+  training loop until one is written, which bounds the memory of copies.
+  Checkpoints are named and pruned the same as `tf.train.Saver`'s.
+
+  A written checkpoint becomes the latest one in the training loop, at the
+  next step or at the end, which is when the `CheckpointSaverListener`s are
+  notified by `after_save`, so a listener always finds the checkpoint of its
+  step written. Being a `tf.train.CheckpointSaverHook`, the hook also takes
+  the saving listeners of `tf.estimator.train_and_evaluate`.
+  """
+
+  def __init__(self,
+               checkpoint_dir,
+               save_steps,
+               keep_checkpoint_max=5,
+               max_pending_saves=1,
+               checkpoint_basename="model.ckpt",
+               listeners=None):
+    """Init hook.
+
+    Args:
+      checkpoint_dir: A string, dir of checkpoints
+      save_steps: A integer, save every n steps
+      keep_checkpoint_max: A integer, number of latest checkpoints to keep,
+        all of them if None or 0
+      max_pending_saves: A integer, number of copies waiting to be written
+      checkpoint_basename: A string, basename of checkpoints
+      listeners: A list of `tf.train.CheckpointSaverListener`s
+    """
+    super(AsyncCheckpointSaverHook, self).__init__(
+      checkpoint_dir,
+      save_steps=save_steps,
+      checkpoint_basename=checkpoint_basename,
+      listeners=listeners)
+    self.checkpoint_dir = checkpoint_dir
+    self.save_steps = save_steps
+    self.keep_checkpoint_max = keep_checkpoint_max
+    self.max_pending_saves = max_pending_saves
+    self.checkpoint_basename = checkpoint_basename
+    self._timer = None
+    self._global_step = None
+    self._variables = None
+    self._queue = None
+    self._written = None
+    self._thread = None
+    self._error = None
+    self._checkpoints = []
+
+  def begin(self):
+    self._global_step = tf.train.get_global_step()
+    if self._global_step is None:
+      raise RuntimeError("Global step must be created to save checkpoints.")
+    self._variables = tf.global_variables()
+    self._timer = tf.train.SecondOrStepTimer(every_steps=self.save_steps)
+    state = tf.train.get_checkpoint_state(self.checkpoint_dir)
+    if state is not None:
+      self._checkpoints = list(state.all_model_checkpoint_paths)
+    self._queue = queue.Queue(self.max_pending_saves)
+    self._written = queue.Queue()
+    self._thread = threading.Thread(target=self._write_loop)
+    self._thread.daemon = True
+    self._thread.start()
+    for listener in self._listeners:
+      listener.begin()
+
+  def after_create_session(self, session, coord):
+    tf.train.write_graph(
+      tf.get_default_graph().as_graph_def(add_shapes=True),
+      self.checkpoint_dir, "graph.pbtxt")
+    self._timer.update_last_triggered_step(session.run(self._global_step))
+
+  def before_run(self, run_context):
+    return tf.train.SessionRunArgs(self._global_step)
+
+  def after_run(self, run_context, run_values):
+    self._raise_error()
+    if self._update_checkpoints(run_context.session):
+      run_context.request_stop()
+    stale_global_step = run_values.results
+    if self._timer.should_trigger_for_step(stale_global_step + 1):
+      global_step = run_context.session.run(self._global_step)
+      if self._timer.should_trigger_for_step(global_step):
+        self._timer.update_last_triggered_step(global_step)
+        self._save(run_context.session, global_step)
+
+  def end(self, session):
+    global_step = session.run(self._global_step)
+    if global_step != self._timer.last_triggered_step():
+      self._save(session, global_step)
+    # wait for pending saves, so the last checkpoint is written
+    self._queue.put(None)
+    self._thread.join()
+    self._raise_error()
+    self._update_checkpoints(session)
+    for listener in self._listeners:
+      listener.end(session, global_step)
+
+  def _save(self, session, global_step):
+    for listener in self._listeners:
+      listener.before_save(session, global_step)
+    values = session.run(self._variables)
+    tf.logging.info("Saving checkpoint of step %d in background." %
+                    global_step)
+    self._queue.put((global_step, values))
+
+  def _write_loop(self):
+    while True:
+      item = self._queue.get()
+      if item is None:
+        return
+      if self._error is not None:
+        # consume the copies, the error is raised in the training loop
+        continue
+      try:
+        self._written.put(self._write(*item))
+      except Exception as e:
+        self._error = e
+
+  def _write(self, global_step, values):
+    prefix = os.path.join(
+      self.checkpoint_dir, "%s-%d" % (self.checkpoint_basename, global_step))
+    writer = ckpt_utils.CheckpointWriter(
+      prefix, session_config=tf.ConfigProto(device_count={"GPU": 0}))
+    for variable, value in zip(self._variables, values):
+      name, slice_spec = ckpt_utils.checkpoint_name_and_slice(variable)
+      writer.add(name, value, slice_spec)
+    writer.close()
+    return global_step, prefix
+
+  def _update_checkpoints(self, session):
+    """Make the written checkpoints the latest ones, in the training loop.
+
+    Args:
+      session: A `tf.Session`, of the training loop
+
+    Returns:
+      A python boolean, whether a listener requests to stop training.
+    """
+    should_stop = False
+    while True:
+      try:
+        global_step, prefix = self._written.get_nowait()
+      except queue.Empty:
+        return should_stop
+      self._checkpoints = [p for p in self._checkpoints if p != prefix]
+      self._checkpoints.append(prefix)
+      stale = []
+      if self.keep_checkpoint_max:
+        stale = self._checkpoints[:-self.keep_checkpoint_max]
+        self._checkpoints = self._checkpoints[-self.keep_checkpoint_max:]
+      tf.train.update_checkpoint_state(
+        self.checkpoint_dir, prefix,
+        all_model_checkpoint_paths=self._checkpoints)
+      for path in stale:
+        for f in tf.gfile.Glob(path + ".*"):
+          tf.gfile.Remove(f)
+      tf.logging.info("Saved checkpoint %s" % prefix)
+      for listener in self._listeners:
+        if listener.after_save(session, global_step):
+          should_stop = True
+
+  def _raise_error(self):
+    if self._error is not None:
+      raise self._error
@@ -0,0 +1,73 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import tensorflow as tf
+
+
+class JitCacheHook(tf.train.SessionRunHook):
+  """Reports the hit rate of the XLA compile cache.
+
+  Clusters are compiled once per distinct input shapes, so the hit rate is
+  counted from the shapes of steps: steps of shapes seen before run the
+  compiled clusters from the cache, the others compile them.
+  """
+
+  def __init__(self, shapes, output_dir=None, every_n_steps=100):
+    """Init hook.
+
+    Args:
+      shapes: A list of 1-d int tensors, shapes of the compiled inputs
+      output_dir: A string, directory to write summaries to, if any
+      every_n_steps: A integer, log the hit rate every n steps
+    """
+    self.shapes = shapes
+    self.output_dir = output_dir
+    self.every_n_steps = every_n_steps
+    self.hits = 0
+    self.misses = 0
+    self._seen_shapes = set()
+
+  @property
+  def hit_rate(self):
+    total = self.hits + self.misses
+    return self.hits / total if total else 0.0
+
+  def before_run(self, run_context):
+    return tf.train.SessionRunArgs(self.shapes)
+
+  def after_run(self, run_context, run_values):
+    key = tuple(tuple(shape) for shape in run_values.results)
+    if key in self._seen_shapes:
+      self.hits += 1
+    else:
+      self.misses += 1
+      self._seen_shapes.add(key)
+    if (self.hits + self.misses) % self.every_n_steps == 0:
+      self._log()
+
+  def end(self, session):
+    self._log()
+    if not self.output_dir:
+      return
+    summary = tf.Summary(value=[
+      tf.Summary.Value(tag="jit_cache_hit_rate", simple_value=self.hit_rate),
+      tf.Summary.Value(tag="jit_compilations", simple_value=self.misses)])
+    writer = tf.summary.FileWriterCache.get(self.output_dir)
+    writer.add_summary(summary, self.hits + self.misses)
+    writer.flush()
+
+  def _log(self):
+    tf.logging.info("XLA compile cache hit rate: %.4f, %d compilations" %
+                    (self.hit_rate, self.misses))
@@ -0,0 +1,54 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import time
+
+import tensorflow as tf
+
+
+class ThroughputHook(tf.train.SessionRunHook):
+  """Measures training throughput, in examples per second.
+
+  Steps are counted as `batch_size` examples. The first `warmup_steps` steps,
+  which include graph optimizations and filling the input pipeline, are not
+  measured.
+  """
+
+  def __init__(self, batch_size, warmup_steps=1):
+    self.batch_size = batch_size
+    self.warmup_steps = warmup_steps
+    self.steps = 0
+    self.seconds = 0.0
+    self._run_steps = 0
+    self._start_time = None
+
+  def before_run(self, run_context):
+    self._start_time = time.time()
+
+  def after_run(self, run_context, run_values):
+    self._run_steps += 1
+    if self._run_steps > self.warmup_steps:
+      self.steps += 1
+      self.seconds += time.time() - self._start_time
+
+  @property
+  def examples_per_sec(self):
+    if not self.seconds:
+      return 0.0
+    return self.steps * self.batch_size / self.seconds
+
+  def end(self, session):
+    tf.logging.info("Throughput: %.2f examples/sec over %d steps." %
+                    (self.examples_per_sec, self.steps))
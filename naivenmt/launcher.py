@@ -0,0 +1,284 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Launch data parallel training processes on this host.
+
+In the synchronous mode, each worker trains on a distinct shard of the training
+data, and gradients are averaged by a ring all-reduce over local sockets every
+step, e.g.
+
+  python -m naivenmt.launcher --model=gnmt_model --params_file=params.json \
+    --num_workers=4 --measure_baseline
+
+Workers of other hosts can join the ring by running naivenmt.py with the same
+num_workers and worker_addresses, and their own worker_index.
+
+In the asynchronous mode, workers apply their gradients to the variables on
+parameter servers independently, see `cluster_utils`. The compare mode runs
+both modes and reports the throughput of each.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+import tensorflow as tf
+
+from naivenmt.configs import HParamsBuilder
+from naivenmt.hooks import ThroughputHook
+from naivenmt.utils import allreduce_utils
+from naivenmt.utils import cluster_utils
+from naivenmt.utils import precision_utils
+
+
+def _run_worker(model_name, configs, results):
+  # imported in the worker, which is a spawned process
+  from naivenmt.naivenmt import NaiveNMT
+  from naivenmt.naivenmt import create_model
+
+  tf.logging.set_verbosity(tf.logging.INFO)
+  hparams = HParamsBuilder(dict_config=configs).build()
+  throughput_hook = ThroughputHook(hparams.batch_size)
+  model = create_model(
+    model_name, hparams,
+    dtype=precision_utils.compute_dtype(hparams.precision))
+  naivenmt = NaiveNMT(hparams=hparams, model=model)
+  if hparams.cluster_file:
+    # parameter servers never return
+    naivenmt.train_distributed(hooks=[throughput_hook])
+    worker_index = hparams.task_index
+  else:
+    naivenmt.train(hooks=[throughput_hook])
+    worker_index = hparams.worker_index
+  results.put({
+    "worker_index": worker_index,
+    "steps": throughput_hook.steps,
+    "seconds": throughput_hook.seconds,
+    "examples_per_sec": throughput_hook.examples_per_sec
+  })
+
+
+def worker_configs(configs, num_workers, addresses):
+  """Configs of each worker, the first one saves checkpoints to `out_dir`."""
+  out_dir = HParamsBuilder(dict_config=configs).configs["out_dir"]
+  all_configs = []
+  for i in range(num_workers):
+    c = dict(configs,
+             num_workers=num_workers,
+             worker_index=i,
+             worker_addresses=",".join(addresses))
+    if i > 0:
+      c["out_dir"] = os.path.join(out_dir, "worker_%d" % i)
+    all_configs.append(c)
+  return all_configs
+
+
+def parameter_server_configs(configs, num_ps, cluster_file):
+  """Configs of the (workers, parameter servers) of a cluster.
+
+  All workers share `out_dir`, where the chief saves checkpoints.
+  """
+  cluster = cluster_utils.load_cluster(cluster_file)
+  if len(cluster["ps"]) != num_ps:
+    raise ValueError("Cluster must have %d parameter servers." % num_ps)
+  all_configs = {}
+  for task_type in ["worker", "ps"]:
+    all_configs[task_type] = [
+      dict(configs, cluster_file=cluster_file, task_type=task_type,
+           task_index=i)
+      for i in range(len(cluster[task_type]))]
+  return all_configs["worker"], all_configs["ps"]
+
+
+def _launch(model_name,
+            all_worker_configs,
+            all_ps_configs=(),
+            exit_timeout=None):
+  """Run workers and parameter servers, until all workers report.
+
+  The job fails as soon as a task exits with an error, or a parameter server
+  exits. With `exit_timeout`, it also fails when workers are still running
+  `exit_timeout` seconds after a worker exited, as workers of a ring run the
+  same steps and finish together.
+
+  Returns:
+    A list of throughput reports of the workers, ordered by worker index.
+  """
+  # tensorflow is not fork safe
+  context = multiprocessing.get_context("spawn")
+  results = context.Queue()
+  workers = [
+    context.Process(target=_run_worker, args=(model_name, c, results))
+    for c in all_worker_configs]
+  servers = [
+    context.Process(target=_run_worker, args=(model_name, c, results))
+    for c in all_ps_configs]
+  for p in servers + workers:
+    p.start()
+
+  reports = []
+  first_exit_time = None
+  try:
+    while len(reports) < len(workers):
+      try:
+        reports.append(results.get(timeout=10))
+      except queue.Empty:
+        pass
+      failed = ([p for p in workers if p.exitcode not in (None, 0)] +
+                [p for p in servers if p.exitcode is not None])
+      if failed:
+        raise RuntimeError(
+          "Task %s exited with code %d." % (failed[0].name,
+                                            failed[0].exitcode))
+      if exit_timeout is None:
+        continue
+      if first_exit_time is None:
+        if any(p.exitcode is not None for p in workers):
+          first_exit_time = time.time()
+      elif time.time() - first_exit_time > exit_timeout:
+        raise RuntimeError(
+          "Workers are still running %d seconds after a worker exited." %
+          exit_timeout)
+    for p in workers:
+      p.join()
+  finally:
+    for p in servers + workers:
+      if p.is_alive():
+        p.terminate()
+  return sorted(reports, key=lambda r: r["worker_index"])
+
+
+def launch(model_name, configs, num_workers, host="localhost"):
+  """Train synchronously with `num_workers` processes on this host.
+
+  Args:
+    model_name: A string, model name of `naivenmt.create_model`
+    configs: A dict, configs of `HParamsBuilder`
+    num_workers: A integer, number of training processes
+    host: A string, host the workers listen on
+
+  Returns:
+    A list of throughput reports of the workers, ordered by worker_index.
+  """
+  addresses = ["%s:%d" % (host, port)
+               for port in allreduce_utils.free_ports(num_workers, host)]
+  ring_timeout = HParamsBuilder(
+    dict_config=configs).configs["ring_timeout_secs"]
+  return _launch(model_name,
+                 worker_configs(configs, num_workers, addresses),
+                 exit_timeout=ring_timeout)
+
+
+def launch_parameter_servers(model_name,
+                             configs,
+                             num_workers,
+                             num_ps,
+                             host="localhost"):
+  """Train asynchronously with `num_workers` processes and `num_ps`
+  parameter servers on this host.
+
+  Args:
+    model_name: A string, model name of `naivenmt.create_model`
+    configs: A dict, configs of `HParamsBuilder`
+    num_workers: A integer, number of training processes
+    num_ps: A integer, number of parameter servers
+    host: A string, host the tasks listen on
+
+  Returns:
+    A list of throughput reports of the workers, ordered by task_index.
+  """
+  addresses = ["%s:%d" % (host, port) for port in
+               allreduce_utils.free_ports(num_workers + num_ps, host)]
+  out_dir = HParamsBuilder(dict_config=configs).configs["out_dir"]
+  if not os.path.exists(out_dir):
+    os.makedirs(out_dir)
+  cluster_file = os.path.join(out_dir, "cluster.json")
+  with open(cluster_file, mode="wt", encoding="utf8") as f:
+    json.dump({"ps": addresses[num_workers:],
+               "worker": addresses[:num_workers]}, f)
+  all_worker_configs, all_ps_configs = parameter_server_configs(
+    configs, num_ps, cluster_file)
+  return _launch(model_name, all_worker_configs, all_ps_configs)
+
+
+def scaling_efficiency(reports, baseline_examples_per_sec):
+  """Throughput of all workers relative to `len(reports)` single processes."""
+  total = sum(r["examples_per_sec"] for r in reports)
+  return total / (len(reports) * baseline_examples_per_sec)
+
+
+def print_reports(reports, baseline_examples_per_sec=None):
+  for r in reports:
+    print("worker %d: %.2f examples/sec over %d steps" %
+          (r["worker_index"], r["examples_per_sec"], r["steps"]))
+  print("total: %.2f examples/sec" %
+        sum(r["examples_per_sec"] for r in reports))
+  if baseline_examples_per_sec:
+    print("single process: %.2f examples/sec, scaling efficiency: %.2f" %
+          (baseline_examples_per_sec,
+           scaling_efficiency(reports, baseline_examples_per_sec)))
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--model", type=str,
+                      choices=["basic_model", "attention_model", "gnmt_model",
+                               "transformer_model"],
+                      default="basic_model",
+                      help="The model you want to use.")
+  parser.add_argument("--params_file", type=str,
+                      required=True,
+                      help="Params config file in JSON format.")
+  parser.add_argument("--mode", type=str,
+                      choices=["sync", "async", "compare"],
+                      default="sync",
+                      help="Synchronous training with a ring all-reduce, "
+                           "asynchronous training with parameter servers, "
+                           "or both to compare their throughput.")
+  parser.add_argument("--num_workers", type=int,
+                      default=2,
+                      help="Number of training processes.")
+  parser.add_argument("--num_ps", type=int,
+                      default=1,
+                      help="Number of parameter servers of the async mode.")
+  parser.add_argument("--measure_baseline", action="store_true",
+                      help="Train a single process first, to report the "
+                           "scaling efficiency.")
+  args, _ = parser.parse_known_args()
+  with open(args.params_file, mode="rt", encoding="utf8") as f:
+    configs = json.load(f)
+
+  baseline = None
+  if args.measure_baseline:
+    out_dir = HParamsBuilder(dict_config=configs).configs["out_dir"]
+    baseline_configs = dict(
+      configs, out_dir=os.path.join(out_dir, "baseline"))
+    baseline = launch(args.model, baseline_configs, 1)[0]["examples_per_sec"]
+  if args.mode in ["sync", "compare"]:
+    print("synchronous training:")
+    print_reports(launch(args.model, configs, args.num_workers), baseline)
+  if args.mode in ["async", "compare"]:
+    # start from scratch, rather than the checkpoints of the sync mode
+    async_configs = dict(configs)
+    if args.mode == "compare":
+      async_configs["out_dir"] = os.path.join(
+        HParamsBuilder(dict_config=configs).configs["out_dir"], "async")
+    print("asynchronous training with %d parameter servers:" % args.num_ps)
+    print_reports(
+      launch_parameter_servers(
+        args.model, async_configs, args.num_workers, args.num_ps),
+      baseline)
@@ -0,0 +1,199 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import tensorflow as tf
+
+from naivenmt.layers.transformer import layer_norm
+
+
+class LayerNormLSTMCell(tf.contrib.rnn.LayerNormBasicLSTMCell):
+  """`LayerNormBasicLSTMCell` normalized by the single pass `layer_norm`.
+
+  Variables have the same names as `LayerNormBasicLSTMCell`'s, so checkpoints
+  are compatible with each other.
+  """
+
+  def __init__(self, num_units, forget_bias=1.0, epsilon=1e-6, reuse=None):
+    """Init cell.
+
+    Args:
+      num_units: A integer, number of units
+      forget_bias: A float, forget bias
+      epsilon: A float, epsilon of layer normalization
+      reuse: A boolean, reuse variables or not
+    """
+    super(LayerNormLSTMCell, self).__init__(
+      num_units, forget_bias=forget_bias, layer_norm=True, reuse=reuse)
+    self._epsilon = epsilon
+
+  def _norm(self, inp, scope, dtype=tf.float32):
+    return layer_norm(inp, epsilon=self._epsilon, dtype=dtype, scope=scope)
+
+
+class SRUCell(tf.nn.rnn_cell.RNNCell):
+  """Simple Recurrent Unit, https://arxiv.org/abs/1709.02755.
+
+  The matmuls of the unit only depend on the inputs, so `project_inputs` can
+  compute them for all time steps at once, leaving the elementwise ops of
+  `recur` to the recurrence, see `dynamic_sru`. Stepping the cell does both
+  for a single step, which is how decoders use it.
+  """
+
+  def __init__(self,
+               num_units,
+               forget_bias=1.0,
+               activation=None,
+               reuse=None,
+               name=None):
+    """Init cell.
+
+    Args:
+      num_units: A integer, number of units
+      forget_bias: A float, forget bias
+      activation: Activation of the cell state, defaults to tanh
+      reuse: A boolean, reuse variables or not
+      name: A string, name of the cell
+    """
+    super(SRUCell, self).__init__(_reuse=reuse, name=name)
+    self._num_units = num_units
+    self._forget_bias = forget_bias
+    self._activation = activation or tf.tanh
+
+  @property
+  def state_size(self):
+    return self._num_units
+
+  @property
+  def output_size(self):
+    return self._num_units
+
+  def build(self, inputs_shape):
+    input_depth = inputs_shape[-1].value
+    # inputs of the highway connection are projected if their depth differs
+    num_projections = 3 if input_depth == self._num_units else 4
+    self._kernel = self.add_variable(
+      "kernel", shape=[input_depth, num_projections * self._num_units])
+    self._bias = self.add_variable(
+      "bias", shape=[2 * self._num_units], initializer=tf.zeros_initializer())
+    self.built = True
+
+  def project_inputs(self, inputs):
+    """Project inputs of any rank, e.g. [T, B, D] for whole sequences.
+
+    Args:
+      inputs: A tensor, inputs with depth in the last dimension
+
+    Returns:
+      A tensor of depth 4 * num_units, the inputs of `recur`
+    """
+    if not self.built:
+      self.build(inputs.get_shape())
+    input_depth = inputs.get_shape()[-1].value
+    projections = tf.matmul(tf.reshape(inputs, [-1, input_depth]), self._kernel)
+    x = projections[:, :self._num_units]
+    gates = projections[:, self._num_units:]
+    if input_depth == self._num_units:
+      gates, highway = gates + self._bias, tf.reshape(inputs, [-1, input_depth])
+    else:
+      gates, highway = (
+        gates[:, :2 * self._num_units] + self._bias,
+        gates[:, 2 * self._num_units:])
+    projections = tf.concat([x, gates, highway], -1)
+    outputs_shape = tf.concat([tf.shape(inputs)[:-1], [4 * self._num_units]], 0)
+    projections = tf.reshape(projections, outputs_shape)
+    projections.set_shape(
+      inputs.get_shape()[:-1].concatenate([4 * self._num_units]))
+    return projections
+
+  def recur(self, projections, state):
+    """One step of the recurrence, elementwise ops only.
+
+    Args:
+      projections: A tensor of shape [B, 4 * num_units], from `project_inputs`
+      state: A tensor of shape [B, num_units], the previous cell state
+
+    Returns:
+      outputs: A tensor of shape [B, num_units]
+      state: A tensor of shape [B, num_units]
+    """
+    x, f, r, highway = tf.split(projections, 4, axis=-1)
+    f = tf.sigmoid(f + self._forget_bias)
+    r = tf.sigmoid(r)
+    c = f * state + (1.0 - f) * x
+    h = r * self._activation(c) + (1.0 - r) * highway
+    return h, c
+
+  def call(self, inputs, state):
+    return self.recur(self.project_inputs(inputs), state)
+
+
+class _SRURecurrenceCell(tf.nn.rnn_cell.RNNCell):
+  """Steps the recurrence of a `SRUCell` over projected inputs."""
+
+  def __init__(self, cell):
+    super(_SRURecurrenceCell, self).__init__()
+    self._cell = cell
+
+  @property
+  def state_size(self):
+    return self._cell.state_size
+
+  @property
+  def output_size(self):
+    return self._cell.output_size
+
+  def call(self, inputs, state):
+    return self._cell.recur(inputs, state)
+
+
+def dynamic_sru(cell,
+                inputs,
+                sequence_length=None,
+                initial_state=None,
+                dtype=None,
+                parallel_iterations=None,
+                swap_memory=False,
+                time_major=False):
+  """Run a `SRUCell` over whole sequences, the same as `tf.nn.dynamic_rnn`.
+
+  The projections of all time steps are computed by a single matmul before the
+  loop, so the sequential part has elementwise ops only. Variables are created
+  in the current variable scope, with the same names as stepping the cell.
+
+  Args:
+    cell: A `SRUCell`
+    inputs: A tensor, [B, T, D] or [T, B, D] if `time_major`
+    sequence_length: A tensor, input sequences' length
+    initial_state: A tensor, initial state of the cell
+    dtype: Data type of the state if `initial_state` is not provided
+    parallel_iterations: A integer, number of iterations run in parallel
+    swap_memory: A boolean, swap memory from GPU to CPU in the loop
+    time_major: A boolean, shape format of `inputs` and outputs
+
+  Returns:
+    outputs: A tensor of the same format as `inputs`
+    state: A tensor, final state of the cell
+  """
+  projections = cell.project_inputs(inputs)
+  return tf.nn.dynamic_rnn(
+    cell=_SRURecurrenceCell(cell),
+    inputs=projections,
+    sequence_length=sequence_length,
+    initial_state=initial_state,
+    dtype=dtype,
+    parallel_iterations=parallel_iterations,
+    swap_memory=swap_memory,
+    time_major=time_major,
+    scope=tf.get_variable_scope())
@@ -13,138 +13,366 @@
 # limitations under the License.
 # ==============================================================================
 
+import functools
+
 import numpy as np
 import tensorflow as tf
 
 
-# This function is modified from https://github.com/Kyubyong/transformer/blob/master/modules.py
-#  with Apache License V2
-def positional_encoding(inputs,
-                        num_units,
-                        scope="positional_encoding"):
-  """Positional encoding as described in https://arxiv.org/abs/1706.03762.
+@functools.lru_cache(maxsize=None)
+def positional_encoding_table(max_length, num_units):
+  """Sinusoid positional encoding table, computed once per shape.
 
   Args:
-    inputs: A 2-d tensor with shape [B, L]. B->Batch size, L->Time steps
+    max_length: Max number of positions
     num_units: The model's dimension
-    scope: Variable scope
 
   Returns:
-    A tensor with shape [B,L,D]. D->Model's dimension
+    A numpy array with shape [max_length, num_units]
   """
-  batch_size, time_steps = inputs.get_shape().as_list()
-  with tf.variable_scope(scope):
-    position_index = tf.tile(
-      tf.expand_dims(tf.range(time_steps), 0), [batch_size, 1])
-
-    position_encoding = np.array([
-      [pos / np.power(10000, 2. * i / num_units) for i in range(num_units)]
-      for pos in range(time_steps)])
-    position_encoding[:, 0::2] = np.sin(position_encoding[:, 0::2])  # dim 2i
-    position_encoding[:, 1::2] = np.cos(position_encoding[:, 1::2])  # dim 2i+1
+  position = np.arange(max_length, dtype=np.float64)[:, np.newaxis]  # [L,1]
+  dims = np.arange(num_units)[np.newaxis, :]  # [1,D]
+  angles = position / np.power(10000.0, 2.0 * (dims // 2) / num_units)  # [L,D]
+  table = np.empty_like(angles)
+  table[:, 0::2] = np.sin(angles[:, 0::2])  # dim 2i
+  table[:, 1::2] = np.cos(angles[:, 1::2])  # dim 2i+1
+  return table.astype(np.float32)
 
-    # Convert to a tensor
-    lookup_table = tf.convert_to_tensor(position_encoding)
 
-    outputs = tf.nn.embedding_lookup(lookup_table, position_index)
+def positional_encoding(inputs,
+                        num_units,
+                        max_length=1024,
+                        offset=0,
+                        scope="positional_encoding"):
+  """Positional encoding as described in https://arxiv.org/abs/1706.03762.
 
-    return outputs
+  The table is stored as a single constant per graph and sliced to the
+  dynamic length of inputs.
 
+  Args:
+    inputs: A 3-d tensor with shape [B, L, D]. B->Batch size, L->Time steps
+    num_units: The model's dimension
+    max_length: Max length of inputs that the table covers
+    offset: A scalar, position of the first step of inputs, e.g. the step of
+      incremental decoding
+    scope: Name scope
 
-def layer_norm(inputs, epsilon=1e-8, scope="layer_norm"):
+  Returns:
+    A tensor with shape [1, L, D], which broadcasts over the batch.
+  """
+  with tf.name_scope(scope):
+    key = "positional_encoding_%d_%d" % (max_length, num_units)
+    tables = tf.get_collection(key)
+    if tables:
+      table = tables[0]
+    else:
+      # create the constant outside any control flow context (e.g. the
+      # greedy decoding loop), so that it can be shared across the graph
+      with tf.control_dependencies(None):
+        table = tf.constant(
+          positional_encoding_table(max_length, num_units), name="table")
+      tf.add_to_collection(key, table)
+
+    time_steps = tf.shape(inputs)[1]
+    assert_op = tf.assert_less_equal(
+      offset + time_steps, max_length,
+      message="Sequence is longer than the positional encoding table.")
+    with tf.control_dependencies([assert_op]):
+      outputs = tf.expand_dims(table[offset:offset + time_steps], 0)  # [1,L,D]
+    return tf.cast(outputs, inputs.dtype)
+
+
+def layer_norm(inputs, epsilon=1e-6, dtype=None, scope="layer_norm"):
   """Layer normalization.
 
-    norm = gamma * (inputs - mean) / sqrt(variance + epsilon)
+    norm = gamma * (inputs - mean) / sqrt(variance + epsilon) + beta
+
+  Mean and variance are computed in a single pass over the inputs, from the
+  means of inputs and of squared inputs, in float32 for inputs of reduced
+  precision. The inputs are shifted by their first element of the last axis
+  before, so E[x^2] - E[x]^2 does not cancel out the variance of inputs far
+  from zero. `beta` and `gamma` are created by `tf.get_variable`, so they are
+  shared when `scope` is reused.
 
   Args:
-    inputs: Input tensor, shape is [B,L,D]. B->Batch size, L->Time steps, D->Model's dim
+    inputs: Input tensor, shape is [..., D]. D->Model's dim
     epsilon: A very small float number to avoid zero division error
+    dtype: A `tf.DType`, dtype of `beta` and `gamma`, float32 if None
     scope: Variable scope or name
 
   Returns:
-    The normalized tensor with shape [B,L,D]
+    The normalized tensor with the same shape as inputs
   """
   with tf.variable_scope(scope):
-    inputs_shape = inputs.get_shape()
-    params_shape = inputs_shape[-1:]
-
-    mean, variance = tf.nn.moments(inputs, [-1], keep_dims=True)
-    beta = tf.Variable(tf.zeros(params_shape))
-    gamma = tf.Variable(tf.ones(params_shape))
-    normalized = (inputs - mean) / ((variance + epsilon) ** .5)
-    outputs = gamma * normalized + beta
-  return outputs
-
-
-def scaled_dot_product_attention(q, k, v, scale=None, mask=None, dropout=0.2):
+    params_shape = inputs.get_shape()[-1:]
+    beta = tf.get_variable(
+      "beta", params_shape, dtype=dtype, initializer=tf.zeros_initializer())
+    gamma = tf.get_variable(
+      "gamma", params_shape, dtype=dtype, initializer=tf.ones_initializer())
+
+    x = tf.to_float(inputs)
+    # the variance does not depend on the shift, nor do the gradients
+    shift = tf.stop_gradient(x[..., :1])
+    shifted = x - shift
+    shifted_mean = tf.reduce_mean(shifted, axis=-1, keepdims=True)
+    mean_square = tf.reduce_mean(tf.square(shifted), axis=-1, keepdims=True)
+    # clip the rounding error of E[x^2] - E[x]^2
+    variance = tf.maximum(mean_square - tf.square(shifted_mean), 0.0)
+    scale = tf.rsqrt(variance + epsilon) * tf.to_float(gamma)
+    outputs = (shifted - shifted_mean) * scale + tf.to_float(beta)
+  return tf.cast(outputs, inputs.dtype)
+
+
+def scaled_dot_product_attention(q,
+                                 k,
+                                 v,
+                                 scale=None,
+                                 mask=None,
+                                 dropout=0.2,
+                                 seed=None):
   """Scaled dot-product attention.
 
   Args:
-    q: Query tensor, with shape [h*B, L, D/h]. h->num_heads
-    k: Key tensor, with shape [h*B, L, D/h]
-    v: Value tensor, with shape [h*B, L, D/h]
+    q: Query tensor, with shape [B, h, L_q, D/h]. h->num_heads
+    k: Key tensor, with shape [B, h, L_k, D/h]
+    v: Value tensor, with shape [B, h, L_k, D/h]
     scale: A scalar, scale factor, sqrt(D)
-    mask: Attention mask, with shape [h*B, L, L]
+    mask: Attention mask which broadcasts to [B, h, L_q, L_k], e.g. with
+      shape [B, 1, 1, L_k] or [B, 1, L_q, L_k]. 1 for the positions to
+      attend and 0 for the positions to blind
     dropout: A scalar, dropout rate
+    seed: A python integer, seed of the dropout op
 
   Returns:
     An output tensor and a attention tensor
   """
-  dot = tf.matmul(q, k, transpose_b=True)  # [h*B,L,L]
+  dot = tf.matmul(q, k, transpose_b=True)  # [B,h,L_q,L_k]
   if scale:
     dot = dot * scale
-  if mask:
-    padding = tf.ones_like(dot) * dot.dtype.min
-    dot = tf.where(tf.equal(mask, 0), padding, dot)
+  if mask is not None:
+    dot += (1.0 - tf.cast(mask, dot.dtype)) * _blind_value(dot.dtype)
   attention = tf.nn.softmax(dot)
-  attention = tf.nn.dropout(attention, dropout)
+  attention = tf.nn.dropout(attention, 1.0 - dropout, seed=seed)
   output = tf.matmul(attention, v)
   return output, attention
 
 
+def _blind_value(dtype):
+  """Value added to the scores of blinded positions, finite in `dtype`."""
+  return -1e4 if dtype == tf.float16 else -1e9
+
+
+def _slice_chunk(inputs, axis, start, size):
+  """Slice `size` elements from `start` along axis 2 or 3 of a 4-d tensor.
+
+  Broadcast axes (dim 1) of masks are kept as they are: `start % 1` is 0 and
+  the slice is clipped to the only element.
+  """
+  start = start % tf.shape(inputs)[axis]
+  if axis == 2:
+    return inputs[:, :, start:start + size, :]
+  return inputs[:, :, :, start:start + size]
+
+
+def chunked_dot_product_attention(q,
+                                  k,
+                                  v,
+                                  scale=None,
+                                  mask=None,
+                                  dropout=0.2,
+                                  chunk_size=128,
+                                  seed=None):
+  """Memory-efficient scaled dot-product attention.
+
+  Queries are processed in chunks of `chunk_size`. For each chunk, the softmax
+  over keys is accumulated block by block with a running max and sum, so only
+  [B, h, C, C] scores are alive at a time instead of [B, h, L_q, L_k]. The
+  outputs are the same as `scaled_dot_product_attention`.
+
+  Args:
+    q: Query tensor, with shape [B, h, L_q, D/h]. h->num_heads
+    k: Key tensor, with shape [B, h, L_k, D/h]
+    v: Value tensor, with shape [B, h, L_k, D/h]
+    scale: A scalar, scale factor, sqrt(D)
+    mask: Attention mask which broadcasts to [B, h, L_q, L_k]
+    dropout: A scalar, dropout rate
+    chunk_size: A scalar, number of queries and keys processed at a time
+    seed: A python integer, seed of the dropout op
+
+  Returns:
+    An output tensor, attention weights are not materialized
+  """
+  if scale:
+    q = q * scale
+  q_len = tf.shape(q)[2]
+  k_len = tf.shape(k)[2]
+
+  def _attend_chunk(q_start, outputs):
+    q_chunk = q[:, :, q_start:q_start + chunk_size, :]  # [B,h,C,D/h]
+    if mask is not None:
+      q_mask = _slice_chunk(mask, 2, q_start, chunk_size)
+    state_shape = tf.concat([tf.shape(q_chunk)[:3], [1]], 0)  # [B,h,C,1]
+
+    def _attend_block(k_start, acc, running_max, running_sum):
+      k_block = k[:, :, k_start:k_start + chunk_size, :]
+      v_block = v[:, :, k_start:k_start + chunk_size, :]
+      dot = tf.matmul(q_chunk, k_block, transpose_b=True)  # [B,h,C,C]
+      if mask is not None:
+        block_mask = _slice_chunk(q_mask, 3, k_start, chunk_size)
+        dot += (1.0 - tf.cast(block_mask, dot.dtype)) * _blind_value(dot.dtype)
+      new_max = tf.maximum(
+        running_max, tf.reduce_max(dot, axis=-1, keepdims=True))
+      correction = tf.exp(running_max - new_max)
+      weights = tf.exp(dot - new_max)
+      running_sum = running_sum * correction + tf.reduce_sum(
+        weights, axis=-1, keepdims=True)
+      weights = tf.nn.dropout(weights, 1.0 - dropout, seed=seed)
+      acc = acc * correction + tf.matmul(weights, v_block)
+      return k_start + chunk_size, acc, new_max, running_sum
+
+    _, acc, _, running_sum = tf.while_loop(
+      lambda k_start, *_: k_start < k_len,
+      _attend_block,
+      (tf.constant(0),
+       tf.zeros_like(q_chunk),
+       tf.fill(state_shape, tf.constant(float("-inf"), dtype=q.dtype)),
+       tf.zeros(state_shape, dtype=q.dtype)))
+    output = acc / running_sum  # [B,h,C,D/h]
+    outputs = outputs.write(
+      q_start // chunk_size, tf.transpose(output, perm=[2, 0, 1, 3]))
+    return q_start + chunk_size, outputs
+
+  _, outputs = tf.while_loop(
+    lambda q_start, _: q_start < q_len,
+    _attend_chunk,
+    (tf.constant(0),
+     tf.TensorArray(q.dtype, size=0, dynamic_size=True, infer_shape=False)))
+  outputs = outputs.concat()  # [L_q,B,h,D/h]
+  return tf.transpose(outputs, perm=[1, 2, 0, 3])
+
+
+def split_heads(inputs, num_heads):
+  """Split the last dimension into heads.
+
+  Args:
+    inputs: A tensor with shape [B, L, D]
+    num_heads: A scalar, number of heads
+
+  Returns:
+    A tensor with shape [B, h, L, D/h]
+  """
+  depth = inputs.get_shape().as_list()[-1]
+  shape = tf.shape(inputs)
+  outputs = tf.reshape(
+    inputs, [shape[0], shape[1], num_heads, depth // num_heads])
+  return tf.transpose(outputs, perm=[0, 2, 1, 3])
+
+
+def combine_heads(inputs):
+  """Inverse of `split_heads`.
+
+  Args:
+    inputs: A tensor with shape [B, h, L, D/h]
+
+  Returns:
+    A tensor with shape [B, L, D]
+  """
+  _, num_heads, _, depth = inputs.get_shape().as_list()
+  outputs = tf.transpose(inputs, perm=[0, 2, 1, 3])
+  shape = tf.shape(outputs)
+  return tf.reshape(outputs, [shape[0], shape[1], num_heads * depth])
+
+
+def memory_keys_values(memory, model_dim, num_heads):
+  """Keys and values of attention to `memory`, by the fused key-value
+  projection of the current variable scope.
+
+  Args:
+    memory: Memory tensor, with shape [B, L_k, D_m]
+    model_dim: A scalar, the model's dimension D
+    num_heads: A scalar, number of heads to split
+
+  Returns:
+    Key and value tensors, with shape [B, h, L_k, D/h]
+  """
+  kv = tf.layers.dense(memory, 2 * model_dim, activation=tf.nn.relu, name="kv")
+  k, v = tf.split(kv, 2, axis=2)  # [B, L_k, D]
+  return split_heads(k, num_heads), split_heads(v, num_heads)
+
+
 def multihead_attention(queries,
-                        keys,
-                        values,
+                        memory=None,
                         num_heads=8,
                         dropout=0.2,
                         mask=None,
+                        chunk_size=0,
+                        seed=None,
+                        cache=None,
                         scope="multihead_attention"):
   """Multi-head attention mechanism.
 
+  Queries, keys and values are computed by one fused projection for
+  self-attention, or by a query projection plus a fused key-value projection
+  when attending to `memory`.
+
+  In incremental decoding, `cache` holds the "keys" and "values" of the
+  previous steps, so only the new step is projected. Self-attention appends
+  the keys and values of the new step to the cache, attention to memory uses
+  the cached ones, computed once by `memory_keys_values`.
+
   Args:
-    queries: Query tensor, with shape [h*B, L, D/h]. h->num_heads
-    keys: Key tensor, with shape [h*B, L, D/h]
-    values: Value tensor, with shape [h*B, L, D/h]
+    queries: Query tensor, with shape [B, L_q, D]
+    memory: Memory tensor that keys and values are computed from, with shape
+      [B, L_k, D]. None for self-attention.
     num_heads: A scalar, number of heads to split
     dropout: A scalar, dropout rate.
-    mask: Making tensor, with shape [B, L, L]
+    mask: Making tensor which broadcasts to [B, h, L_q, L_k]. h->num_heads
+    chunk_size: A scalar, use `chunked_dot_product_attention` with this chunk
+      size if > 0. The attention tensor returned is None in that case.
+    seed: A python integer, seed of the dropout ops. Dropout ops are seeded
+      with `seed` and `seed + 1`, None for random seeds
+    cache: A dict of keys and values, updated in place by self-attention
     scope: A string, variable scope name.
 
   Returns:
     An output tensor and a attention tensor
   """
-  with tf.variable_scope(scope) as scope:
-    model_dim = queries.get_shape()[-1]
-
-    q = tf.layers.dense(
-      queries, model_dim, activation=tf.nn.relu)  # (B, L_q, D]
-    k = tf.layers.dense(
-      keys, model_dim, activation=tf.nn.relu)
-    v = tf.layers.dense(
-      values, model_dim, activation=tf.nn.relu)
-
-    # split and concat
-    q = tf.concat(tf.split(q, num_heads, axis=2), 0)  # [h*B, L_q, D/h]
-    k = tf.concat(tf.split(k, num_heads, axis=2), 0)
-    v = tf.concat(tf.split(v, num_heads, axis=2), 0)
+  with tf.variable_scope(scope):
+    model_dim = queries.get_shape().as_list()[-1]
+
+    if memory is None:
+      qkv = tf.layers.dense(
+        queries, 3 * model_dim, activation=tf.nn.relu, name="qkv")
+      q, k, v = tf.split(qkv, 3, axis=2)  # [B, L_q, D]
+      k = split_heads(k, num_heads)  # [B, h, L_q, D/h]
+      v = split_heads(v, num_heads)
+      if cache is not None:
+        k = tf.concat([cache["keys"], k], axis=2)  # [B, h, L_k, D/h]
+        v = tf.concat([cache["values"], v], axis=2)
+        cache["keys"], cache["values"] = k, v
+    else:
+      q = tf.layers.dense(
+        queries, model_dim, activation=tf.nn.relu, name="q")  # [B, L_q, D]
+      if cache is not None:
+        k, v = cache["keys"], cache["values"]
+      else:
+        k, v = memory_keys_values(memory, model_dim, num_heads)
+
+    q = split_heads(q, num_heads)  # [B, h, L_q, D/h]
 
     scale = (model_dim // num_heads) ** -0.5
-    output, attention = scaled_dot_product_attention(
-      q, k, v, scale, mask, dropout)
-
-    output = tf.concat(tf.split(output, num_heads, axis=0), 2)
-    output = tf.layers.dense(output, model_dim)
-    output = tf.nn.dropout(output, dropout)
+    if chunk_size > 0:
+      output = chunked_dot_product_attention(
+        q, k, v, scale, mask, dropout, chunk_size, seed)
+      attention = None
+    else:
+      output, attention = scaled_dot_product_attention(
+        q, k, v, scale, mask, dropout, seed)
+
+    output = combine_heads(output)  # [B, L_q, D]
+    output = tf.layers.dense(output, model_dim, name="output")
+    output = tf.nn.dropout(
+      output, 1.0 - dropout, seed=None if seed is None else seed + 1)
 
     # residual
     output += queries
@@ -158,6 +386,7 @@ def positional_wise_feed_forward_network(inputs,
                                          model_dim=512,
                                          ffn_dim=2048,
                                          dropout=0.2,
+                                         seed=None,
                                          scope="ffn"):
   """Positional-wise feed forward network.
 
@@ -166,22 +395,23 @@ def positional_wise_feed_forward_network(inputs,
     model_dim: Model's dimension
     ffn_dim: FFN's inner dimension
     dropout: A scalar, dropout rate
+    seed: A python integer, seed of the dropout op
     scope: Variable's scope or name
 
   Returns:
     An output tensor with shape [B,L,D]
   """
-  with tf.variable_scope(scope) as scope:
-    params = {"inputs": inputs, "filters": model_dim, "kernel_size": 1,
-              "activation": tf.nn.relu, "use_bias": True}
+  with tf.variable_scope(scope):
+    params = {"inputs": inputs, "filters": ffn_dim, "kernel_size": 1,
+              "activation": tf.nn.relu, "use_bias": True, "name": "inner"}
     outputs = tf.layers.conv1d(**params)
 
     # Readout layer
-    params = {"inputs": outputs, "filters": ffn_dim, "kernel_size": 1,
-              "activation": None, "use_bias": True}
+    params = {"inputs": outputs, "filters": model_dim, "kernel_size": 1,
+              "activation": None, "use_bias": True, "name": "readout"}
     outputs = tf.layers.conv1d(**params)
 
-    outputs = tf.layers.dropout(outputs, dropout)
+    outputs = tf.nn.dropout(outputs, 1.0 - dropout, seed=seed)
 
     # residual and layer norm
     outputs += inputs
@@ -190,37 +420,33 @@ def positional_wise_feed_forward_network(inputs,
     return outputs
 
 
-def padding_mask(seq_k, seq_q, num_heads):
-  """Padding mask.
+def padding_mask(sequence_length, maxlen=None, dtype=tf.float32):
+  """Padding mask, built from sequence length.
 
   Args:
-    seq_k: Keys tensor with shape [B,L,D]
-    seq_q: Queries tensor with shape [B,L,D]
-    num_heads: A scalar, number of heads
+    sequence_length: Length tensor of keys with shape [B]
+    maxlen: A scalar, max length of keys
+    dtype: Data type
 
   Returns:
-    A masking tensor with shape [B,L,L]
+    A masking tensor with shape [B,1,1,L], which broadcasts over heads and
+    queries.
   """
-  mask = tf.sign(tf.abs(tf.reduce_sum(seq_k, axis=-1)))  # [B,L]
-  mask = tf.tile(mask, [num_heads, 1])  # [h*B,L]
-  mask = tf.tile(tf.expand_dims(mask, 1), [1, tf.shape(seq_q)[1], 1])  # [B,L,L]
-  return mask
+  mask = tf.sequence_mask(sequence_length, maxlen=maxlen, dtype=dtype)  # [B,L]
+  return tf.expand_dims(tf.expand_dims(mask, 1), 1)  # [B,1,1,L]
 
 
-def sequence_mask(seq, num_heads, dtype=tf.float32):
+def sequence_mask(length, dtype=tf.float32):
   """Sequence mask to blind feature time steps.
 
   Args:
-    seq: Input tensor with shape [B,L,D]
-    num_heads: A scalar, number of heads
+    length: A scalar, length of the sequence
     dtype: Data type
 
   Returns:
-    A maksing tensor with shape [h*B,L,L]
+    A maksing tensor with shape [1,1,L,L], which broadcasts over batch and
+    heads.
   """
-  batch_size = tf.shape(seq)[0]
-  length = tf.shape(seq)[1]
-  diag = tf.ones(shape=[length, length], dtype=dtype)  # [L,L]
-  tril = tf.linalg.LinearOperatorLowerTriangular(diag).to_dense()  # [L,L]
-  mask = tf.tile(tf.expand_dims(tril, 0), [num_heads * batch_size, 1, 1])  # [h*B,L,L]
-  return mask
+  tril = tf.matrix_band_part(
+    tf.ones(shape=[length, length], dtype=dtype), -1, 0)  # [L,L]
+  return tf.expand_dims(tf.expand_dims(tril, 0), 0)  # [1,1,L,L]
@@ -18,7 +18,7 @@ from .attention_model import AttentionModel
 from .basic_model import BasicModel
 from .gnmt_model import GNMTModel
 from .seq2seq import Seq2SeqModel
-from .transformer import Transformer
+from .transformer import TransformerModel
 
-__all__ = ["BasicModel", "AttentionModel", "GNMTModel", "Transformer",
+__all__ = ["BasicModel", "AttentionModel", "GNMTModel", "TransformerModel",
            "AbstractModel", "Seq2SeqModel"]
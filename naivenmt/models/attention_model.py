@@ -19,7 +19,8 @@ from tensorflow.python.ops import lookup_ops
 from naivenmt.decoders.attention_decoder import AttentionDecoder
 from naivenmt.embeddings.embedding import Embedding
 from naivenmt.encoders.basic_encoder import BasicEncoder
-from naivenmt.models import Seq2SeqModel
+from naivenmt.encoders.conv_encoder import ConvEncoder
+from naivenmt.models.seq2seq import Seq2SeqModel
 
 
 class AttentionModel(Seq2SeqModel):
@@ -29,6 +30,12 @@ class AttentionModel(Seq2SeqModel):
                params,
                scope="attention_model",
                dtype=tf.float32):
+    super(AttentionModel, self).__init__(
+      params=params,
+      scope=scope,
+      dtype=dtype)
+
+  def build_components(self, params, dtype):
     embedding = Embedding(src_vocab_size=params.source_vocab_size,
                           tgt_vocab_size=params.target_vocab_size,
                           share_vocab=params.share_vocab,
@@ -38,10 +45,16 @@ class AttentionModel(Seq2SeqModel):
                           tgt_vocab_file=params.target_vocab_file,
                           src_embedding_file=params.source_embedding_file,
                           tgt_embedding_file=params.target_embedding_file,
+                          num_partitions=params.num_embedding_partitions,
                           dtype=dtype)
-    encoder = BasicEncoder(params=params,
-                           scope="basic_encoder",
-                           dtype=dtype)
+    if params.encoder_type == "conv":
+      encoder = ConvEncoder(params=params,
+                            scope="conv_encoder",
+                            dtype=dtype)
+    else:
+      encoder = BasicEncoder(params=params,
+                             scope="basic_encoder",
+                             dtype=dtype)
     tgt_str2idx = lookup_ops.index_table_from_file(params.target_vocab_file,
                                                    default_value=0)
     sos_id = tgt_str2idx.lookup(params.sos)
@@ -52,9 +65,4 @@ class AttentionModel(Seq2SeqModel):
                                eos_id=eos_id,
                                scope="attention_decoder",
                                dtype=dtype)
-    super(AttentionModel, self).__init__(
-      embedding=embedding,
-      encoder=encoder,
-      decoder=decoder,
-      scope=scope,
-      dtype=dtype)
+    return embedding, encoder, decoder
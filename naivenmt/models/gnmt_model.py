@@ -19,7 +19,7 @@ from tensorflow.python.ops import lookup_ops
 from naivenmt.decoders.gnmt_decoder import GNMTDecoder
 from naivenmt.embeddings.embedding import Embedding
 from naivenmt.encoders.gnmt_encoder import GNMTEncoder
-from naivenmt.models import Seq2SeqModel
+from naivenmt.models.seq2seq import Seq2SeqModel
 
 
 class GNMTModel(Seq2SeqModel):
@@ -29,6 +29,12 @@ class GNMTModel(Seq2SeqModel):
                params,
                scope="gnmt_model",
                dtype=tf.float32):
+    super(GNMTModel, self).__init__(
+      params=params,
+      scope=scope,
+      dtype=dtype)
+
+  def build_components(self, params, dtype):
     embedding = Embedding(src_vocab_size=params.source_vocab_size,
                           tgt_vocab_size=params.target_vocab_size,
                           share_vocab=params.share_vocab,
@@ -38,6 +44,7 @@ class GNMTModel(Seq2SeqModel):
                           tgt_vocab_file=params.target_vocab_file,
                           src_embedding_file=params.source_embedding_file,
                           tgt_embedding_file=params.target_embedding_file,
+                          num_partitions=params.num_embedding_partitions,
                           dtype=dtype)
     encoder = GNMTEncoder(params=params,
                           scope="gnmt_encoder",
@@ -52,9 +59,4 @@ class GNMTModel(Seq2SeqModel):
                           eos_id=eos_id,
                           scope="gnmt_decoder",
                           dtype=dtype)
-    super(GNMTModel, self).__init__(
-      embedding=embedding,
-      encoder=encoder,
-      decoder=decoder,
-      scope=scope,
-      dtype=dtype)
+    return embedding, encoder, decoder
@@ -13,85 +13,156 @@
 # limitations under the License.
 # ==============================================================================
 
+import abc
+
 import tensorflow as tf
 from tensorflow.python.ops import lookup_ops
 
+from naivenmt.hooks import JitCacheHook
 from naivenmt.models.abstract_model import AbstractModel
+from naivenmt.utils import allreduce_utils
+from naivenmt.utils import ckpt_utils
 from naivenmt.utils import collection_utils
 from naivenmt.utils import constants
 from naivenmt.utils import dataset_utils
+from naivenmt.utils import device_utils
+from naivenmt.utils import ema_utils
+from naivenmt.utils import gradient_utils
 from naivenmt.utils import learning_rate_utils as lr_utils
+from naivenmt.utils import precision_utils
 
 
 class Seq2SeqModel(AbstractModel):
 
   def __init__(self,
-               embedding,
-               encoder,
-               decoder,
+               params,
                scope="seq2seq",
                dtype=tf.float32):
-    self.embedding = embedding
-    self.encoder = encoder
-    self.decoder = decoder
     self.scope = scope
+    # compute dtype of training
     self.dtype = dtype
+    # Sequences in features and labels are [T, B] if time major, else [B, T].
+    # The model consumes them as they are, from the inputs to the loss.
+    self.time_major = params.time_major
+    # built by `build_components` in the graph of each model_fn call
+    self.embedding = None
+    self.encoder = None
+    self.decoder = None
+
+  @abc.abstractmethod
+  def build_components(self, params, dtype):
+    """Build the components of the model, in the graph of `model_fn`.
+
+    The estimator calls `model_fn` in a new graph, under its device function,
+    so the lookup tables and variables of the components are created there.
+
+    Args:
+      params: hparams
+      dtype: A `tf.DType`, dtype the components compute in
+
+    Returns:
+      A (embedding, encoder, decoder) tuple.
+    """
 
   def input_fn(self, params, mode):
-    return dataset_utils.build_dataset(params, mode)
+    if mode == tf.estimator.ModeKeys.TRAIN and params.num_replicas > 1:
+      # the distribution strategy draws a batch for each replica
+      return dataset_utils.build_replicated_train_dataset(
+        params, params.num_replicas, self.time_major)
+    return dataset_utils.build_dataset(params, mode, self.time_major)
+
+  def serving_input_receiver_fn(self):
+    receiver = super(Seq2SeqModel, self).serving_input_receiver_fn()
+    if not self.time_major:
+      return receiver
+    # clients send batch major inputs
+    features = receiver.features.copy()
+    features[constants.FEATURES_INPUTS] = tf.transpose(
+      features[constants.FEATURES_INPUTS])
+    return tf.estimator.export.ServingInputReceiver(
+      features=features,
+      receiver_tensors=receiver.receiver_tensors)
 
   def model_fn(self, features, labels, mode, params, config=None):
     src = features[constants.FEATURES_INPUTS]
     src_len = features[constants.FEATURES_INPUTS_LENGTH]
+    if params.xla_jit and mode == tf.estimator.ModeKeys.PREDICT:
+      # the same bucketed shapes as training batches, see `_build_dataset`
+      src = dataset_utils.pad_to_bucket_width(
+        src, params, axis=0 if self.time_major else 1)
+    # reduced precision is for training, evaluation and inference compute in
+    # float32, from the same float32 variables
+    dtype = self.dtype if mode == tf.estimator.ModeKeys.TRAIN else tf.float32
+    self.embedding, self.encoder, self.decoder = self.build_components(
+      params, dtype)
+    jit_shapes = [tf.shape(src)]
+    if labels is not None:
+      jit_shapes.append(tf.shape(labels[constants.LABELS_INPUTS]))
 
-    with tf.variable_scope(self.scope):
+    # models of reduced precision keep float32 variables
+    with tf.variable_scope(
+        self.scope, custom_getter=precision_utils.float32_variable_getter):
       # embedding source sequence
       src_inputs = self.embedding.encoder_embedding_input(src)
 
       # encode
-      enc_outputs, enc_states = self.encoder.encode(mode, src_inputs, src_len)
-      # TODO(luozhouyang) decide where to transpose the outputs of encoder
-      if params.time_major:
-        enc_outputs = tf.transpose(enc_outputs, perm=[1, 0, 2])
-
-      # embedding target sequence
-      labels_in = self.embedding.decoder_embedding_input(
-        labels[constants.LABELS_INPUTS])
-      labels_len = labels[constants.LABELS_OUTPUTS_LENGTH]
-      labels_out = self.embedding.decoder_embedding_input(
-        labels[constants.LABELS_OUTPUTS])
-      new_labels = {
-        "tgt_in": labels_in,
-        "tgt_out": labels_out,
-        "tgt_len": labels_len
-      }
-
-      # decode
-      logits, predict_ids, dec_state = self.decoder.decode(
-        mode, enc_outputs, enc_states, new_labels, src_len)
+      with device_utils.jit_scope(params.xla_jit):
+        enc_outputs, enc_states = self.encoder.encode(
+          mode, src_inputs, src_len)
+
+      new_labels = None
+      if mode != tf.estimator.ModeKeys.PREDICT:
+        # embedding target sequence
+        labels_in = self.embedding.decoder_embedding_input(
+          labels[constants.LABELS_INPUTS])
+        labels_len = labels[constants.LABELS_OUTPUTS_LENGTH]
+        # target output ids, used to compute loss
+        labels_out = tf.to_int32(self.embedding.tgt_str2idx_table.lookup(
+          labels[constants.LABELS_OUTPUTS]))
+        new_labels = {
+          "tgt_in": labels_in,
+          "tgt_out": labels_out,
+          "tgt_len": labels_len
+        }
+
+      # decode, with the attention
+      with device_utils.jit_scope(params.xla_jit):
+        logits, predict_ids, dec_state = self.decoder.decode(
+          mode, enc_outputs, enc_states, new_labels, src_len)
 
       if mode == tf.estimator.ModeKeys.PREDICT:
+        if self.time_major:
+          # predictions are batch major for clients
+          predict_ids = tf.transpose(
+            predict_ids, [1, 0] + list(range(2, predict_ids.shape.ndims)))
         predictions = self.build_predictions(predict_ids, params)
         collection_utils.add_dict_to_collection(
           name=collection_utils.PREDICTIONS,
           tensors_dict=predictions)
         key = tf.saved_model.signature_constants.DEFAULT_SERVING_SIGNATURE_DEF_KEY
         export_outputs = {
-          key: predictions
+          key: tf.estimator.export.PredictOutput(predictions)
         }
         prediction_hooks = self.build_prediction_hooks()
+        if params.xla_jit:
+          prediction_hooks.append(JitCacheHook(jit_shapes))
         return tf.estimator.EstimatorSpec(
           mode=mode,
           predictions=predictions,
           prediction_hooks=prediction_hooks,
-          export_outputs=export_outputs)
+          export_outputs=export_outputs,
+          scaffold=self._build_inference_scaffold(params))
 
       # TODO(luozhouyang) sampled_softmax_loss
-      loss = self.compute_loss(logits, new_labels, params)
+      with device_utils.jit_scope(params.xla_jit):
+        loss = self.compute_loss(logits, new_labels, params)
 
       if mode == tf.estimator.ModeKeys.TRAIN:
         train_op = self.build_train_op(loss, params)
         training_hooks = self.build_training_hooks()
+        if params.xla_jit:
+          training_hooks.append(JitCacheHook(
+            jit_shapes, output_dir=config.model_dir if config else None))
         return tf.estimator.EstimatorSpec(
           mode=mode,
           train_op=train_op,
@@ -100,13 +171,23 @@ class Seq2SeqModel(AbstractModel):
 
       if mode == tf.estimator.ModeKeys.EVAL:
         metric_ops = self.build_eval_metrics(
-          predict_ids, labels, src_len, params)
+          predict_ids, new_labels, params)
         evaluation_hooks = self.build_evaluation_hooks()
+        if params.xla_jit:
+          evaluation_hooks.append(JitCacheHook(jit_shapes))
         return tf.estimator.EstimatorSpec(
           mode=mode,
           eval_metric_ops=metric_ops,
           evaluation_hooks=evaluation_hooks,
-          loss=loss)
+          loss=loss,
+          scaffold=self._build_inference_scaffold(params))
+
+  @staticmethod
+  def _build_inference_scaffold(params):
+    """Scaffold of evaluation and prediction, which also builds the exported
+    graph, restoring checkpoints by `ckpt_utils.InferenceSaver`."""
+    return tf.train.Scaffold(saver=ckpt_utils.InferenceSaver(
+      use_moving_averages=params.ema_decay > 0))
 
   def build_predictions(self, predict_ids, params):
     tgt_idx2str = lookup_ops.index_to_string_table_from_file(
@@ -127,9 +208,9 @@ class Seq2SeqModel(AbstractModel):
   def build_prediction_hooks(self):
     return []
 
-  def build_eval_metrics(self, predict_ids, labels, src_len, params):
-    actual_ids = labels['tgt_in']
-    weights = tf.sequence_mask(src_len)
+  def build_eval_metrics(self, predict_ids, labels, params):
+    actual_ids = labels['tgt_out']
+    weights = self._target_weights(labels['tgt_len'], actual_ids, tf.bool)
     metrics = {
       "accuracy": tf.metrics.accuracy(actual_ids, predict_ids, weights)
     }
@@ -137,24 +218,30 @@ class Seq2SeqModel(AbstractModel):
 
   def compute_loss(self, logits, labels, params):
     target_output = labels['tgt_out']
-    max_time_steps = tf.shape(target_output)[1]
-    batch_size = tf.shape(target_output)[0]
-    if params.time_major:
-      target_output = tf.transpose(target_output, perm=[1, 0, 2])
-      max_time_steps = tf.shape(target_output)[0]
-      batch_size = tf.shape(target_output)[1]
+    batch_size = tf.shape(target_output)[1 if self.time_major else 0]
+    target_weights = self._target_weights(
+      labels['tgt_len'], target_output, tf.float32)
 
+    # the softmax of reduced precision logits is computed in float32
     cross_entropy = tf.nn.sparse_softmax_cross_entropy_with_logits(
       labels=target_output,
-      logits=logits)
-    target_weights = tf.sequence_mask(
-      lengths=labels['tgt_len'],
-      maxlen=max_time_steps,
-      dtype=self.dtype)
+      logits=tf.to_float(logits))
     loss = tf.reduce_sum(cross_entropy * target_weights) / tf.to_float(
       batch_size)
     return loss
 
+  def _target_weights(self, target_length, target_output, dtype):
+    """Mask of the valid target positions, in the shape of `target_output`."""
+    if self.time_major:
+      max_time_steps = tf.shape(target_output)[0]
+      weights = tf.less(tf.expand_dims(tf.range(max_time_steps), 1),
+                        tf.expand_dims(target_length, 0))  # [T,B]
+      return tf.cast(weights, dtype)
+    return tf.sequence_mask(
+      lengths=target_length,
+      maxlen=tf.shape(target_output)[1],
+      dtype=dtype)
+
   def build_train_op(self, loss, params):
     if params.optimizer == "sgd":
       self.sgd_lr = tf.constant(params.learning_rate)
@@ -165,13 +252,41 @@ class Seq2SeqModel(AbstractModel):
       opt = tf.train.AdamOptimizer()
     else:
       raise ValueError("Unknown optimizer %s" % params.optimizer)
-    gradients = tf.gradients(
-      loss,
-      tf.trainable_variables(),
-      colocate_gradients_with_ops=params.colocate_gradients_with_ops)
+    params_list = tf.trainable_variables()
+    # With data parallel replicas, the gradients of all replicas are summed
+    # when applied, so each replica contributes its share of their mean,
+    # clipped to its share of the norm, which bounds the norm of the sum.
+    num_replicas = params.num_replicas
+    if num_replicas > 1:
+      loss /= num_replicas
+    if (precision_utils.is_reduced_precision(self.dtype) and
+        params.dynamic_loss_scaling):
+      # gradients are computed from the scaled loss and scaled back
+      opt = precision_utils.loss_scale_optimizer(opt)
+      gradients = [g for g, _ in opt.compute_gradients(
+        loss,
+        var_list=params_list,
+        colocate_gradients_with_ops=params.colocate_gradients_with_ops)]
+    else:
+      gradients = tf.gradients(
+        loss,
+        params_list,
+        colocate_gradients_with_ops=params.colocate_gradients_with_ops)
+    if params.num_workers > 1:
+      gradients = allreduce_utils.allreduce_gradients(gradients, params_list)
     clipped_grads, grad_norm = tf.clip_by_global_norm(
-      gradients, params.max_gradient_norm)
-    train_op = opt.apply_gradients(
-      zip(clipped_grads, grad_norm),
-      tf.train.get_or_create_global_step())
+      gradients, params.max_gradient_norm / num_replicas)
+    global_step = tf.train.get_or_create_global_step()
+    applied = None
+    if params.accumulate_steps > 1:
+      train_op = gradient_utils.accumulate_gradients(
+        opt, list(zip(clipped_grads, params_list)), global_step,
+        params.accumulate_steps)
+      applied = train_op
+    else:
+      train_op = opt.apply_gradients(
+        zip(clipped_grads, params_list), global_step)
+    if params.ema_decay > 0:
+      train_op = ema_utils.apply_moving_average(
+        train_op, params_list, params.ema_decay, global_step, applied)
     return train_op
@@ -1,20 +1,49 @@
-from naivenmt.decoders import TransformerDecoder
-from naivenmt.embeddings import Embedding
-from naivenmt.encoders import TransformerEncoder
-from naivenmt.inputters import Inputter
-from naivenmt.models import SequenceToSequence
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
 
+import tensorflow as tf
+from tensorflow.python.ops import lookup_ops
 
-# TODO(luozhouyang) Add hparams to config
-class Transformer(SequenceToSequence):
+from naivenmt.decoders.transformer_decoder import TransformerDecoder
+from naivenmt.embeddings.embedding import Embedding
+from naivenmt.encoders.transformer_encoder import TransformerEncoder
+from naivenmt.models.seq2seq import Seq2SeqModel
+
+
+class TransformerModel(Seq2SeqModel):
+  """Transformer NMT model."""
 
   def __init__(self,
                params,
-               scope=None,
-               dtype=None,
-               lifecycle_hooks=None,
-               tensors_hooks=None):
-    inputter = Inputter(params=params)
+               scope="transformer_model",
+               dtype=tf.float32):
+    if (params.source_embedding_size != params.num_units or
+            params.target_embedding_size != params.num_units):
+      raise ValueError(
+        "source_embedding_size and target_embedding_size must be equal to "
+        "num_units for transformer model.")
+    if params.num_units % params.num_heads != 0:
+      raise ValueError(
+        "num_units: %d must be divisible by num_heads: %d." %
+        (params.num_units, params.num_heads))
+    super(TransformerModel, self).__init__(
+      params=params,
+      scope=scope,
+      dtype=dtype)
+
+  def build_components(self, params, dtype):
     embedding = Embedding(src_vocab_size=params.source_vocab_size,
                           tgt_vocab_size=params.target_vocab_size,
                           share_vocab=params.share_vocab,
@@ -24,33 +53,19 @@ class Transformer(SequenceToSequence):
                           tgt_vocab_file=params.target_vocab_file,
                           src_embedding_file=params.source_embedding_file,
                           tgt_embedding_file=params.target_embedding_file,
+                          num_partitions=params.num_embedding_partitions,
                           dtype=dtype)
-    encoder = TransformerEncoder(embedding,
-                                 num_layers=6,
-                                 model_dim=512,
-                                 ffn_dim=2048,
-                                 dropout=0.2,
+    encoder = TransformerEncoder(params=params,
+                                 scope="transformer_encoder",
                                  dtype=dtype)
-    # TODO(luozhouyang) handle sos end eos
-    decoder = TransformerDecoder(embedding,
-                                 num_layers=6,
-                                 model_dim=512,
-                                 ffn_dim=2048,
-                                 dropout=0.2,
+    tgt_str2idx = lookup_ops.index_table_from_file(params.target_vocab_file,
+                                                   default_value=0)
+    sos_id = tgt_str2idx.lookup(params.sos)
+    eos_id = tgt_str2idx.lookup(params.eos)
+    decoder = TransformerDecoder(params=params,
+                                 embedding=embedding,
+                                 sos_id=sos_id,
+                                 eos_id=eos_id,
+                                 scope="transformer_decoder",
                                  dtype=dtype)
-    super(Transformer, self).__init__(inputter=inputter,
-                                      encoder=encoder,
-                                      decoder=decoder,
-                                      scope=scope,
-                                      dtype=dtype,
-                                      lifecycle_hooks=lifecycle_hooks,
-                                      tensors_hooks=tensors_hooks)
-
-  def model_fn(self):
-    pass
-
-  def input_fn(self, mode):
-    pass
-
-  def serving_input_fn(self):
-    pass
+    return embedding, encoder, decoder
@@ -17,16 +17,27 @@ import argparse
 import functools
 import json
 import os
+import sys
 
+import numpy as np
 import tensorflow as tf
 
 from naivenmt.configs import HParamsBuilder
+from naivenmt.hooks import AsyncCheckpointSaverHook
+from naivenmt.hooks import BroadcastVariablesHook
 from naivenmt.hooks import CountParamsHook
 from naivenmt.hooks import InitHook
 from naivenmt.hooks import SaveEvaluationPredictionsHook
 from naivenmt.models import AttentionModel
 from naivenmt.models import BasicModel
 from naivenmt.models import GNMTModel
+from naivenmt.models import TransformerModel
+from naivenmt.utils import allreduce_utils
+from naivenmt.utils import cache_utils
+from naivenmt.utils import cluster_utils
+from naivenmt.utils import constants
+from naivenmt.utils import device_utils
+from naivenmt.utils import precision_utils
 from naivenmt.utils import text_utils
 
 
@@ -36,21 +47,45 @@ class NaiveNMT(object):
     self.hparams = hparams
     self.model = model
 
+    train_distribute = None
+    num_cpu_devices = self.hparams.num_cpu_devices
+    if self.hparams.num_replicas > 1:
+      devices = self._replica_devices()
+      num_cpu_devices = max(
+        [num_cpu_devices] +
+        [int(d.split(":")[-1]) + 1 for d in devices if "cpu" in d.lower()])
+      train_distribute = tf.contrib.distribute.MirroredStrategy(
+        devices=devices)
+
+    if self.hparams.cluster_file:
+      # read by RunConfig
+      os.environ["TF_CONFIG"] = cluster_utils.tf_config(
+        cluster_utils.load_cluster(self.hparams.cluster_file),
+        self.hparams.task_type,
+        self.hparams.task_index)
+
     sess_config = tf.ConfigProto(
       allow_soft_placement=True,
       log_device_placement=False,
+      device_count={"CPU": num_cpu_devices},
+      inter_op_parallelism_threads=self.hparams.inter_op_parallelism_threads,
+      intra_op_parallelism_threads=self.hparams.intra_op_parallelism_threads,
       gpu_options=tf.GPUOptions(allow_growth=True))
+    if self.hparams.cluster_file:
+      sess_config.device_filters.extend(cluster_utils.device_filters(
+        self.hparams.task_type, self.hparams.task_index))
 
-    # TODO(luozhouyang) Add distribution strategy
     run_config = tf.estimator.RunConfig(
       model_dir=self.hparams.out_dir,
       session_config=sess_config,
       tf_random_seed=self.hparams.random_seed,
       save_checkpoints_secs=None,
-      save_checkpoints_steps=self.hparams.save_ckpt_steps,
+      # saved by AsyncCheckpointSaverHook in the async mode
+      save_checkpoints_steps=(
+        None if self.hparams.async_ckpt else self.hparams.save_ckpt_steps),
       keep_checkpoint_max=self.hparams.keep_ckpt_max,
       log_step_count_steps=self.hparams.log_step_count_steps,
-      train_distribute=None)
+      train_distribute=train_distribute)
 
     self.estimator = tf.estimator.Estimator(
       model_fn=self.model.model_fn,
@@ -58,8 +93,25 @@ class NaiveNMT(object):
       params=self.hparams,
       config=run_config)
 
-  def train(self):
-    train_hooks = self._build_train_hooks()
+    self.translation_cache = cache_utils.TranslationCache(
+      self.hparams.translation_cache_max_bytes)
+    self._predictor = None
+
+    if self.hparams.num_workers > 1:
+      allreduce_utils.init_ring(
+        self.hparams.worker_index,
+        self.hparams.worker_addresses.split(","),
+        timeout=self.hparams.ring_timeout_secs)
+
+  def _replica_devices(self):
+    """Devices of data parallel replicas, local CPU devices by default."""
+    devices = device_utils.parse_devices(self.hparams.replica_devices)
+    if devices:
+      return devices
+    return ["/cpu:%d" % i for i in range(self.hparams.num_replicas)]
+
+  def train(self, hooks=None):
+    train_hooks = self._build_train_hooks() + list(hooks or [])
     self.estimator.train(
       input_fn=functools.partial(self.model.input_fn,
                                  self.hparams,
@@ -67,6 +119,26 @@ class NaiveNMT(object):
       hooks=train_hooks,
       max_steps=self.hparams.train_steps)
 
+  def train_distributed(self, hooks=None):
+    """Train asynchronously as a task of the cluster of `cluster_file`.
+
+    Workers apply their gradients to the variables on the parameter servers
+    independently. Parameter servers serve until they are killed.
+
+    Args:
+      hooks: A list of extra `tf.train.SessionRunHook`s of training
+    """
+    config = self.estimator.config
+    server = tf.train.Server(
+      config.cluster_spec,
+      job_name=config.task_type,
+      task_index=config.task_id,
+      config=config.session_config)
+    if config.task_type == "ps":
+      server.join()
+      return
+    self.train(hooks=hooks)
+
   def eval(self):
     eval_hooks = self._build_eval_hooks()
     self.estimator.evaluate(
@@ -108,6 +180,64 @@ class NaiveNMT(object):
                                          self.hparams.subword_option)
     print(results)
 
+  def translate(self, sentences):
+    """Translate source sentences in memory.
+
+    Translations of sources seen before are served from `translation_cache`,
+    skipping both encoding and decoding. The other sources are translated
+    together, each distinct one once, by the serving signature of the model,
+    whose graph and session are built at the first call and kept, so a call
+    only runs the model.
+
+    Args:
+      sentences: A list of strings, source sentences
+
+    Returns:
+      A list of translations, as bytes.
+    """
+    keys = [cache_utils.normalize_source(s) for s in sentences]
+    translations, missed = self.translation_cache.get_batch(
+      [k for k in keys if k])
+    translations[()] = b""
+    batch_size = self.hparams.infer_batch_size
+    for start in range(0, len(missed), batch_size):
+      batch = missed[start:start + batch_size]
+      for key, translation in zip(batch, self._translate_batch(batch)):
+        self.translation_cache.put(key, translation)
+        translations[key] = translation
+    self._write_translation_cache_metrics()
+    return [translations[k] for k in keys]
+
+  def _translate_batch(self, keys):
+    """Translate a batch of normalized sources by the serving signature."""
+    if self._predictor is None:
+      # restores the latest checkpoint once, for all later calls
+      self._predictor = tf.contrib.predictor.from_estimator(
+        self.estimator, self.model.serving_input_receiver_fn)
+    max_len = max(len(k) for k in keys)
+    outputs = self._predictor({
+      "inputs": np.array(
+        [list(k) + [self.hparams.eos] * (max_len - len(k)) for k in keys],
+        dtype=object),
+      "inputs_length": np.array([len(k) for k in keys], dtype=np.int32)
+    })
+    return [
+      text_utils.get_translation(
+        output, self.hparams.eos, self.hparams.subword_option)
+      for output in outputs[constants.PREDICTIONS_STRINGS]]
+
+  def _write_translation_cache_metrics(self):
+    metrics = self.translation_cache.metrics()
+    tf.logging.info("Translation cache: %s" % metrics)
+    summary = tf.Summary(value=[
+      tf.Summary.Value(tag=name, simple_value=value)
+      for name, value in sorted(metrics.items())])
+    writer = tf.summary.FileWriterCache.get(
+      os.path.join(self.estimator.model_dir, "translate"))
+    writer.add_summary(
+      summary, self.translation_cache.hits + self.translation_cache.misses)
+    writer.flush()
+
   def export(self):
     # TODO(luozhouyang) Add export ckpt path in hparams
     self.estimator.export_savedmodel(
@@ -117,6 +247,14 @@ class NaiveNMT(object):
 
   def _build_train_hooks(self):
     hooks = [InitHook(), CountParamsHook()]
+    if self.hparams.num_workers > 1:
+      hooks.append(BroadcastVariablesHook())
+    if self.hparams.async_ckpt and self.estimator.config.is_chief:
+      hooks.append(AsyncCheckpointSaverHook(
+        self.estimator.model_dir,
+        self.hparams.save_ckpt_steps,
+        keep_checkpoint_max=self.hparams.keep_ckpt_max,
+        max_pending_saves=self.hparams.max_pending_ckpts))
     return hooks
 
   def _build_eval_hooks(self):
@@ -136,13 +274,15 @@ class NaiveNMT(object):
     return hooks
 
 
-def create_model(m, params):
+def create_model(m, params, dtype=tf.float32):
   if m == "basic_model":
-    return BasicModel(params=params)
+    return BasicModel(params=params, dtype=dtype)
   elif m == "attention_model":
-    return AttentionModel(params=params)
+    return AttentionModel(params=params, dtype=dtype)
   elif m == "gnmt_model":
-    return GNMTModel(params=params)
+    return GNMTModel(params=params, dtype=dtype)
+  elif m == "transformer_model":
+    return TransformerModel(params=params, dtype=dtype)
   else:
     raise ValueError("Invalid model type %s" % m)
 
@@ -153,22 +293,47 @@ if __name__ == "__main__":
   parser = argparse.ArgumentParser()
   parser.add_argument("--mode", type=str,
                       choices=["train", "eval", "train_and_eval", "predict",
-                               "export"],
+                               "export", "translate", "train_distributed"],
                       default="train",
                       help="Run mode.")
   parser.add_argument("--model", type=str,
-                      choices=["basic_model", "attention_model", "gnmt_model"],
+                      choices=["basic_model", "attention_model", "gnmt_model",
+                               "transformer_model"],
                       default="basic_model",
                       help="The model you want to use.")
   parser.add_argument("--params_file", type=str,
                       required=True,
                       help="Params config file in JSON format.")
+  parser.add_argument("--num_replicas", type=int,
+                      default=None,
+                      help="Number of data parallel replicas in training, "
+                           "overrides num_replicas of the params file.")
+  parser.add_argument("--cluster_file", type=str,
+                      default="",
+                      help="Cluster config file in JSON format, of "
+                           "train_distributed mode.")
+  parser.add_argument("--task_type", type=str,
+                      choices=["ps", "worker"],
+                      default="worker",
+                      help="Task type in the cluster.")
+  parser.add_argument("--task_index", type=int,
+                      default=0,
+                      help="Task index in the cluster.")
   args, _ = parser.parse_known_args()
   mode = args.mode
   with open(args.params_file, mode="rt", encoding="utf8") as f:
-    configs = json.loads(f)
+    configs = json.load(f)
+  if args.num_replicas is not None:
+    configs["num_replicas"] = args.num_replicas
+  if args.cluster_file:
+    configs.update(cluster_file=args.cluster_file,
+                   task_type=args.task_type,
+                   task_index=args.task_index)
   hparams = HParamsBuilder(dict_config=configs).build()
-  model = create_model(args.model, hparams)
+  # the model trains in the precision, and evaluates and infers in float32
+  model = create_model(
+    args.model, hparams,
+    dtype=precision_utils.compute_dtype(hparams.precision))
   naivenmt = NaiveNMT(hparams=hparams, model=model)
   if mode == "train":
     naivenmt.train()
@@ -176,9 +341,23 @@ if __name__ == "__main__":
     naivenmt.eval()
   elif mode == "train_and_eval":
     naivenmt.train_and_eval()
+  elif mode == "train_distributed":
+    naivenmt.train_distributed()
   elif mode == "predict":
     naivenmt.predict()
-  elif model == "export":
+  elif mode == "export":
     naivenmt.export()
+  elif mode == "translate":
+    # translate sentences from stdin, a batch of infer_batch_size at a time
+    batch = []
+    for line in sys.stdin:
+      batch.append(line)
+      if len(batch) == hparams.infer_batch_size:
+        for translation in naivenmt.translate(batch):
+          print(translation.decode("utf8"))
+        batch = []
+    if batch:
+      for translation in naivenmt.translate(batch):
+        print(translation.decode("utf8"))
   else:
     raise ValueError("Invalid mode %s" % mode)
@@ -0,0 +1,57 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Export an inference only checkpoint, without optimizer slots and the other
+training variables, optionally in reduced precision, e.g.
+
+  python -m naivenmt.slim_ckpt --checkpoint_path=out_dir/model.ckpt-10000 \
+    --output_dir=slim --dtype=float16
+
+Prediction and export load it with out_dir of the params file set to the
+output dir.
+"""
+
+import argparse
+
+import tensorflow as tf
+
+from naivenmt.utils import ckpt_utils
+
+if __name__ == "__main__":
+  tf.logging.set_verbosity(tf.logging.INFO)
+
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--checkpoint_path", type=str,
+                      required=True,
+                      help="Checkpoint to export, or a model dir to export "
+                           "its latest checkpoint.")
+  parser.add_argument("--output_dir", type=str,
+                      required=True,
+                      help="Dir of the slim checkpoint.")
+  parser.add_argument("--dtype", type=str,
+                      choices=["float32", "float16", "bfloat16"],
+                      default=None,
+                      help="Cast floating weights to this dtype.")
+  parser.add_argument("--no_moving_averages", action="store_true",
+                      help="Export the weights rather than their moving "
+                           "averages, if the checkpoint has both.")
+  args, _ = parser.parse_known_args()
+  checkpoint_path = args.checkpoint_path
+  if tf.gfile.IsDirectory(checkpoint_path):
+    checkpoint_path = tf.train.latest_checkpoint(checkpoint_path)
+  ckpt_utils.export_slim_ckpt(
+    checkpoint_path,
+    args.output_dir,
+    dtype=tf.as_dtype(args.dtype) if args.dtype else None,
+    use_moving_averages=not args.no_moving_averages)
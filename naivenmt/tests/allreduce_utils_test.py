@@ -0,0 +1,142 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.utils import allreduce_utils
+
+
+def _run_workers(num_workers, fn, timeout=120.0):
+  """Run `fn(ring)` of each worker of a local ring in a thread."""
+  addresses = ["localhost:%d" % p
+               for p in allreduce_utils.free_ports(num_workers)]
+  results = [None] * num_workers
+
+  def _run(rank):
+    ring = allreduce_utils.RingAllReduce(rank, addresses, timeout=timeout)
+    try:
+      results[rank] = fn(ring)
+    finally:
+      ring.close()
+
+  threads = [threading.Thread(target=_run, args=(i,))
+             for i in range(num_workers)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  return results
+
+
+class AllReduceUtilsTest(tf.test.TestCase):
+
+  def testAllReduce(self):
+    for num_workers in [1, 2, 3, 4]:
+      arrays = [np.random.randn(3, 1001).astype(np.float32)
+                for _ in range(num_workers)]
+      results = _run_workers(
+        num_workers, lambda ring: ring.allreduce(arrays[ring.rank]))
+      for result in results:
+        self.assertAllClose(sum(arrays), result, atol=1e-5)
+
+  def testAllGather(self):
+    arrays = [np.random.randn(n, 2).astype(np.float32) for n in [3, 0, 2]]
+    results = _run_workers(3, lambda ring: ring.allgather(arrays[ring.rank]))
+    for result in results:
+      self.assertAllEqual(np.concatenate(arrays), result)
+
+  def testTimeout(self):
+    timed_out = threading.Event()
+
+    def _exchange(ring):
+      if ring.rank == 0:
+        try:
+          ring.allreduce(np.zeros([4], dtype=np.float32))
+        finally:
+          timed_out.set()
+      else:
+        # a hanging worker, which keeps its connections open
+        timed_out.wait()
+
+    def _run(ring):
+      try:
+        _exchange(ring)
+      except TimeoutError as e:
+        return e
+
+    results = _run_workers(2, _run, timeout=0.5)
+    self.assertIsInstance(results[0], TimeoutError)
+
+  def testBroadcast(self):
+    arrays = [np.random.randn(7, 5) for _ in range(3)]
+    results = _run_workers(
+      3, lambda ring: ring.broadcast(arrays[ring.rank], root=1))
+    for result in results:
+      self.assertAllEqual(arrays[1], result)
+
+  def testAllReduceGradients(self):
+    embeddings = [np.random.randn(5, 3).astype(np.float32) for _ in range(2)]
+
+    def _gradients(ring):
+      with tf.Graph().as_default(), tf.Session() as sess:
+        embedding = tf.Variable(embeddings[ring.rank])
+        unused = tf.Variable(1.0)
+        loss = tf.reduce_sum(tf.nn.embedding_lookup(embedding, [1, 3]) ** 2)
+        variables = [embedding, unused]
+        gradients = allreduce_utils.allreduce_gradients(
+          tf.gradients(loss, variables), variables, ring=ring)
+        self.assertIsNone(gradients[1])
+        # the looked up rows of all workers, not densified
+        self.assertIsInstance(gradients[0], tf.IndexedSlices)
+        sess.run(tf.global_variables_initializer())
+        return sess.run([gradients[0].indices,
+                         tf.convert_to_tensor(gradients[0])])
+
+    expected = np.zeros([5, 3], dtype=np.float32)
+    for e in embeddings:
+      expected[[1, 3]] += 2 * e[[1, 3]] / 2
+    for indices, result in _run_workers(2, _gradients):
+      self.assertAllEqual([1, 3, 1, 3], indices)
+      self.assertAllClose(expected, result)
+
+  def testAllReduceDenseAndSparseGradients(self):
+    weights = [np.random.randn(2, 3).astype(np.float32) for _ in range(2)]
+
+    def _gradients(ring):
+      with tf.Graph().as_default(), tf.Session() as sess:
+        embedding = tf.Variable(tf.ones([4, 3]))
+        weight = tf.Variable(weights[ring.rank])
+        ids = [ring.rank]
+        loss = tf.reduce_sum(
+          tf.nn.embedding_lookup(embedding, ids) * tf.reduce_sum(weight))
+        variables = [embedding, weight]
+        gradients = allreduce_utils.allreduce_gradients(
+          tf.gradients(loss, variables), variables, ring=ring)
+        sess.run(tf.global_variables_initializer())
+        return sess.run([tf.convert_to_tensor(gradients[0]), gradients[1]])
+
+    expected_embedding = np.zeros([4, 3], dtype=np.float32)
+    for rank, w in enumerate(weights):
+      expected_embedding[rank] = np.sum(w) / 2
+    for embedding, weight in _run_workers(2, _gradients):
+      self.assertAllClose(expected_embedding, embedding)
+      self.assertAllClose(np.full([2, 3], 3.0), weight)
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -33,7 +33,7 @@ class BasicBiEncodersTest(tf.test.TestCase):
     """
     inputs_ph = tf.placeholder(
       dtype=tf.float32,
-      shape=(None, common_utils.TIME_STEPS, common_utils.DEPTH))
+      shape=(common_utils.TIME_STEPS, None, common_utils.DEPTH))
     inputs_length_ph = tf.placeholder(dtype=tf.int32, shape=(None))
 
     # states is a tuple of (states_fw, states_bw)
@@ -47,7 +47,8 @@ class BasicBiEncodersTest(tf.test.TestCase):
 
     states = tf.convert_to_tensor(states)
 
-    inputs, inputs_length = common_utils.get_encoder_test_inputs()
+    inputs, inputs_length = common_utils.get_encoder_test_inputs(
+      time_major=True)
     with self.test_session() as sess:
       sess.run(tf.global_variables_initializer())
       outputs, states = sess.run(
@@ -77,7 +78,7 @@ class BasicBiEncodersTest(tf.test.TestCase):
     """
     inputs_ph = tf.placeholder(
       dtype=tf.float32,
-      shape=(None, common_utils.TIME_STEPS, common_utils.DEPTH))
+      shape=(common_utils.TIME_STEPS, None, common_utils.DEPTH))
     inputs_length_ph = tf.placeholder(dtype=tf.int32, shape=(None))
 
     # states is a tuple of (states_fw/states_bw) of length num_layers
@@ -90,7 +91,8 @@ class BasicBiEncodersTest(tf.test.TestCase):
 
     states = tf.convert_to_tensor(states)
 
-    inputs, inputs_length = common_utils.get_encoder_test_inputs()
+    inputs, inputs_length = common_utils.get_encoder_test_inputs(
+      time_major=True)
     with self.test_session() as sess:
       sess.run(tf.global_variables_initializer())
       outputs, states = sess.run(
@@ -156,6 +158,44 @@ class BasicBiEncodersTest(tf.test.TestCase):
       encoder = BasicEncoder(params=common_utils.get_params(configs))
       self.runGRUEncoder(encoder, num_layers)
 
+  def testBasicSRUEncoder(self):
+    for num_layers in [NUM_LAYERS_2, NUM_LAYERS_4]:
+      configs = {
+        "unit_type": "sru",
+        "encoder_type": "bi",
+        "num_encoder_layers": num_layers,
+        "time_major": True
+      }
+      encoder = BasicEncoder(params=common_utils.get_params(configs))
+      self.runGRUEncoder(encoder, num_layers)
+
+  def testBasicLSTMEncoderOnDevices(self):
+    for num_layers in [NUM_LAYERS_2, NUM_LAYERS_4]:
+      configs = {
+        "unit_type": "lstm",
+        "encoder_type": "bi",
+        "num_encoder_layers": num_layers,
+        "forget_bias": 1.0,
+        "time_major": True,
+        "bi_encoder_devices": "/cpu:0,/cpu:0",
+        "encoder_parallel_iterations": 8
+      }
+      encoder = BasicEncoder(params=common_utils.get_params(configs))
+      self.runLSTMEncoder(encoder, num_layers)
+
+  def testBasicLSTMBlockEncoder(self):
+    for unit_type in ["lstm_block", "lstm_block_fused"]:
+      for num_layers in [NUM_LAYERS_2, NUM_LAYERS_4]:
+        configs = {
+          "unit_type": unit_type,
+          "encoder_type": "bi",
+          "num_encoder_layers": num_layers,
+          "forget_bias": 1.0,
+          "time_major": True
+        }
+        encoder = BasicEncoder(params=common_utils.get_params(configs))
+        self.runLSTMEncoder(encoder, num_layers)
+
 
 if __name__ == "__main__":
   tf.test.main()
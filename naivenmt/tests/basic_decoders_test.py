@@ -22,7 +22,7 @@ NUM_LAYERS_4 = 4
 
 
 def parse_func(unit_type):
-  if unit_type == "lstm":
+  if unit_type in ["lstm", "lstm_block", "lstm_block_fused"]:
     func = utils.get_uni_lstm_encoder_results
   elif unit_type == "layer_norm_lstm":
     func = utils.get_uni_layer_norm_lstm_encoder_results
@@ -145,6 +145,10 @@ class BasicDecodersTrainOrEvalTest(tf.test.TestCase):
   def testBasicLayerNormLSTMDecoder(self):
     self._testBasicLSTMLikeDecoder("layer_norm_lstm")
 
+  def testBasicLSTMBlockDecoder(self):
+    self._testBasicLSTMLikeDecoder("lstm_block")
+    self._testBasicLSTMLikeDecoder("lstm_block_fused")
+
   def testBiEncoderBasicLayerNormLSTMDecoder(self):
     self._testBiEncoderBasicLSTMLikeDecoder("layer_norm_lstm")
 
@@ -170,6 +174,22 @@ class BasicDecodersTrainOrEvalTest(tf.test.TestCase):
         decoder, num_layers, enc_outputs,
         enc_states, utils.get_labels(), enc_outputs_len)
 
+  def testBasicSRUDecoder(self):
+    for num_layers in [NUM_LAYERS_2, NUM_LAYERS_4]:
+      configs = {
+        "num_encoder_layers": num_layers,
+        "num_decoder_layers": num_layers,
+        "encoder_type": "uni",
+        "unit_type": "sru",
+        "time_major": True
+      }
+      decoder = utils.build_basic_decoder(configs)
+      enc_outputs, enc_outputs_len, enc_states = (
+        utils.get_uni_gru_encoder_results(num_layers))
+      self.runGRUDecoder(
+        decoder, num_layers, enc_outputs,
+        enc_states, utils.get_labels(), enc_outputs_len)
+
   def testBiEncoderBasicGRUDecoder(self):
     for num_layers in range(2, 10, 2):
       configs = {
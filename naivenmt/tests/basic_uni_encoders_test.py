@@ -33,7 +33,7 @@ class BasicUniEncodersTest(tf.test.TestCase):
     """
     inputs_ph = tf.placeholder(
       dtype=tf.float32,
-      shape=(None, common_utils.TIME_STEPS, common_utils.DEPTH))
+      shape=(common_utils.TIME_STEPS, None, common_utils.DEPTH))
     inputs_length_ph = tf.placeholder(dtype=tf.int32, shape=(None))
 
     # states is a tuple of (state) of length NUM_LAYERS
@@ -49,7 +49,8 @@ class BasicUniEncodersTest(tf.test.TestCase):
     # states shape: (num_layers, batch_size, depth)
     states = tf.convert_to_tensor(states_list)
 
-    inputs, inputs_length = common_utils.get_encoder_test_inputs()
+    inputs, inputs_length = common_utils.get_encoder_test_inputs(
+      time_major=True)
     with self.test_session() as sess:
       sess.run(tf.global_variables_initializer())
       outputs, states = sess.run(
@@ -76,7 +77,7 @@ class BasicUniEncodersTest(tf.test.TestCase):
     """
     inputs_ph = tf.placeholder(
       dtype=tf.float32,
-      shape=(None, common_utils.TIME_STEPS, common_utils.DEPTH))
+      shape=(common_utils.TIME_STEPS, None, common_utils.DEPTH))
     inputs_length_ph = tf.placeholder(dtype=tf.int32, shape=(None))
 
     # states is a tuple of (states_c, states_h) of length NUM_LAYERS
@@ -94,7 +95,8 @@ class BasicUniEncodersTest(tf.test.TestCase):
     states_h = tf.convert_to_tensor(states_h)
     self.assertEqual(num_layers, len(states))
 
-    inputs, inputs_length = common_utils.get_encoder_test_inputs()
+    inputs, inputs_length = common_utils.get_encoder_test_inputs(
+      time_major=True)
     with self.test_session() as sess:
       sess.run(tf.global_variables_initializer())
       outputs, states, states_c, states_h = sess.run(
@@ -163,6 +165,70 @@ class BasicUniEncodersTest(tf.test.TestCase):
       encoder = BasicEncoder(params=common_utils.get_params(configs))
       self.runGRUEncoder(encoder, num_layers)
 
+  def testBasicLSTMBlockEncoder(self):
+    for unit_type in ["lstm_block", "lstm_block_fused"]:
+      for num_layers in [NUM_LAYERS_2, NUM_LAYERS_4]:
+        configs = {
+          "unit_type": unit_type,
+          "encoder_type": "uni",
+          "num_encoder_layers": num_layers,
+          "forget_bias": 1.0,
+          "time_major": True
+        }
+        encoder = BasicEncoder(params=common_utils.get_params(configs))
+        self.runLSTMEncoder(encoder, num_layers)
+
+  def testBasicGRUBlockEncoder(self):
+    for num_layers in [NUM_LAYERS_2, NUM_LAYERS_4]:
+      configs = {
+        "unit_type": "gru_block",
+        "encoder_type": "uni",
+        "num_encoder_layers": num_layers,
+        "time_major": True
+      }
+      encoder = BasicEncoder(params=common_utils.get_params(configs))
+      self.runGRUEncoder(encoder, num_layers)
+
+  def testBasicSRUEncoder(self):
+    for num_layers in [NUM_LAYERS_2, NUM_LAYERS_4]:
+      configs = {
+        "unit_type": "sru",
+        "encoder_type": "uni",
+        "num_encoder_layers": num_layers,
+        "time_major": True
+      }
+      encoder = BasicEncoder(params=common_utils.get_params(configs))
+      self.runGRUEncoder(encoder, num_layers)
+
+  def testBlockEncoderVariables(self):
+    """Block cells' checkpoints are compatible with the standard cells'."""
+
+    def get_variables(unit_type, encoder_type):
+      configs = {
+        "unit_type": unit_type,
+        "encoder_type": encoder_type,
+        "num_encoder_layers": NUM_LAYERS_4,
+        "time_major": False
+      }
+      with tf.Graph().as_default():
+        encoder = BasicEncoder(params=common_utils.get_params(configs))
+        inputs, inputs_length = common_utils.get_encoder_test_inputs()
+        encoder.encode(
+          mode=tf.estimator.ModeKeys.TRAIN,
+          sequence_inputs=tf.constant(inputs),
+          sequence_length=tf.constant(inputs_length))
+        return [(v.op.name, v.get_shape().as_list())
+                for v in tf.global_variables()]
+
+    for encoder_type in ["uni", "bi"]:
+      lstm_variables = get_variables("lstm", encoder_type)
+      self.assertEqual(lstm_variables,
+                       get_variables("lstm_block", encoder_type))
+      self.assertEqual(lstm_variables,
+                       get_variables("lstm_block_fused", encoder_type))
+      self.assertEqual(get_variables("gru", encoder_type),
+                       get_variables("gru_block", encoder_type))
+
 
 if __name__ == "__main__":
   tf.test.main()
@@ -0,0 +1,82 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.decoders import AttentionDecoder
+
+BATCH_SIZE = 3
+BEAM_WIDTH = 4
+TIME_STEPS = 5
+DEPTH = 6
+
+
+class BeamAttentionTest(tf.test.TestCase):
+
+  def _build_attention(self, option, memory, memory_length, inputs, tile):
+    """Run two steps of an attention cell, over tiled or untiled memory."""
+    beam_width = 0 if tile else BEAM_WIDTH
+    if tile:
+      memory = tf.contrib.seq2seq.tile_batch(memory, BEAM_WIDTH)
+      memory_length = tf.contrib.seq2seq.tile_batch(memory_length, BEAM_WIDTH)
+    mechanism = AttentionDecoder._attention_mechanism_fn(
+      option, DEPTH, memory, memory_length, beam_width)
+    cell = AttentionDecoder._attention_wrapper(
+      tf.nn.rnn_cell.LSTMCell(DEPTH), mechanism, beam_width,
+      attention_layer_size=DEPTH)
+    state = cell.zero_state(BATCH_SIZE * BEAM_WIDTH, tf.float32)
+    _, state = cell(inputs, state)
+    outputs, state = cell(inputs, state)
+    return outputs, state.alignments
+
+  def testBeamAttentionMatchesTiledAttention(self):
+    memory = tf.constant(
+      np.random.randn(BATCH_SIZE, TIME_STEPS, DEPTH).astype(np.float32))
+    memory_length = tf.constant([5, 2, 4])
+    inputs = tf.constant(
+      np.random.randn(BATCH_SIZE * BEAM_WIDTH, DEPTH).astype(np.float32))
+    for option in ["luong", "scaled_luong", "bahdanau", "normed_bahdanau"]:
+      results = []
+      for tile in [True, False]:
+        scope = "%s_%s" % (option, "tiled" if tile else "beam")
+        with tf.variable_scope(scope):
+          results.append(self._build_attention(
+            option, memory, memory_length, inputs, tile))
+
+      def _variables(scope):
+        variables = tf.global_variables(scope=scope + "/")
+        return dict((v.op.name[len(scope):], v) for v in variables)
+
+      tiled_variables = _variables(option + "_tiled")
+      beam_variables = _variables(option + "_beam")
+      # the same variables as the tiled attention's
+      self.assertEqual(sorted(tiled_variables), sorted(beam_variables))
+      assign_ops = [tf.assign(beam_variables[name], v)
+                    for name, v in tiled_variables.items()]
+
+      with self.test_session() as sess:
+        sess.run(tf.global_variables_initializer())
+        sess.run(assign_ops)
+        (tiled_outputs, tiled_alignments), (outputs, alignments) = sess.run(
+          results)
+        self.assertAllEqual(
+          [BATCH_SIZE * BEAM_WIDTH, TIME_STEPS], alignments.shape)
+        self.assertAllClose(tiled_alignments, alignments, atol=1e-5)
+        self.assertAllClose(tiled_outputs, outputs, atol=1e-5)
+
+
+if __name__ == "__main__":
+  tf.test.main()
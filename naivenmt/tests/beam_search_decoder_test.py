@@ -0,0 +1,90 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import tensorflow as tf
+
+from naivenmt.decoders import beam_search_decoder
+from naivenmt.tests import common_test_utils as utils
+
+
+class BeamSearchDecoderTest(tf.test.TestCase):
+
+  def testEarlyStoppingMask(self):
+    log_probs = tf.constant([
+      [-1.0, -2.0],  # finished beam beats the alive one
+      [-3.0, -2.0],  # alive beam may still beat the finished one
+      [-1.0, -2.0],  # nothing finished
+      [-1.0, -2.0]])  # all finished
+    finished = tf.constant([
+      [True, False], [True, False], [False, False], [True, True]])
+    lengths = tf.constant([[3, 3], [3, 3], [3, 3], [3, 3]])
+    mask = beam_search_decoder.early_stopping_mask(
+      log_probs, finished, lengths, 0.0, 10)
+    with self.test_session() as sess:
+      self.assertAllEqual([True, False, False, True], sess.run(mask))
+
+  def testEarlyStoppingMaskWithLengthPenalty(self):
+    # finished: -1.0 / ((5 + 2) / 6), alive bound: -1.1 / ((5 + 10) / 6)
+    log_probs = tf.constant([[-1.0, -1.1]])
+    finished = tf.constant([[True, False]])
+    lengths = tf.constant([[2, 2]])
+    no_penalty = beam_search_decoder.early_stopping_mask(
+      log_probs, finished, lengths, 0.0, 10)
+    penalty = beam_search_decoder.early_stopping_mask(
+      log_probs, finished, lengths, 1.0, 10)
+    with self.test_session() as sess:
+      self.assertAllEqual([[True], [False]], sess.run([no_penalty, penalty]))
+
+  def testEarlyStoppingKeepsBestHypothesis(self):
+    num_layers = 2
+    configs = {
+      "unit_type": "lstm",
+      "encoder_type": "uni",
+      "num_encoder_layers": num_layers,
+      "num_decoder_layers": num_layers,
+      "beam_width": 5,
+      "infer_mode": "beam_search",
+      "time_major": True
+    }
+    outputs, outputs_length, states = utils.get_uni_lstm_encoder_results(
+      num_layers)
+    predict_ids = []
+    for early_stopping in [True, False]:
+      # decoders share variables
+      decoder = utils.build_basic_decoder(
+        dict(configs, beam_early_stopping=early_stopping))
+      _, ids, _ = decoder.decode(
+        mode=tf.estimator.ModeKeys.PREDICT,
+        encoder_outputs=outputs,
+        encoder_state=states,
+        labels=None,
+        src_seq_len=outputs_length)
+      predict_ids.append(ids)
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      early_ids, ids = sess.run(predict_ids)
+      eos_id = 2
+      for b in range(utils.BATCH_SIZE):
+        # the best beams are the same up to their EOS
+        best, expected = list(early_ids[:, b, 0]), list(ids[:, b, 0])
+        if eos_id in expected:
+          expected = expected[:expected.index(eos_id) + 1]
+        self.assertEqual(expected, best[:len(expected)])
+        self.assertLessEqual(early_ids.shape[0], ids.shape[0])
+
+
+if __name__ == "__main__":
+  tf.test.main()
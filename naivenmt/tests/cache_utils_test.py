@@ -0,0 +1,74 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import tensorflow as tf
+
+from naivenmt.utils import cache_utils
+
+
+class CacheUtilsTest(tf.test.TestCase):
+
+  def testNormalizeSource(self):
+    self.assertEqual(("a", "b"), cache_utils.normalize_source(" a  b\n"))
+    self.assertEqual(("a", "b"), cache_utils.normalize_source(b"a b"))
+    self.assertEqual((), cache_utils.normalize_source(""))
+
+  def testTranslationCache(self):
+    cache = cache_utils.TranslationCache(max_bytes=1024 * 1024)
+    self.assertIsNone(cache.get(("a", "b")))
+    cache.put(("a", "b"), b"x y")
+    self.assertEqual(b"x y", cache.get(("a", "b")))
+    metrics = cache.metrics()
+    self.assertEqual(1, metrics["translation_cache_hits"])
+    self.assertEqual(1, metrics["translation_cache_misses"])
+    self.assertAllClose(0.5, metrics["translation_cache_hit_rate"])
+    self.assertEqual(1, metrics["translation_cache_entries"])
+
+  def testTranslationCacheGetBatch(self):
+    cache = cache_utils.TranslationCache(max_bytes=1024 * 1024)
+    cache.put(("a",), b"x")
+    found, missed = cache.get_batch(
+      [("b",), ("a",), ("b",), ("c",), ("a",), ("b",)])
+    self.assertEqual({("a",): b"x"}, found)
+    self.assertEqual([("b",), ("c",)], missed)
+    # duplicates in the batch are hits
+    self.assertEqual(4, cache.hits)
+    self.assertEqual(2, cache.misses)
+
+  def testTranslationCacheEvictsLeastRecentlyUsed(self):
+    keys = [("a",), ("b",), ("c",)]
+    entry_bytes = cache_utils._size_of(keys[0], b"x")
+    cache = cache_utils.TranslationCache(max_bytes=2 * entry_bytes)
+    cache.put(keys[0], b"x")
+    cache.put(keys[1], b"x")
+    # ("a",) becomes the most recently used one
+    cache.get(keys[0])
+    cache.put(keys[2], b"x")
+    self.assertEqual(2, len(cache))
+    self.assertEqual(1, cache.evictions)
+    self.assertLessEqual(cache.size_bytes, cache.max_bytes)
+    self.assertIsNone(cache.get(keys[1]))
+    self.assertEqual(b"x", cache.get(keys[0]))
+    self.assertEqual(b"x", cache.get(keys[2]))
+
+  def testDisabledTranslationCache(self):
+    cache = cache_utils.TranslationCache(max_bytes=0)
+    cache.put(("a",), b"x")
+    self.assertEqual(0, len(cache))
+    self.assertIsNone(cache.get(("a",)))
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,99 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import os
+
+import tensorflow as tf
+
+from naivenmt.hooks import AsyncCheckpointSaverHook
+
+
+class _LatestCheckpointListener(tf.train.CheckpointSaverListener):
+  """Records the latest checkpoint when notified of saves."""
+
+  def __init__(self, checkpoint_dir):
+    self.checkpoint_dir = checkpoint_dir
+    self.saves = []
+    self.ended = False
+
+  def after_save(self, session, global_step_value):
+    self.saves.append(
+      (global_step_value, tf.train.latest_checkpoint(self.checkpoint_dir)))
+
+  def end(self, session, global_step_value):
+    self.ended = True
+
+
+class AsyncCheckpointSaverHookTest(tf.test.TestCase):
+
+  def _train(self, checkpoint_dir, num_steps, **kwargs):
+    with tf.Graph().as_default():
+      weights = tf.get_variable("weights", initializer=[0.0, 0.0])
+      partitioned = tf.get_variable(
+        "partitioned", shape=[4, 2], initializer=tf.zeros_initializer(),
+        partitioner=tf.fixed_size_partitioner(2))
+      global_step = tf.train.get_or_create_global_step()
+      train_op = tf.group(
+        weights.assign_add([1.0, 2.0]),
+        [p.assign_add(tf.ones_like(p)) for p in partitioned],
+        global_step.assign_add(1))
+      hook = AsyncCheckpointSaverHook(checkpoint_dir, **kwargs)
+      with tf.train.MonitoredSession(hooks=[hook]) as sess:
+        for _ in range(num_steps):
+          sess.run(train_op)
+
+  def testSaveCheckpoints(self):
+    checkpoint_dir = os.path.join(self.get_temp_dir(), "async_ckpts")
+    self._train(checkpoint_dir, 5, save_steps=2, keep_checkpoint_max=2)
+
+    state = tf.train.get_checkpoint_state(checkpoint_dir)
+    # steps 2 and 4, and the last step at the end
+    self.assertEqual(
+      [os.path.join(checkpoint_dir, "model.ckpt-%d" % step) for step in [4, 5]],
+      list(state.all_model_checkpoint_paths))
+    self.assertEqual([], tf.gfile.Glob(
+      os.path.join(checkpoint_dir, "model.ckpt-2*")))
+    reader = tf.train.load_checkpoint(state.model_checkpoint_path)
+    self.assertAllClose([5.0, 10.0], reader.get_tensor("weights"))
+    self.assertAllClose([[5.0, 5.0]] * 4, reader.get_tensor("partitioned"))
+    self.assertEqual(5, reader.get_tensor("global_step"))
+
+  def testRecoverCheckpoints(self):
+    checkpoint_dir = os.path.join(self.get_temp_dir(), "recover_ckpts")
+    self._train(checkpoint_dir, 2, save_steps=2, keep_checkpoint_max=2)
+    self._train(checkpoint_dir, 2, save_steps=1, keep_checkpoint_max=2,
+                max_pending_saves=2)
+
+    state = tf.train.get_checkpoint_state(checkpoint_dir)
+    # the steps restart from scratch in the new graph
+    self.assertEqual(
+      [os.path.join(checkpoint_dir, "model.ckpt-%d" % step) for step in [1, 2]],
+      list(state.all_model_checkpoint_paths))
+
+  def testNotifyListeners(self):
+    checkpoint_dir = os.path.join(self.get_temp_dir(), "listened_ckpts")
+    listener = _LatestCheckpointListener(checkpoint_dir)
+    self._train(checkpoint_dir, 5, save_steps=2, listeners=[listener])
+
+    # each listener call finds the checkpoint of its step written
+    self.assertEqual(
+      [(step, os.path.join(checkpoint_dir, "model.ckpt-%d" % step))
+       for step in [2, 4, 5]],
+      listener.saves)
+    self.assertTrue(listener.ended)
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,222 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.utils import ckpt_utils
+from naivenmt.utils import ema_utils
+
+
+class CkptUtilsTest(tf.test.TestCase):
+
+  def _save_ckpts(self, out_dir, values):
+    with tf.Graph().as_default():
+      weights = tf.get_variable("weights", shape=[2, 2])
+      half_weights = tf.get_variable(
+        "half_weights", shape=[2], dtype=tf.float16)
+      global_step = tf.train.get_or_create_global_step()
+      saver = tf.train.Saver(max_to_keep=len(values))
+      with self.test_session() as sess:
+        for step, value in values:
+          sess.run([weights.assign(value),
+                    half_weights.assign(value[0].astype(np.float16)),
+                    global_step.assign(step)])
+          saver.save(sess, os.path.join(out_dir, "model.ckpt"),
+                     global_step=step)
+
+  def testAverageCkpts(self):
+    out_dir = os.path.join(self.get_temp_dir(), "average_ckpts")
+    self._save_ckpts(out_dir, [
+      (10, np.array([[0.0, 1.0], [2.0, 3.0]], dtype=np.float32)),
+      (20, np.array([[2.0, 3.0], [4.0, 5.0]], dtype=np.float32)),
+      (30, np.array([[4.0, 5.0], [6.0, 7.0]], dtype=np.float32))])
+    # a shard per variable
+    avg_dir = ckpt_utils.average_ckpts(
+      out_dir, num_ckpts=2, num_threads=1, max_shard_bytes=1)
+
+    ckpt = tf.train.latest_checkpoint(avg_dir)
+    self.assertTrue(ckpt.endswith("-30"))
+    reader = tf.train.load_checkpoint(ckpt)
+    self.assertAllClose([[3.0, 4.0], [5.0, 6.0]], reader.get_tensor("weights"))
+    half_weights = reader.get_tensor("half_weights")
+    self.assertEqual(np.float16, half_weights.dtype)
+    self.assertAllClose([3.0, 4.0], half_weights)
+    self.assertEqual(30, reader.get_tensor("global_step"))
+    self.assertEqual([], tf.gfile.Glob(os.path.join(avg_dir, "*_temp_*")))
+
+  def testIsTrainingVariable(self):
+    for name in ["seq2seq/encoder/kernel/Adam", "seq2seq/encoder/kernel/Adam_1",
+                 "beta1_power", "seq2seq/beta2_power",
+                 "gradient_accumulation/counter", "loss_scale", "good_steps",
+                 "seq2seq/encoder/kernel/ExponentialMovingAverage"]:
+      self.assertTrue(ckpt_utils.is_training_variable(name), name)
+    for name in ["global_step", "seq2seq/encoder/kernel",
+                 "seq2seq/embedding/Adamant"]:
+      self.assertFalse(ckpt_utils.is_training_variable(name), name)
+
+  def _save_adam_ckpt(self, ckpt):
+    with tf.Graph().as_default():
+      weights = tf.get_variable("weights", initializer=[1.0, 2.0])
+      global_step = tf.train.get_or_create_global_step()
+      train_op = tf.train.AdamOptimizer(1.0).minimize(
+        tf.reduce_sum(weights), global_step=global_step)
+      averages = tf.get_variable(
+        "weights/ExponentialMovingAverage", initializer=[5.0, 6.0],
+        trainable=False)
+      with self.test_session() as sess:
+        sess.run(tf.global_variables_initializer())
+        sess.run([train_op, averages.initializer])
+        return tf.train.Saver().save(sess, ckpt, global_step=global_step)
+
+  def testExportSlimCkpt(self):
+    ckpt = self._save_adam_ckpt(
+      os.path.join(self.get_temp_dir(), "adam", "model.ckpt"))
+    slim_dir = os.path.join(self.get_temp_dir(), "slim")
+    prefix = ckpt_utils.export_slim_ckpt(ckpt, slim_dir, dtype=tf.float16)
+
+    self.assertEqual(prefix, tf.train.latest_checkpoint(slim_dir))
+    reader = tf.train.load_checkpoint(prefix)
+    self.assertEqual({"weights": tf.float16, "global_step": tf.int64},
+                     reader.get_variable_to_dtype_map())
+    self.assertAllClose([5.0, 6.0], reader.get_tensor("weights"))
+    self.assertEqual(1, reader.get_tensor("global_step"))
+
+  def testInferenceSaverCasts(self):
+    ckpt = self._save_adam_ckpt(
+      os.path.join(self.get_temp_dir(), "adam_cast", "model.ckpt"))
+    prefix = ckpt_utils.export_slim_ckpt(
+      ckpt, os.path.join(self.get_temp_dir(), "slim_cast"),
+      dtype=tf.float16, use_moving_averages=False)
+    with tf.Graph().as_default():
+      weights = tf.get_variable("weights", shape=[2])
+      global_step = tf.train.get_or_create_global_step()
+      saver = ckpt_utils.InferenceSaver()
+      with self.test_session() as sess:
+        saver.restore(sess, prefix)
+        self.assertAllClose([0.0, 1.0], sess.run(weights))
+        self.assertEqual(1, sess.run(global_step))
+
+  def _save_ema_ckpt(self, ckpt):
+    """Save a checkpoint of Adam and moving averages, of a plain and a
+    partitioned variable."""
+    with tf.Graph().as_default():
+      weights = tf.get_variable("weights", initializer=[1.0, 2.0])
+      partitioned = tf.get_variable(
+        "partitioned", shape=[4, 2], initializer=tf.ones_initializer(),
+        partitioner=tf.fixed_size_partitioner(2))
+      global_step = tf.train.get_or_create_global_step()
+      variables = [weights] + list(partitioned)
+      loss = tf.reduce_sum(weights) + tf.reduce_sum(
+        tf.convert_to_tensor(partitioned) * [[1.0, 2.0]])
+      train_op = tf.train.AdamOptimizer(1.0).minimize(
+        loss, global_step=global_step, var_list=variables)
+      train_op = ema_utils.apply_moving_average(
+        train_op, variables, 0.5, global_step)
+      with self.test_session() as sess:
+        sess.run(tf.global_variables_initializer())
+        sess.run(train_op)
+        return tf.train.Saver().save(sess, ckpt, global_step=global_step)
+
+  @staticmethod
+  def _model_fn(features, labels, mode, params):
+    weights = tf.get_variable("weights", shape=[2])
+    partitioned = tf.get_variable(
+      "partitioned", shape=[4, 2], partitioner=tf.fixed_size_partitioner(2))
+    batch_size = tf.shape(features["x"])[0]
+    predictions = {
+      "weights": tf.tile(tf.expand_dims(weights, 0), [batch_size, 1]),
+      "partitioned": tf.tile(
+        tf.expand_dims(tf.convert_to_tensor(partitioned), 0),
+        [batch_size, 1, 1])
+    }
+    key = tf.saved_model.signature_constants.DEFAULT_SERVING_SIGNATURE_DEF_KEY
+    return tf.estimator.EstimatorSpec(
+      mode=mode,
+      predictions=predictions,
+      export_outputs={key: tf.estimator.export.PredictOutput(predictions)},
+      scaffold=tf.train.Scaffold(saver=ckpt_utils.InferenceSaver(
+        use_moving_averages=params["use_moving_averages"])))
+
+  @staticmethod
+  def _serving_input_receiver_fn():
+    inputs = {"x": tf.placeholder(tf.float32, shape=[None])}
+    return tf.estimator.export.ServingInputReceiver(inputs, inputs)
+
+  def testInferenceSaverMovingAveragesAndPartitions(self):
+    ckpt = self._save_ema_ckpt(
+      os.path.join(self.get_temp_dir(), "ema_restore", "model.ckpt"))
+    reader = tf.train.load_checkpoint(ckpt)
+    with tf.Graph().as_default():
+      weights = tf.get_variable("weights", shape=[2])
+      partitioned = tf.get_variable(
+        "partitioned", shape=[4, 2], partitioner=tf.fixed_size_partitioner(2))
+      tf.train.get_or_create_global_step()
+      saver = ckpt_utils.InferenceSaver(use_moving_averages=True)
+      tf.get_default_graph().finalize()
+      with self.test_session() as sess:
+        saver.restore(sess, ckpt)
+        self.assertAllClose(
+          reader.get_tensor("weights/ExponentialMovingAverage"),
+          sess.run(weights))
+        self.assertAllClose(
+          reader.get_tensor("partitioned/ExponentialMovingAverage"),
+          sess.run(tf.convert_to_tensor(partitioned)))
+
+  def testInferenceSaverMissingMovingAverages(self):
+    ckpt = self._save_ema_ckpt(
+      os.path.join(self.get_temp_dir(), "ema_missing", "model.ckpt"))
+    with tf.Graph().as_default():
+      tf.get_variable("weights", shape=[2])
+      # not averaged in training
+      tf.get_variable("bias", shape=[2])
+      tf.train.get_or_create_global_step()
+      saver = ckpt_utils.InferenceSaver(use_moving_averages=True)
+      with self.test_session() as sess:
+        with self.assertRaisesRegexp(ValueError, "bias"):
+          saver.restore(sess, ckpt)
+
+  def testExportAndLoad(self):
+    ckpt = self._save_ema_ckpt(
+      os.path.join(self.get_temp_dir(), "ema_export", "model.ckpt"))
+    reader = tf.train.load_checkpoint(ckpt)
+    averages = {
+      name: reader.get_tensor("%s/ExponentialMovingAverage" % name)
+      for name in ["weights", "partitioned"]}
+    slim_dir = os.path.join(self.get_temp_dir(), "slim_export")
+    prefix = ckpt_utils.export_slim_ckpt(ckpt, slim_dir, dtype=tf.float16)
+    # the moving averages restored from the checkpoint of training, and the
+    # float16 slim checkpoint of the moving averages
+    for i, (checkpoint_path, atol) in enumerate([(ckpt, 1e-6),
+                                                 (prefix, 1e-2)]):
+      estimator = tf.estimator.Estimator(
+        model_fn=self._model_fn,
+        model_dir=os.path.dirname(checkpoint_path),
+        params={"use_moving_averages": True})
+      export_dir = estimator.export_savedmodel(
+        os.path.join(self.get_temp_dir(), "export_%d" % i),
+        self._serving_input_receiver_fn,
+        checkpoint_path=checkpoint_path)
+      predictor = tf.contrib.predictor.from_saved_model(export_dir)
+      outputs = predictor({"x": [0.0]})
+      self.assertAllClose(averages["weights"], outputs["weights"][0],
+                          atol=atol)
+      self.assertAllClose(averages["partitioned"], outputs["partitioned"][0],
+                          atol=atol)
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,103 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import json
+import os
+
+import tensorflow as tf
+
+from naivenmt.models.seq2seq import Seq2SeqModel
+from naivenmt.naivenmt import NaiveNMT
+from naivenmt.naivenmt import create_model
+from naivenmt.tests import common_test_utils as utils
+from naivenmt.utils import cluster_utils
+
+CLUSTER = {
+  "ps": ["localhost:2222", "localhost:2223"],
+  "worker": ["localhost:2224", "localhost:2225", "localhost:2226"]
+}
+
+
+class _ModelBuilt(Exception):
+  pass
+
+
+class ClusterUtilsTest(tf.test.TestCase):
+
+  def _cluster_file(self):
+    cluster_file = os.path.join(self.get_temp_dir(), "cluster.json")
+    with open(cluster_file, mode="wt", encoding="utf8") as f:
+      json.dump(CLUSTER, f)
+    return cluster_file
+
+  def testEstimatorCluster(self):
+    cluster = cluster_utils.load_cluster(self._cluster_file())
+    spec = cluster_utils.cluster_spec(cluster).as_dict()
+    self.assertEqual(["localhost:2224"], spec["chief"])
+    self.assertEqual(["localhost:2225", "localhost:2226"], spec["worker"])
+    self.assertEqual(CLUSTER["ps"], spec["ps"])
+
+    tf_config = json.loads(cluster_utils.tf_config(cluster, "worker", 0))
+    self.assertEqual({"type": "chief", "index": 0}, tf_config["task"])
+    tf_config = json.loads(cluster_utils.tf_config(cluster, "worker", 2))
+    self.assertEqual({"type": "worker", "index": 1}, tf_config["task"])
+    tf_config = json.loads(cluster_utils.tf_config(cluster, "ps", 1))
+    self.assertEqual({"type": "ps", "index": 1}, tf_config["task"])
+
+    self.assertEqual(["/job:ps", "/job:worker/task:0"],
+                     cluster_utils.device_filters("worker", 1))
+
+  def testEstimatorPlacesPartitionsOnParameterServers(self):
+    hparams = utils.get_model_test_params(
+      os.path.join(self.get_temp_dir(), "model"), {
+        "cluster_file": self._cluster_file(),
+        "task_type": "worker",
+        "task_index": 1,
+        "num_embedding_partitions": 4
+      })
+    model = create_model("basic_model", hparams)
+    devices = {}
+
+    def _model_fn(features, labels, mode, params, config=None):
+      spec = Seq2SeqModel.model_fn(model, features, labels, mode, params,
+                                   config)
+      devices.update((v.op.name, v.device) for v in tf.global_variables())
+      devices["loss"] = spec.loss.device
+      # stop before connecting to the cluster
+      raise _ModelBuilt()
+
+    model.model_fn = _model_fn
+    try:
+      nmt = NaiveNMT(hparams=hparams, model=model)
+      with self.assertRaises(_ModelBuilt):
+        nmt.train()
+    finally:
+      os.environ.pop("TF_CONFIG", None)
+
+    variable_devices = [
+      tf.DeviceSpec.from_string(d) for name, d in devices.items()
+      if name != "loss"]
+    self.assertEqual({"ps"}, {d.job for d in variable_devices})
+    tasks = [
+      tf.DeviceSpec.from_string(
+        devices["embedding/encoder_embedding/part_%d" % i]).task
+      for i in range(4)]
+    self.assertEqual([tasks[0], 1 - tasks[0]] * 2, tasks)
+    loss_device = tf.DeviceSpec.from_string(devices["loss"])
+    self.assertEqual(("worker", 0), (loss_device.job, loss_device.task))
+
+
+if __name__ == "__main__":
+  tf.test.main()
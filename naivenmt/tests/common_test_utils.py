@@ -84,7 +84,49 @@ def get_params(update_configs):
   return hparams
 
 
-def get_encoder_test_inputs():
+def get_model_test_params(out_dir, update_configs=None):
+  """Params of a small basic model, trained and evaluated on testdata."""
+  configs = {
+    "out_dir": out_dir,
+    "num_encoder_layers": 1,
+    "num_decoder_layers": 1,
+    "beam_width": 0,
+    "length_penalty_weight": 0.0,
+    "sampling_temperature": 0.0,
+    "unit_type": "lstm",
+    "num_units": DEPTH,
+    "forget_bias": 1.0,
+    "dropout": 0.0,
+    "time_major": True,
+    "source_embedding_size": DEPTH,
+    "target_embedding_size": DEPTH,
+    "source_embedding_file": None,
+    "target_embedding_file": None,
+    "share_vocab": False,
+    "batch_size": 4,
+    "infer_batch_size": 4,
+    "src_max_len": 10,
+    "tgt_max_len": 10,
+    "tgt_max_len_infer": 10,
+    "num_buckets": 1,
+    "buff_size": None,
+    "skip_count": None,
+    "num_parallel_calls": 1,
+    "random_seed": 1,
+    "max_gradient_norm": 5.0,
+    "colocate_gradients_with_ops": True,
+    "warmup_steps": 0,
+    "warmup_scheme": "t2t",
+    "decay_scheme": "",
+    "train_steps": 4,
+    "num_train_steps": 4,
+    "save_ckpt_steps": 2
+  }
+  configs.update(update_configs or {})
+  return HParamsBuilder(configs).build()
+
+
+def get_encoder_test_inputs(time_major=False):
   inputs = np.array([
     [[1, 2, 3, 4], [2, 3, 4, 5], [3, 4, 5, 6], [4, 5, 6, 7], [5, 6, 7, 8]],
     [[2, 3, 1, 4], [3, 4, 5, 1], [6, 8, 2, 5], [2, 4, 6, 7], [0, 0, 0, 0]],
@@ -95,6 +137,8 @@ def get_encoder_test_inputs():
     [[3, 5, 6, 7], [1, 2, 8, 5], [4, 5, 6, 3], [2, 3, 4, 5], [1, 2, 6, 7]],
     [[2, 3, 9, 5], [5, 7, 2, 1], [6, 2, 3, 8], [0, 0, 0, 0], [0, 0, 0, 0]],
   ], dtype=tf.float32.as_numpy_dtype)
+  if time_major:
+    inputs = np.transpose(inputs, [1, 0, 2])
   inputs_length = np.array([5, 4, 5, 3, 5, 4, 5, 3],
                            dtype=tf.int32.as_numpy_dtype)
   return inputs, inputs_length
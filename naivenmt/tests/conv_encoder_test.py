@@ -0,0 +1,120 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import tensorflow as tf
+
+from naivenmt.decoders import AttentionDecoder
+from naivenmt.encoders import ConvEncoder
+from naivenmt.tests import common_test_utils as common_utils
+
+
+class ConvEncoderTest(tf.test.TestCase):
+
+  def testConvEncoder(self):
+    for unit_type in ["lstm", "gru"]:
+      for time_major in [True, False]:
+        configs = {
+          "unit_type": unit_type,
+          "encoder_type": "conv",
+          "num_encoder_layers": 2,
+          "time_major": time_major
+        }
+        encoder = ConvEncoder(params=common_utils.get_params(configs))
+        inputs, inputs_length = common_utils.get_encoder_test_inputs(
+          time_major=time_major)
+        outputs, states = encoder.encode(
+          mode=tf.estimator.ModeKeys.TRAIN,
+          sequence_inputs=tf.constant(inputs),
+          sequence_length=tf.constant(inputs_length))
+        self.assertEqual(2, len(states))
+
+        with self.test_session() as sess:
+          sess.run(tf.global_variables_initializer())
+          outputs, states = sess.run([outputs, states])
+          self.assertAllEqual(inputs.shape, outputs.shape)
+          for state in states:
+            if unit_type == "lstm":
+              # (states_c, states_h)
+              self.assertAllEqual(
+                [common_utils.BATCH_SIZE, common_utils.DEPTH], state[0].shape)
+              self.assertAllEqual(state[0], state[1])
+            else:
+              self.assertAllEqual(
+                [common_utils.BATCH_SIZE, common_utils.DEPTH], state.shape)
+
+  def testConvEncoderPaddingIsMasked(self):
+    configs = {
+      "encoder_type": "conv",
+      "num_encoder_layers": 2,
+      "time_major": False
+    }
+    encoder = ConvEncoder(params=common_utils.get_params(configs))
+    inputs, inputs_length = common_utils.get_encoder_test_inputs()
+    outputs, _ = encoder.encode(
+      mode=tf.estimator.ModeKeys.PREDICT,
+      sequence_inputs=tf.constant(inputs),
+      sequence_length=tf.constant(inputs_length))
+    # the same sequences, padded with other values
+    padded_inputs = inputs.copy()
+    padded_inputs[inputs == 0] = 9
+    padded_outputs, _ = encoder.encode(
+      mode=tf.estimator.ModeKeys.PREDICT,
+      sequence_inputs=tf.constant(padded_inputs),
+      sequence_length=tf.constant(inputs_length))
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      outputs, padded_outputs = sess.run([outputs, padded_outputs])
+      for i, length in enumerate(inputs_length):
+        self.assertAllClose(outputs[i, :length], padded_outputs[i, :length])
+
+  def testConvEncoderWithAttentionDecoder(self):
+    configs = {
+      "unit_type": "lstm",
+      "encoder_type": "conv",
+      "num_encoder_layers": 2,
+      "num_decoder_layers": 2,
+      "attention": "luong",
+      "pass_hidden_state": True,
+      "time_major": True
+    }
+    params = common_utils.get_params(configs)
+    encoder = ConvEncoder(params=params)
+    decoder = AttentionDecoder(
+      params=params,
+      embedding=common_utils.get_embedding(params),
+      sos_id=tf.to_int32(1),
+      eos_id=tf.to_int32(2))
+    inputs, inputs_length = common_utils.get_encoder_test_inputs(
+      time_major=True)
+    encoder_outputs, encoder_state = encoder.encode(
+      mode=tf.estimator.ModeKeys.TRAIN,
+      sequence_inputs=tf.constant(inputs),
+      sequence_length=tf.constant(inputs_length))
+    logits, _, _ = decoder.decode(
+      mode=tf.estimator.ModeKeys.TRAIN,
+      encoder_outputs=encoder_outputs,
+      encoder_state=encoder_state,
+      labels=common_utils.get_labels(),
+      src_seq_len=tf.constant(inputs_length))
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      logits = sess.run(logits)
+      self.assertEqual(common_utils.BATCH_SIZE, logits.shape[1])
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -60,6 +60,65 @@ class DatasetUtilsTest(tf.test.TestCase):
         print(sess.run(labels['tgt_out']))
         print()
 
+  def testBuildTimeMajorTrainingDataset(self):
+    hparams = HParamsBuilder(self.getDatasetRequiredParams()).build()
+    features, labels = dataset_utils.build_dataset(
+      hparams, tf.estimator.ModeKeys.TRAIN, time_major=True)
+    with self.test_session() as sess:
+      sess.run(tf.tables_initializer())
+      sess.run(tf.get_collection(collection_utils.ITERATOR))
+
+      src, src_len, tgt_in, tgt_out, tgt_len = sess.run(
+        [features['inputs'], features['inputs_length'],
+         labels['tgt_in'], labels['tgt_out'], labels['tgt_len']])
+      # sequences are [T, B]
+      self.assertEqual(4, src.shape[1])
+      self.assertEqual(max(src_len), src.shape[0])
+      self.assertEqual(4, tgt_in.shape[1])
+      self.assertEqual(max(tgt_len), tgt_out.shape[0])
+
+  def testBuildReplicatedTrainingDataset(self):
+    hparams = HParamsBuilder(self.getDatasetRequiredParams()).build()
+    dataset = dataset_utils.build_replicated_train_dataset(
+      hparams, num_replicas=2)
+    features, labels = dataset.make_one_shot_iterator().get_next()
+    with self.test_session() as sess:
+      sess.run(tf.tables_initializer())
+      for _ in range(4):
+        src, src_len, tgt_in = sess.run(
+          [features['inputs'], features['inputs_length'], labels['tgt_in']])
+        self.assertEqual(4, src.shape[0])
+        self.assertEqual(max(src_len), src.shape[1])
+        self.assertEqual(4, tgt_in.shape[0])
+
+  def testBuildTrainingDatasetPaddedToBuckets(self):
+    configs = self.getDatasetRequiredParams()
+    configs.update({"xla_jit": True, "src_max_len": 20, "tgt_max_len": 20})
+    hparams = HParamsBuilder(configs).build()
+    features, labels = dataset_utils.build_dataset(
+      hparams, tf.estimator.ModeKeys.TRAIN)
+    with self.test_session() as sess:
+      sess.run(tf.tables_initializer())
+      sess.run(tf.get_collection(collection_utils.ITERATOR))
+      for _ in range(5):
+        src, tgt_in, tgt_out = sess.run(
+          [features['inputs'], labels['tgt_in'], labels['tgt_out']])
+        # buckets of width 4, the last one up to tgt_max_len + 1
+        self.assertIn(src.shape[1], [4, 8, 12, 16, 20, 21])
+        self.assertEqual(src.shape[1], tgt_in.shape[1])
+        self.assertEqual(src.shape[1], tgt_out.shape[1])
+
+  def testPadToBucketWidth(self):
+    hparams = HParamsBuilder(self.getDatasetRequiredParams()).build()
+    src = tf.constant([["a", "b", "c"]])
+    padded = dataset_utils.pad_to_bucket_width(src, hparams, axis=1)
+    # 50 / 5 buckets
+    with self.test_session() as sess:
+      padded = sess.run(padded)
+      self.assertAllEqual([1, 10], padded.shape)
+      self.assertAllEqual([b"a", b"b", b"c"], padded[0, :3])
+      self.assertAllEqual([hparams.eos.encode()] * 7, padded[0, 3:])
+
 
 if __name__ == "__main__":
   tf.test.main()
@@ -0,0 +1,120 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.utils import ema_utils
+from naivenmt.utils import gradient_utils
+
+
+class EmaUtilsTest(tf.test.TestCase):
+
+  def testApplyMovingAverage(self):
+    weights = tf.Variable([1.0, 2.0], name="weights")
+    global_step = tf.train.get_or_create_global_step()
+    train_op = tf.group(weights.assign_add([1.0, 1.0]),
+                        global_step.assign_add(1))
+    train_op = ema_utils.apply_moving_average(
+      train_op, [weights], 0.5, global_step)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      sess.run(global_step.assign(89))
+      sess.run(train_op)
+      self.assertAllClose([1.5, 2.5], sess.run(
+        tf.global_variables("weights/ExponentialMovingAverage")[0]))
+
+  def testApplyMovingAverageWarmUp(self):
+    weights = tf.Variable([1.0, 2.0], name="weights")
+    global_step = tf.train.get_or_create_global_step()
+    train_op = ema_utils.apply_moving_average(
+      weights.assign_add([1.0, 1.0]), [weights], 0.5, global_step)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      sess.run(train_op)
+      # decay is 0.1 at step 0
+      self.assertAllClose([1.9, 2.9], sess.run(
+        tf.global_variables("weights/ExponentialMovingAverage")[0]))
+
+  def testApplyMovingAverageInScope(self):
+    with tf.variable_scope("model"):
+      weights = tf.get_variable("weights", initializer=[1.0, 2.0])
+      global_step = tf.train.get_or_create_global_step()
+      ema_utils.apply_moving_average(
+        weights.assign_add([1.0, 1.0]), [weights], 0.5, global_step)
+    self.assertEqual(
+      ["model/weights/ExponentialMovingAverage"],
+      [v.op.name for v in tf.global_variables()
+       if v.op.name.endswith(ema_utils.AVERAGES)])
+
+  def testApplyMovingAverageAccumulated(self):
+    weights = tf.Variable([1.0, 2.0], name="weights")
+    inputs = tf.placeholder(tf.float32, shape=[2])
+    loss = tf.reduce_sum(weights * inputs)
+    global_step = tf.train.get_or_create_global_step()
+    train_op = gradient_utils.accumulate_gradients(
+      tf.train.GradientDescentOptimizer(1.0),
+      [(tf.gradients(loss, weights)[0], weights)],
+      global_step,
+      accumulate_steps=2)
+    train_op = ema_utils.apply_moving_average(
+      train_op, [weights], 0.5, global_step, applied=train_op)
+    averages = tf.global_variables("weights/ExponentialMovingAverage")[0]
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      sess.run(global_step.assign(100))
+      # averages are left as they are until the gradients are applied
+      sess.run(train_op, feed_dict={inputs: [1.0, 3.0]})
+      self.assertAllClose([1.0, 2.0], sess.run(averages))
+      sess.run(train_op, feed_dict={inputs: [3.0, 5.0]})
+      weights_1 = sess.run(weights)
+      self.assertAllClose([-1.0, -2.0], weights_1)
+      averages_1 = 0.5 * np.array([1.0, 2.0]) + 0.5 * weights_1
+      self.assertAllClose(averages_1, sess.run(averages))
+      sess.run(train_op, feed_dict={inputs: [2.0, 2.0]})
+      self.assertAllClose(averages_1, sess.run(averages))
+      sess.run(train_op, feed_dict={inputs: [2.0, 2.0]})
+      weights_2 = sess.run(weights)
+      self.assertAllClose([-3.0, -4.0], weights_2)
+      self.assertAllClose(0.5 * averages_1 + 0.5 * weights_2,
+                          sess.run(averages))
+
+  def testAveragedVariablesToRestore(self):
+    ckpt = os.path.join(self.get_temp_dir(), "model.ckpt")
+    with tf.Graph().as_default():
+      weights = tf.get_variable("weights", initializer=[1.0, 2.0])
+      global_step = tf.train.get_or_create_global_step()
+      train_op = ema_utils.apply_moving_average(
+        tf.group(weights.assign([3.0, 4.0]), global_step.assign(100)),
+        [weights], 0.5, global_step)
+      with self.test_session() as sess:
+        sess.run(tf.global_variables_initializer())
+        sess.run(train_op)
+        tf.train.Saver().save(sess, ckpt)
+
+    with tf.Graph().as_default():
+      weights = tf.get_variable("weights", initializer=[0.0, 0.0])
+      global_step = tf.train.get_or_create_global_step()
+      with self.test_session() as sess:
+        tf.train.Saver(ema_utils.averaged_variables_to_restore()).restore(
+          sess, ckpt)
+        self.assertAllClose([2.0, 3.0], sess.run(weights))
+        self.assertEqual(100, sess.run(global_step))
+
+
+if __name__ == "__main__":
+  tf.test.main()
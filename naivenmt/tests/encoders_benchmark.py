@@ -0,0 +1,113 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark encoders on CPU.
+
+  python -m naivenmt.tests.encoders_benchmark --benchmarks=.
+"""
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.encoders import BasicEncoder
+from naivenmt.encoders import GNMTEncoder
+from naivenmt.tests import common_test_utils as common_utils
+
+BATCH_SIZE = 64
+TIME_STEPS = 50
+NUM_UNITS = 512
+
+
+class EncodersBenchmark(tf.test.Benchmark):
+
+  def _run(self, name, configs, num_cpu_devices=1, encoder_cls=BasicEncoder):
+    """Benchmark the encoder of `configs`, returns the wall time."""
+    configs.update({
+      "num_units": NUM_UNITS,
+      "source_embedding_size": NUM_UNITS,
+      "dropout": 0.0,
+      "time_major": True
+    })
+    session_config = tf.ConfigProto(
+      device_count={"CPU": num_cpu_devices},
+      inter_op_parallelism_threads=2 * num_cpu_devices)
+    with tf.Graph().as_default(), tf.Session(config=session_config) as sess:
+      encoder = encoder_cls(params=common_utils.get_params(configs))
+      inputs = tf.constant(
+        np.random.randn(TIME_STEPS, BATCH_SIZE, NUM_UNITS).astype(np.float32))
+      inputs_length = tf.fill([BATCH_SIZE], TIME_STEPS)
+      outputs, _ = encoder.encode(
+        tf.estimator.ModeKeys.PREDICT, inputs, inputs_length)
+      sess.run(tf.global_variables_initializer())
+      return self.run_op_benchmark(
+        sess, tf.group(outputs), min_iters=20, name=name)["wall_time"]
+
+  def benchmarkBidirectionalEncoder(self):
+    base_configs = {
+      "unit_type": "lstm",
+      "encoder_type": "bi",
+      "num_encoder_layers": 2,
+      "num_encoder_residual_layers": 0
+    }
+    # a single direction, the lower bound of the bidirectional layer
+    configs = dict(base_configs, encoder_type="uni", num_encoder_layers=1)
+    self._run("uni_1_layer", configs)
+    self._run("bi_1_layer", dict(base_configs))
+    for parallel_iterations in [1, 32]:
+      configs = dict(
+        base_configs,
+        bi_encoder_devices="/cpu:0,/cpu:1",
+        encoder_parallel_iterations=parallel_iterations)
+      self._run("bi_1_layer_2_devices_%d_parallel_iterations" %
+                parallel_iterations,
+                configs, num_cpu_devices=2)
+
+  def benchmarkUnitTypes(self):
+    for unit_type in ["lstm", "lstm_block_fused", "gru", "sru"]:
+      configs = {
+        "unit_type": unit_type,
+        "encoder_type": "uni",
+        "num_encoder_layers": 4,
+        "num_encoder_residual_layers": 0
+      }
+      self._run("uni_4_layers_%s" % unit_type, configs)
+
+  def benchmarkGNMTEncoderLayerDevices(self):
+    base_configs = {
+      "unit_type": "lstm",
+      "encoder_type": "gnmt",
+      "num_encoder_layers": 8,
+      "num_encoder_residual_layers": 6
+    }
+    baseline = self._run(
+      "gnmt_8_layers", dict(base_configs), encoder_cls=GNMTEncoder)
+    # split the host into sockets, e.g. one device per socket
+    for num_devices in [2, 4]:
+      configs = dict(
+        base_configs,
+        layer_devices=",".join("/cpu:%d" % i for i in range(num_devices)))
+      name = "gnmt_8_layers_%d_devices" % num_devices
+      wall_time = self._run(name, configs,
+                            num_cpu_devices=num_devices,
+                            encoder_cls=GNMTEncoder)
+      # the layers placed round robin against all of them on one device
+      self.report_benchmark(
+        name="%s_vs_1_device" % name,
+        wall_time=wall_time,
+        extras={"baseline_wall_time": baseline,
+                "speedup": baseline / wall_time})
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -37,7 +37,7 @@ class GNMTEncoderTest(tf.test.TestCase):
     """
     inputs_ph = tf.placeholder(
       dtype=tf.float32,
-      shape=(None, common_utils.TIME_STEPS, common_utils.DEPTH))
+      shape=(common_utils.TIME_STEPS, None, common_utils.DEPTH))
     inputs_length_ph = tf.placeholder(dtype=tf.int32, shape=(None))
 
     outputs, states = encoder.encode(
@@ -72,7 +72,8 @@ class GNMTEncoderTest(tf.test.TestCase):
         states_list.append(states_uni[i])
       states = tf.convert_to_tensor(states_list)
 
-    inputs, inputs_length = common_utils.get_encoder_test_inputs()
+    inputs, inputs_length = common_utils.get_encoder_test_inputs(
+      time_major=True)
     with self.test_session() as sess:
       sess.run(tf.global_variables_initializer())
       outputs, states = sess.run(
@@ -108,7 +109,7 @@ class GNMTEncoderTest(tf.test.TestCase):
 
     inputs_ph = tf.placeholder(
       dtype=tf.float32,
-      shape=(None, common_utils.TIME_STEPS, common_utils.DEPTH))
+      shape=(common_utils.TIME_STEPS, None, common_utils.DEPTH))
     inputs_length_ph = tf.placeholder(dtype=tf.int32, shape=(None))
 
     outputs, states = encoder.encode(
@@ -140,7 +141,8 @@ class GNMTEncoderTest(tf.test.TestCase):
         states_list.append(states_uni[i])
       states = tf.convert_to_tensor(states_list)
 
-    inputs, inputs_length = common_utils.get_encoder_test_inputs()
+    inputs, inputs_length = common_utils.get_encoder_test_inputs(
+      time_major=True)
     with self.test_session() as sess:
       sess.run(tf.global_variables_initializer())
       outputs, states = sess.run(
@@ -187,6 +189,30 @@ class GNMTEncoderTest(tf.test.TestCase):
       encoder = GNMTEncoder(params=common_utils.get_params(configs))
       self.runLSTMEncoder(encoder, num_layers)
 
+  def testGNMTLSTMBlockEncoder(self):
+    for unit_type in ["lstm_block", "lstm_block_fused"]:
+      for num_layers in [NUM_LAYERS_2, NUM_LAYERS_4, NUM_LAYERS_6]:
+        configs = {
+          "unit_type": unit_type,
+          "encoder_type": "gnmt",
+          "forget_bias": 1.0,
+          "num_encoder_layers": num_layers
+        }
+        encoder = GNMTEncoder(params=common_utils.get_params(configs))
+        self.runLSTMEncoder(encoder, num_layers)
+
+  def testGNMTLSTMEncoderOnLayerDevices(self):
+    for unit_type in ["lstm", "lstm_block_fused"]:
+      configs = {
+        "unit_type": unit_type,
+        "encoder_type": "gnmt",
+        "forget_bias": 1.0,
+        "num_encoder_layers": NUM_LAYERS_4,
+        "layer_devices": "/cpu:0,/cpu:0"
+      }
+      encoder = GNMTEncoder(params=common_utils.get_params(configs))
+      self.runLSTMEncoder(encoder, NUM_LAYERS_4)
+
   def testGNMTNASEncoder(self):
     for num_layers in [NUM_LAYERS_2, NUM_LAYERS_4, NUM_LAYERS_6]:
       configs = {
@@ -0,0 +1,60 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.utils import gradient_utils
+
+
+class GradientUtilsTest(tf.test.TestCase):
+
+  def testAccumulateGradients(self):
+    weights = tf.Variable([1.0, 2.0])
+    embedding = tf.Variable(np.ones([4, 2], dtype=np.float32))
+    inputs = tf.placeholder(tf.float32, shape=[2])
+    ids = tf.placeholder(tf.int32, shape=[None])
+    loss = (tf.reduce_sum(weights * inputs) +
+            tf.reduce_sum(tf.nn.embedding_lookup(embedding, ids)))
+    variables = [weights, embedding]
+    global_step = tf.train.get_or_create_global_step()
+    train_op = gradient_utils.accumulate_gradients(
+      tf.train.GradientDescentOptimizer(1.0),
+      list(zip(tf.gradients(loss, variables), variables)),
+      global_step,
+      accumulate_steps=2)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      # nothing is applied until the second micro-batch
+      self.assertFalse(
+        sess.run(train_op, feed_dict={inputs: [1.0, 3.0], ids: [0, 1]}))
+      self.assertAllClose([1.0, 2.0], sess.run(weights))
+      self.assertEqual(0, sess.run(global_step))
+      self.assertTrue(
+        sess.run(train_op, feed_dict={inputs: [3.0, 5.0], ids: [1]}))
+      self.assertAllClose([-1.0, -2.0], sess.run(weights))
+      self.assertAllClose([[0.5, 0.5], [0.0, 0.0], [1.0, 1.0], [1.0, 1.0]],
+                          sess.run(embedding))
+      self.assertEqual(1, sess.run(global_step))
+      # accumulators are reset after applying
+      sess.run(train_op, feed_dict={inputs: [2.0, 2.0], ids: [3]})
+      sess.run(train_op, feed_dict={inputs: [2.0, 2.0], ids: [3]})
+      self.assertAllClose([-3.0, -4.0], sess.run(weights))
+      self.assertAllClose([0.0, 0.0], sess.run(embedding)[3])
+      self.assertEqual(2, sess.run(global_step))
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,42 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import os
+
+import tensorflow as tf
+
+from naivenmt import launcher
+
+
+class LauncherTest(tf.test.TestCase):
+
+  def testWorkerConfigs(self):
+    out_dir = os.path.join(self.get_temp_dir(), "model")
+    addresses = ["localhost:1234", "localhost:1235"]
+    configs = launcher.worker_configs({"out_dir": out_dir}, 2, addresses)
+    self.assertEqual([0, 1], [c["worker_index"] for c in configs])
+    self.assertEqual(out_dir, configs[0]["out_dir"])
+    self.assertEqual(os.path.join(out_dir, "worker_1"), configs[1]["out_dir"])
+    for c in configs:
+      self.assertEqual(2, c["num_workers"])
+      self.assertEqual("localhost:1234,localhost:1235", c["worker_addresses"])
+
+  def testScalingEfficiency(self):
+    reports = [{"examples_per_sec": 90.0}, {"examples_per_sec": 70.0}]
+    self.assertAllClose(0.8, launcher.scaling_efficiency(reports, 100.0))
+
+
+if __name__ == "__main__":
+  tf.test.main()
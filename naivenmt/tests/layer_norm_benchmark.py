@@ -0,0 +1,67 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark layer normalization.
+
+  python -m naivenmt.tests.layer_norm_benchmark --benchmarks=.
+"""
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.layers import transformer
+
+
+def two_pass_layer_norm(inputs, epsilon=1e-8, scope="layer_norm"):
+  """The previous layer normalization, with the variance computed from the
+  mean in a second pass."""
+  with tf.variable_scope(scope):
+    params_shape = inputs.get_shape()[-1:]
+
+    mean, variance = tf.nn.moments(inputs, [-1], keep_dims=True)
+    beta = tf.get_variable(
+      "beta", params_shape, initializer=tf.zeros_initializer())
+    gamma = tf.get_variable(
+      "gamma", params_shape, initializer=tf.ones_initializer())
+    normalized = (inputs - mean) / ((variance + epsilon) ** .5)
+    outputs = gamma * normalized + beta
+  return outputs
+
+
+class LayerNormBenchmark(tf.test.Benchmark):
+
+  def _run(self, name, layer_norm_fn, shape, backward):
+    with tf.Graph().as_default(), tf.Session() as sess:
+      inputs = tf.Variable(np.random.randn(*shape).astype(np.float32))
+      outputs = [layer_norm_fn(inputs)]
+      if backward:
+        outputs = tf.gradients(outputs, tf.trainable_variables())
+      op = tf.group(*outputs)
+      sess.run(tf.global_variables_initializer())
+      self.run_op_benchmark(
+        sess, op, min_iters=50,
+        name="%s_%s_%s" % (
+          name, "x".join(str(d) for d in shape),
+          "backward" if backward else "forward"))
+
+  def benchmarkLayerNorm(self):
+    for shape in [(64, 50, 512), (32, 100, 1024)]:
+      for backward in [False, True]:
+        self._run("two_pass", two_pass_layer_norm, shape, backward)
+        self._run("single_pass", transformer.layer_norm, shape, backward)
+        self._run("contrib", tf.contrib.layers.layer_norm, shape, backward)
+
+
+if __name__ == "__main__":
+  tf.test.main()
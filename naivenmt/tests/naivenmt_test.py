@@ -1,9 +1,14 @@
+import os
+
 import tensorflow as tf
 import yaml
 
 from naivenmt.configs import HParamsBuilder
 from naivenmt.naivenmt import NaiveNMT
+from naivenmt.naivenmt import create_model
 from naivenmt.tests import common_test_utils as utils
+from naivenmt.utils import ckpt_utils
+from naivenmt.utils import ema_utils
 
 
 class TestNaiveNMT(tf.test.TestCase):
@@ -22,6 +27,44 @@ class TestNaiveNMT(tf.test.TestCase):
     nmt = NaiveNMT(hparams)
     nmt.train()
 
+  def testTrainAndEvalAsyncCheckpoints(self):
+    out_dir = os.path.join(self.get_temp_dir(), "async_ckpt")
+    hparams = utils.get_model_test_params(
+      out_dir, {"async_ckpt": True, "keep_ckpt_max": 0})
+    model = create_model("basic_model", hparams)
+    nmt = NaiveNMT(hparams=hparams, model=model)
+    nmt.train_and_eval()
+
+    state = tf.train.get_checkpoint_state(out_dir)
+    self.assertEqual(
+      [os.path.join(out_dir, "model.ckpt-%d" % step) for step in [2, 4]],
+      list(state.all_model_checkpoint_paths))
+    # the evaluator evaluated the checkpoints of training
+    self.assertTrue(tf.gfile.Glob(os.path.join(out_dir, "eval", "events.*")))
+
+
+  def testTrainWithMovingAveragesAndRestore(self):
+    out_dir = os.path.join(self.get_temp_dir(), "moving_averages")
+    hparams = utils.get_model_test_params(out_dir, {"ema_decay": 0.9})
+    model = create_model("basic_model", hparams)
+    NaiveNMT(hparams=hparams, model=model).train()
+    ckpt = tf.train.latest_checkpoint(out_dir)
+    reader = tf.train.load_checkpoint(ckpt)
+
+    with tf.Graph().as_default():
+      receiver = model.serving_input_receiver_fn()
+      spec = model.model_fn(
+        receiver.features, None, tf.estimator.ModeKeys.PREDICT, hparams)
+      variables = tf.trainable_variables()
+      self.assertTrue(variables)
+      with self.test_session() as sess:
+        spec.scaffold.saver.restore(sess, ckpt)
+        for variable in variables:
+          name, _ = ckpt_utils.checkpoint_name_and_slice(variable)
+          # the averages of the variables of the model scope
+          self.assertAllClose(
+            reader.get_tensor("%s/%s" % (name, ema_utils.AVERAGES)),
+            sess.run(variable))
 
 if __name__ == "__main__":
   tf.test.main()
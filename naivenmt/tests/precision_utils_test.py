@@ -0,0 +1,103 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.layers import transformer
+from naivenmt.naivenmt import create_model
+from naivenmt.tests import common_test_utils as utils
+from naivenmt.utils import precision_utils
+
+
+class PrecisionUtilsTest(tf.test.TestCase):
+
+  def testComputeDtype(self):
+    self.assertEqual(tf.bfloat16, precision_utils.compute_dtype("bfloat16"))
+    self.assertEqual(tf.float32, precision_utils.variable_dtype(tf.float16))
+    self.assertEqual(tf.float32, precision_utils.variable_dtype(tf.float32))
+    with self.assertRaises(ValueError):
+      precision_utils.compute_dtype("int32")
+
+  def testFloat32VariableGetter(self):
+    inputs = tf.constant(np.random.randn(2, 8), dtype=tf.bfloat16)
+    with tf.variable_scope(
+        "model", custom_getter=precision_utils.float32_variable_getter):
+      outputs = tf.layers.dense(inputs, 4, name="dense")
+    self.assertEqual(tf.bfloat16, outputs.dtype)
+    variables = tf.trainable_variables()
+    self.assertEqual(2, len(variables))
+    for v in variables:
+      self.assertEqual(tf.float32, v.dtype.base_dtype)
+
+    loss = tf.reduce_sum(tf.to_float(outputs))
+    gradients = tf.gradients(loss, variables)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      for g in sess.run(gradients):
+        self.assertEqual(np.float32, g.dtype)
+        self.assertTrue(np.all(np.isfinite(g)))
+
+  def testReducedPrecisionLayerNorm(self):
+    inputs = np.random.randn(2, 3, 8).astype(np.float32) + 100.0
+    expected = transformer.layer_norm(tf.constant(inputs), scope="fp32")
+    with tf.variable_scope(
+        "bf16", custom_getter=precision_utils.float32_variable_getter):
+      outputs = transformer.layer_norm(
+        tf.cast(tf.constant(inputs), tf.bfloat16))
+    self.assertEqual(tf.bfloat16, outputs.dtype)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      expected, outputs = sess.run([expected, tf.to_float(outputs)])
+      # the precision of bfloat16 inputs around 100 is 0.5
+      self.assertAllClose(expected, outputs, atol=0.5)
+
+  def testEvaluateInFloat32(self):
+    hparams = utils.get_model_test_params(
+      os.path.join(self.get_temp_dir(), "model"), {"precision": "float16"})
+    model = create_model("basic_model", hparams, dtype=tf.float16)
+    for mode, dtype in [(tf.estimator.ModeKeys.TRAIN, tf.float16),
+                        (tf.estimator.ModeKeys.EVAL, tf.float32)]:
+      with tf.Graph().as_default():
+        features, labels = model.input_fn(hparams, mode)
+        model.model_fn(features, labels, mode, hparams)
+        self.assertEqual(dtype, model.embedding.dtype)
+        self.assertEqual(dtype, model.decoder.dtype)
+        for v in tf.global_variables():
+          self.assertNotEqual(tf.float16, v.dtype.base_dtype)
+
+  def testDynamicLossScaling(self):
+    weights = tf.Variable(1.0)
+    scale = tf.placeholder(tf.float32, shape=[])
+    loss = weights * scale
+    opt = precision_utils.loss_scale_optimizer(
+      tf.train.GradientDescentOptimizer(0.1), init_loss_scale=8.0)
+    global_step = tf.train.get_or_create_global_step()
+    train_op = opt.apply_gradients(
+      opt.compute_gradients(loss, var_list=[weights]), global_step)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      sess.run(train_op, feed_dict={scale: 1.0})
+      self.assertAllClose(0.9, sess.run(weights))
+      # the step of non-finite gradients is skipped
+      sess.run(train_op, feed_dict={scale: np.inf})
+      self.assertAllClose(0.9, sess.run(weights))
+      self.assertEqual(1, sess.run(global_step))
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,48 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.layers import rnn_cells
+
+
+class RNNCellsTest(tf.test.TestCase):
+
+  def testDynamicSRU(self):
+    """Running over whole sequences is the same as stepping the cell."""
+    sequence_length = tf.constant([5, 3])
+    for depth in [4, 6]:
+      inputs = tf.constant(np.random.randn(5, 2, depth).astype(np.float32))
+      with tf.variable_scope("sru_%d" % depth):
+        outputs, state = rnn_cells.dynamic_sru(
+          rnn_cells.SRUCell(4, reuse=tf.AUTO_REUSE, name="sru_cell"), inputs,
+          sequence_length=sequence_length, dtype=tf.float32, time_major=True)
+        num_variables = len(tf.global_variables())
+        expected_outputs, expected_state = tf.nn.dynamic_rnn(
+          rnn_cells.SRUCell(4, reuse=True), inputs,
+          sequence_length=sequence_length, dtype=tf.float32, time_major=True,
+          scope=tf.get_variable_scope())
+        # the stepped cell shares the variables
+        self.assertEqual(num_variables, len(tf.global_variables()))
+      with self.test_session() as sess:
+        sess.run(tf.global_variables_initializer())
+        self.assertAllEqual([5, 2, 4], outputs.get_shape().as_list())
+        self.assertAllClose(*sess.run([expected_outputs, outputs]))
+        self.assertAllClose(*sess.run([expected_state, state]))
+
+
+if __name__ == "__main__":
+  tf.test.main()
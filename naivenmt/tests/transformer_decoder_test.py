@@ -0,0 +1,146 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.decoders import TransformerDecoder
+from naivenmt.tests import common_test_utils as common_utils
+
+
+class TransformerDecoderTest(tf.test.TestCase):
+
+  @staticmethod
+  def buildDecoder(**kwargs):
+    configs = {
+      "num_decoder_layers": 2,
+      "num_heads": 2,
+      "ffn_dim": 8,
+      "tgt_max_len_infer": 10
+    }
+    configs.update(kwargs)
+    hparams = common_utils.get_params(configs)
+    embedding = common_utils.get_embedding(hparams)
+    decoder = TransformerDecoder(
+      params=hparams,
+      embedding=embedding,
+      sos_id=tf.to_int32(1),
+      eos_id=tf.to_int32(2))
+    return hparams, decoder
+
+  @staticmethod
+  def getBatchMajorInputs():
+    encoder_outputs, encoder_outputs_length = (
+      common_utils.get_encoder_test_inputs())
+    tgt_in = np.random.randn(
+      common_utils.BATCH_SIZE, common_utils.TIME_STEPS,
+      common_utils.DEPTH).astype(tf.float32.as_numpy_dtype())
+    tgt_len = np.array([5, 4, 5, 3, 5, 4, 5, 3],
+                       dtype=tf.int32.as_numpy_dtype)
+    labels = {
+      "tgt_in": tf.convert_to_tensor(tgt_in),
+      "tgt_out": None,
+      "tgt_len": tf.convert_to_tensor(tgt_len)
+    }
+    return (tf.convert_to_tensor(encoder_outputs),
+            tf.convert_to_tensor(encoder_outputs_length),
+            labels)
+
+  def testTransformerDecoderTrainOrEval(self):
+    hparams, decoder = self.buildDecoder()
+    encoder_outputs, src_seq_len, labels = self.getBatchMajorInputs()
+    for mode in [tf.estimator.ModeKeys.TRAIN, tf.estimator.ModeKeys.EVAL]:
+      logits, predict_ids, _ = decoder.decode(
+        mode=mode,
+        encoder_outputs=encoder_outputs,
+        encoder_state=None,
+        labels=labels,
+        src_seq_len=src_seq_len)
+
+      with self.test_session() as sess:
+        sess.run(tf.global_variables_initializer())
+        logits, predict_ids = sess.run([logits, predict_ids])
+        self.assertAllEqual(
+          [common_utils.BATCH_SIZE, common_utils.TIME_STEPS,
+           hparams.target_vocab_size],
+          logits.shape)
+        self.assertAllEqual(
+          [common_utils.BATCH_SIZE, common_utils.TIME_STEPS],
+          predict_ids.shape)
+
+  def testTransformerDecoderPredict(self):
+    hparams, decoder = self.buildDecoder()
+    encoder_outputs, src_seq_len, _ = self.getBatchMajorInputs()
+    logits, predict_ids, _ = decoder.decode(
+      mode=tf.estimator.ModeKeys.PREDICT,
+      encoder_outputs=encoder_outputs,
+      encoder_state=None,
+      labels=None,
+      src_seq_len=src_seq_len)
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      logits, predict_ids = sess.run([logits, predict_ids])
+      self.assertEqual(common_utils.BATCH_SIZE, predict_ids.shape[0])
+      self.assertLessEqual(predict_ids.shape[1], hparams.tgt_max_len_infer)
+      self.assertEqual(predict_ids.shape[1], logits.shape[1])
+
+  def testTransformerDecoderPredictMatchesFullDecoding(self):
+    _, decoder = self.buildDecoder()
+    encoder_outputs, src_seq_len, _ = self.getBatchMajorInputs()
+    logits, predict_ids, outputs = decoder.decode(
+      mode=tf.estimator.ModeKeys.PREDICT,
+      encoder_outputs=encoder_outputs,
+      encoder_state=None,
+      labels=None,
+      src_seq_len=src_seq_len)
+
+    # run the predicted prefixes through all layers at once
+    batch_size = tf.shape(predict_ids)[0]
+    input_ids = tf.concat(
+      [tf.fill([batch_size, 1], decoder.sos_id), predict_ids[:, :-1]], 1)
+    labels = {
+      "tgt_in": tf.nn.embedding_lookup(decoder.embedding, input_ids),
+      "tgt_out": None,
+      "tgt_len": tf.fill([batch_size], tf.shape(input_ids)[1])
+    }
+    full_logits, _, full_outputs = decoder.decode(
+      mode=tf.estimator.ModeKeys.EVAL,
+      encoder_outputs=encoder_outputs,
+      encoder_state=None,
+      labels=labels,
+      src_seq_len=src_seq_len)
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      logits, full_logits, outputs, full_outputs = sess.run(
+        [logits, full_logits, outputs, full_outputs])
+      self.assertAllClose(full_outputs, outputs, atol=1e-5)
+      self.assertAllClose(full_logits, logits, atol=1e-5)
+
+  def testTransformerDecoderBeamSearchNotSupported(self):
+    _, decoder = self.buildDecoder(beam_width=4)
+    encoder_outputs, src_seq_len, _ = self.getBatchMajorInputs()
+    with self.assertRaises(ValueError):
+      decoder.decode(
+        mode=tf.estimator.ModeKeys.PREDICT,
+        encoder_outputs=encoder_outputs,
+        encoder_state=None,
+        labels=None,
+        src_seq_len=src_seq_len)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -1,11 +1,133 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
 import tensorflow as tf
 
+from naivenmt.encoders import TransformerEncoder
+from naivenmt.layers import transformer
+from naivenmt.tests import common_test_utils as common_utils
+from naivenmt.utils import recompute_utils
+
 
 class TransformerEncoderTest(tf.test.TestCase):
 
   def testTransformerEncoder(self):
-    pass
+    for num_layers in [1, 2]:
+      configs = {
+        "num_encoder_layers": num_layers,
+        "num_heads": 2,
+        "ffn_dim": 8
+      }
+      encoder = TransformerEncoder(params=common_utils.get_params(configs))
+      inputs_ph = tf.placeholder(
+        dtype=tf.float32, shape=(None, None, common_utils.DEPTH))
+      inputs_length_ph = tf.placeholder(dtype=tf.int32, shape=(None))
+
+      outputs, attentions = encoder.encode(
+        mode=tf.estimator.ModeKeys.TRAIN,
+        sequence_inputs=inputs_ph,
+        sequence_length=inputs_length_ph)
+      self.assertEqual(num_layers, len(attentions))
+
+      inputs, inputs_length = common_utils.get_encoder_test_inputs()
+      with self.test_session() as sess:
+        sess.run(tf.global_variables_initializer())
+        outputs, attentions = sess.run(
+          [outputs, attentions],
+          feed_dict={
+            inputs_ph: inputs,
+            inputs_length_ph: inputs_length
+          })
+        # outputs shape: (batch_size, time_steps, depth)
+        self.assertAllEqual(
+          [common_utils.BATCH_SIZE, common_utils.TIME_STEPS,
+           common_utils.DEPTH],
+          outputs.shape)
+        # attention shape: (batch_size, num_heads, time_steps, time_steps)
+        self.assertAllEqual(
+          [common_utils.BATCH_SIZE, 2, common_utils.TIME_STEPS,
+           common_utils.TIME_STEPS],
+          attentions[0].shape)
+
+  def testTransformerEncoderRecomputeGrad(self):
+    configs = {
+      "num_encoder_layers": 2,
+      "num_heads": 2,
+      "ffn_dim": 8,
+      "recompute_grad": True
+    }
+    encoder = TransformerEncoder(params=common_utils.get_params(configs))
+    inputs_ph = tf.placeholder(
+      dtype=tf.float32, shape=(None, None, common_utils.DEPTH))
+    inputs_length_ph = tf.placeholder(dtype=tf.int32, shape=(None))
+
+    outputs, _ = encoder.encode(
+      mode=tf.estimator.ModeKeys.TRAIN,
+      sequence_inputs=inputs_ph,
+      sequence_length=inputs_length_ph)
+    params = tf.trainable_variables()
+    grads = tf.gradients(tf.reduce_sum(outputs), [inputs_ph] + params)
+    for grad in grads:
+      self.assertIsNotNone(grad)
+
+    inputs, inputs_length = common_utils.get_encoder_test_inputs()
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      grads = sess.run(
+        grads,
+        feed_dict={
+          inputs_ph: inputs,
+          inputs_length_ph: inputs_length
+        })
+      self.assertAllEqual(inputs.shape, grads[0].shape)
+
+
+  def testRecomputeGradMatchesEncoderLayer(self):
+    configs = {
+      "num_encoder_layers": 1,
+      "num_heads": 2,
+      "ffn_dim": 8,
+      "dropout": 0.5
+    }
+    encoder = TransformerEncoder(params=common_utils.get_params(configs))
+    inputs, inputs_length = common_utils.get_encoder_test_inputs()
+    inputs = tf.constant(inputs)
+    attention_mask = transformer.padding_mask(
+      tf.constant(inputs_length), tf.shape(inputs)[1])
+
+    def layer_fn(x):
+      # the same seeded dropout masks in both layers
+      return encoder.encoder_layer(x, attention_mask, 0.5, seed=1)[0]
+
+    with tf.variable_scope("layer"):
+      recomputed = recompute_utils.recompute_grad(layer_fn, inputs)
+    # the same variables, created by the recomputed layer
+    with tf.variable_scope("layer", reuse=True):
+      outputs = layer_fn(inputs)
+    params = tf.trainable_variables()
+    recomputed_grads = tf.gradients(
+      tf.reduce_sum(tf.square(recomputed)), [inputs] + params)
+    grads = tf.gradients(tf.reduce_sum(tf.square(outputs)), [inputs] + params)
 
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      recomputed, outputs, recomputed_grads, grads = sess.run(
+        [recomputed, outputs, recomputed_grads, grads])
+      self.assertAllClose(outputs, recomputed)
+      for grad, recomputed_grad in zip(grads, recomputed_grads):
+        self.assertAllClose(grad, recomputed_grad)
 
 if __name__ == '__main__':
   tf.test.main()
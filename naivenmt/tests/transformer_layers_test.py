@@ -0,0 +1,122 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.layers import transformer
+
+
+class TransformerLayersTest(tf.test.TestCase):
+
+  def testPositionalEncoding(self):
+    inputs_ph = tf.placeholder(dtype=tf.float32, shape=(None, None, 6))
+    outputs = transformer.positional_encoding(inputs_ph, 6, max_length=50)
+    # the table is only added to the graph once
+    transformer.positional_encoding(inputs_ph, 6, max_length=50)
+    self.assertEqual(1, len(tf.get_collection("positional_encoding_50_6")))
+
+    table = transformer.positional_encoding_table(50, 6)
+    self.assertAllEqual([50, 6], table.shape)
+    self.assertAllClose(np.sin(3.0), table[3, 0])
+    self.assertAllClose(np.cos(3.0 / 10000 ** (2.0 / 6)), table[3, 3])
+    with self.test_session() as sess:
+      for batch_size, time_steps in [(2, 7), (3, 11)]:
+        encoding = sess.run(outputs, feed_dict={
+          inputs_ph: np.zeros([batch_size, time_steps, 6])})
+        self.assertAllEqual([1, time_steps, 6], encoding.shape)
+        self.assertAllClose(table[:time_steps], encoding[0])
+
+  def testLayerNorm(self):
+    inputs = np.random.randn(2, 3, 8).astype(np.float32) + 5.0
+    outputs = transformer.layer_norm(tf.constant(inputs))
+    # variables are reused by the same scope
+    with tf.variable_scope(tf.get_variable_scope(), reuse=True):
+      transformer.layer_norm(tf.constant(inputs))
+    self.assertEqual(2, len(tf.global_variables()))
+
+    mean = inputs.mean(axis=-1, keepdims=True)
+    std = inputs.std(axis=-1, keepdims=True)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      self.assertAllClose((inputs - mean) / std, sess.run(outputs), atol=1e-4)
+
+  def testLayerNormFarFromZero(self):
+    # the variance is cancelled out by E[x^2] - E[x]^2 of unshifted inputs
+    inputs = np.random.randn(2, 3, 8).astype(np.float32) + 1e4
+    outputs = transformer.layer_norm(tf.constant(inputs))
+    expected = inputs.astype(np.float64)
+    expected = ((expected - expected.mean(axis=-1, keepdims=True)) /
+                expected.std(axis=-1, keepdims=True))
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      self.assertAllClose(expected, sess.run(outputs), atol=1e-4)
+
+  def testPaddingMask(self):
+    mask = transformer.padding_mask(tf.constant([3, 1]), 4)
+    with self.test_session() as sess:
+      mask = sess.run(mask)
+      self.assertAllEqual([2, 1, 1, 4], mask.shape)
+      self.assertAllEqual([[1, 1, 1, 0], [1, 0, 0, 0]], mask[:, 0, 0, :])
+
+  def testSequenceMask(self):
+    mask = transformer.sequence_mask(3)
+    with self.test_session() as sess:
+      mask = sess.run(mask)
+      self.assertAllEqual([1, 1, 3, 3], mask.shape)
+      self.assertAllEqual([[1, 0, 0], [1, 1, 0], [1, 1, 1]], mask[0, 0])
+
+  def testSplitAndCombineHeads(self):
+    inputs = np.random.randn(2, 3, 8).astype(np.float32)
+    heads = transformer.split_heads(tf.constant(inputs), 4)
+    outputs = transformer.combine_heads(heads)
+    with self.test_session() as sess:
+      heads, outputs = sess.run([heads, outputs])
+      self.assertAllEqual([2, 4, 3, 2], heads.shape)
+      self.assertAllClose(inputs[:, :, 2:4], heads[:, 1, :, :])
+      self.assertAllClose(inputs, outputs)
+
+  def testChunkedDotProductAttention(self):
+    q = tf.constant(np.random.randn(2, 3, 7, 4).astype(np.float32))
+    k = tf.constant(np.random.randn(2, 3, 5, 4).astype(np.float32))
+    v = tf.constant(np.random.randn(2, 3, 5, 4).astype(np.float32))
+    padding = transformer.padding_mask(tf.constant([5, 3]), 5)
+    causal = tf.constant(np.tril(np.ones([7, 5]), 0).astype(np.float32))
+    for mask in [None, padding, padding * causal[None, None, :, :]]:
+      expected, _ = transformer.scaled_dot_product_attention(
+        q, k, v, scale=0.5, mask=mask, dropout=0.0)
+      with self.test_session() as sess:
+        for chunk_size in [1, 2, 3, 8]:
+          outputs = transformer.chunked_dot_product_attention(
+            q, k, v, scale=0.5, mask=mask, dropout=0.0, chunk_size=chunk_size)
+          self.assertAllClose(*sess.run([expected, outputs]), atol=1e-5)
+
+  def testMultiheadAttention(self):
+    queries = tf.constant(np.random.randn(2, 3, 8).astype(np.float32))
+    memory = tf.constant(np.random.randn(2, 5, 8).astype(np.float32))
+    mask = transformer.padding_mask(tf.constant([5, 2]), 5)
+    outputs, attention = transformer.multihead_attention(
+      queries, memory, num_heads=4, dropout=0.0, mask=mask)
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      outputs, attention = sess.run([outputs, attention])
+      self.assertAllEqual([2, 3, 8], outputs.shape)
+      self.assertAllEqual([2, 4, 3, 5], attention.shape)
+      # padded keys get no attention
+      self.assertAllClose(np.zeros([4, 3, 3]), attention[1, :, :, 2:])
+
+
+if __name__ == "__main__":
+  tf.test.main()
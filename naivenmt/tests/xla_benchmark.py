@@ -0,0 +1,84 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark a training step compiled by XLA on CPU.
+
+  python -m naivenmt.tests.xla_benchmark --benchmarks=.
+"""
+
+import numpy as np
+import tensorflow as tf
+
+from naivenmt.encoders import BasicEncoder
+from naivenmt.tests import common_test_utils as common_utils
+from naivenmt.utils import device_utils
+
+BATCH_SIZE = 64
+NUM_UNITS = 256
+VOCAB_SIZE = 8000
+
+
+class XlaBenchmark(tf.test.Benchmark):
+
+  def _run(self, name, time_steps, xla_jit):
+    """Benchmark a training step, returns the wall time."""
+    configs = {
+      "unit_type": "lstm",
+      "encoder_type": "uni",
+      "num_encoder_layers": 2,
+      "num_encoder_residual_layers": 0,
+      "num_units": NUM_UNITS,
+      "source_embedding_size": NUM_UNITS,
+      "dropout": 0.0,
+      "time_major": True
+    }
+    with tf.Graph().as_default(), tf.Session() as sess:
+      encoder = BasicEncoder(params=common_utils.get_params(configs))
+      inputs = tf.constant(np.random.randn(
+        time_steps, BATCH_SIZE, NUM_UNITS).astype(np.float32))
+      labels = tf.constant(np.random.randint(
+        VOCAB_SIZE, size=[time_steps, BATCH_SIZE]).astype(np.int32))
+      with device_utils.jit_scope(xla_jit):
+        outputs, _ = encoder.encode(
+          tf.estimator.ModeKeys.TRAIN, inputs,
+          tf.fill([BATCH_SIZE], time_steps))
+        # luong attention of the outputs over themselves
+        memory = tf.transpose(outputs, [1, 0, 2])  # [B,T,D]
+        scores = tf.matmul(memory, memory, transpose_b=True)
+        context = tf.matmul(tf.nn.softmax(scores), memory)
+        logits = tf.layers.dense(tf.concat([memory, context], -1), VOCAB_SIZE)
+        loss = tf.reduce_mean(tf.nn.sparse_softmax_cross_entropy_with_logits(
+          labels=tf.transpose(labels), logits=logits))
+      train_op = tf.train.GradientDescentOptimizer(0.1).minimize(loss)
+      sess.run(tf.global_variables_initializer())
+      # the first run compiles
+      sess.run(train_op)
+      name = "%s_%d_steps_%s" % (name, time_steps, "xla" if xla_jit else "tf")
+      return self.run_op_benchmark(
+        sess, train_op, min_iters=20, name=name)["wall_time"]
+
+  def benchmarkTrainingStep(self):
+    # sequences padded to the buckets of width 10
+    for time_steps in [10, 30, 50]:
+      baseline = self._run("lstm_attention_loss", time_steps, False)
+      wall_time = self._run("lstm_attention_loss", time_steps, True)
+      self.report_benchmark(
+        name="lstm_attention_loss_%d_steps_xla_vs_tf" % time_steps,
+        wall_time=wall_time,
+        extras={"baseline_wall_time": baseline,
+                "speedup": baseline / wall_time})
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,298 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Ring all-reduce of gradients between training processes over sockets."""
+
+import socket
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+
+_ring = None
+
+
+def parse_address(address):
+  """Parse a "host:port" address to a (host, port) tuple."""
+  host, port = address.strip().rsplit(":", 1)
+  return host, int(port)
+
+
+def free_ports(num_ports, host="localhost"):
+  """Find `num_ports` distinct free ports of `host`."""
+  sockets = []
+  try:
+    for _ in range(num_ports):
+      s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+      s.bind((host, 0))
+      sockets.append(s)
+    return [s.getsockname()[1] for s in sockets]
+  finally:
+    for s in sockets:
+      s.close()
+
+
+class RingAllReduce(object):
+  """Ring all-reduce between processes, https://arxiv.org/abs/1802.05799.
+
+  Each worker connects to the next one of the ring. Arrays are split into a
+  chunk per worker, which are summed while passed around the ring once, then
+  gathered while passed around once more, so each worker sends and receives
+  2 * (size - 1) / size of the array, whatever the number of workers.
+  """
+
+  def __init__(self, rank, addresses, timeout=120.0):
+    """Init ring and connect to the neighbours.
+
+    Args:
+      rank: A integer, index of this worker in `addresses`
+      addresses: A list of "host:port" addresses of all workers
+      timeout: A float, seconds to wait for the neighbours, to connect or to
+      exchange data, after which `TimeoutError` is raised
+    """
+    self.rank = rank
+    self.size = len(addresses)
+    self.timeout = timeout
+    self._send_socket = None
+    self._recv_socket = None
+    if self.size == 1:
+      return
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(parse_address(addresses[rank]))
+    listener.listen(1)
+    listener.settimeout(timeout)
+    try:
+      self._send_socket = self._connect(
+        parse_address(addresses[(rank + 1) % self.size]), timeout)
+      self._recv_socket, _ = listener.accept()
+    finally:
+      listener.close()
+    for s in [self._send_socket, self._recv_socket]:
+      # a worker that exits or hangs fails the others, instead of blocking
+      s.settimeout(timeout)
+      s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+  @staticmethod
+  def _connect(address, timeout):
+    deadline = time.time() + timeout
+    while True:
+      try:
+        return socket.create_connection(address, timeout=timeout)
+      except (ConnectionRefusedError, socket.timeout):
+        # the neighbour may not listen yet
+        if time.time() > deadline:
+          raise
+        time.sleep(0.1)
+
+  def _timeout_error(self, peer):
+    return TimeoutError(
+      "Ring all-reduce got no data exchanged with worker %d in %.0f seconds." %
+      (peer % self.size, self.timeout))
+
+  def _recv_into(self, buf):
+    view = memoryview(buf).cast("B")
+    while view:
+      try:
+        n = self._recv_socket.recv_into(view)
+      except socket.timeout:
+        raise self._timeout_error(self.rank - 1)
+      if not n:
+        raise ConnectionError("Ring connection closed by worker %d." %
+                              ((self.rank - 1) % self.size))
+      view = view[n:]
+
+  def _exchange(self, send_chunk, recv_buf):
+    """Send a chunk to the next worker while receiving from the previous."""
+    errors = []
+
+    def _send():
+      try:
+        self._send_socket.sendall(send_chunk.tobytes())
+      except socket.timeout:
+        errors.append(self._timeout_error(self.rank + 1))
+      except Exception as e:
+        errors.append(e)
+
+    sender = threading.Thread(target=_send)
+    sender.start()
+    self._recv_into(recv_buf)
+    sender.join()
+    if errors:
+      raise errors[0]
+
+  def allreduce(self, array):
+    """Sum `array` over all workers.
+
+    Args:
+      array: A numpy array, of the same shape and dtype in all workers
+
+    Returns:
+      A numpy array, the sum
+    """
+    result = np.array(array, copy=True)
+    if self.size == 1:
+      return result
+    chunks = np.array_split(result.reshape([-1]), self.size)
+    buf = np.empty_like(chunks[0])
+    # reduce-scatter, chunk (rank + 1) % size ends up summed on each worker
+    for step in range(self.size - 1):
+      send_id = (self.rank - step) % self.size
+      recv_id = (self.rank - step - 1) % self.size
+      recv_buf = buf[:chunks[recv_id].size]
+      self._exchange(chunks[send_id], recv_buf)
+      chunks[recv_id] += recv_buf
+    # all-gather the summed chunks
+    for step in range(self.size - 1):
+      send_id = (self.rank - step + 1) % self.size
+      recv_id = (self.rank - step) % self.size
+      # chunks are views of the result, received in place
+      self._exchange(chunks[send_id], chunks[recv_id])
+    return result
+
+  def allgather(self, array):
+    """Concatenate `array` of all workers along the first dimension, in the
+    order of their ranks.
+
+    Args:
+      array: A numpy array, of the same dtype and the same shape but the first
+        dimension in all workers
+
+    Returns:
+      A numpy array, the concatenation
+    """
+    array = np.ascontiguousarray(array)
+    if self.size == 1:
+      return array.copy()
+    counts = np.zeros([self.size], dtype=np.int64)
+    counts[self.rank] = array.shape[0]
+    counts = self.allreduce(counts)
+    blocks = [None] * self.size
+    blocks[self.rank] = array
+    # pass each block around the ring once
+    for step in range(self.size - 1):
+      send_id = (self.rank - step) % self.size
+      recv_id = (self.rank - step - 1) % self.size
+      blocks[recv_id] = np.empty(
+        [counts[recv_id]] + list(array.shape[1:]), dtype=array.dtype)
+      self._exchange(blocks[send_id], blocks[recv_id])
+    return np.concatenate(blocks, axis=0)
+
+  def broadcast(self, array, root=0):
+    """Broadcast `array` of worker `root` around the ring.
+
+    Args:
+      array: A numpy array, of the same shape and dtype in all workers
+      root: A integer, rank of the worker whose array is broadcast
+
+    Returns:
+      A numpy array, the array of `root`
+    """
+    result = np.array(array, copy=True)
+    if self.size == 1:
+      return result
+    if self.rank != root:
+      self._recv_into(result)
+    if (self.rank + 1) % self.size != root:
+      try:
+        self._send_socket.sendall(result.tobytes())
+      except socket.timeout:
+        raise self._timeout_error(self.rank + 1)
+    return result
+
+  def close(self):
+    for s in [self._send_socket, self._recv_socket]:
+      if s is not None:
+        s.close()
+
+
+def init_ring(rank, addresses, timeout=120.0):
+  """Connect this process to the ring used by `allreduce_gradients`."""
+  global _ring
+  if _ring is not None:
+    _ring.close()
+  _ring = RingAllReduce(rank, addresses, timeout=timeout)
+  return _ring
+
+
+def get_ring():
+  return _ring
+
+
+def allreduce_gradients(gradients, variables, ring=None):
+  """Average gradients over the workers of a ring, in the graph.
+
+  Dense gradients are packed into a single buffer, so a step does one
+  all-reduce. The rows of `tf.IndexedSlices` gradients, e.g. of embeddings,
+  are all-gathered instead of densified. All exchanges of a step run in a
+  single op, in the same order in all workers.
+
+  Args:
+    gradients: A list of gradients, tensors, `tf.IndexedSlices` or None
+    variables: A list of variables of `gradients`
+    ring: A `RingAllReduce`, defaults to the ring of `init_ring`
+
+  Returns:
+    A list of averaged gradients, `tf.IndexedSlices` of the rows of all
+    workers for `tf.IndexedSlices`, None for None gradients.
+  """
+  ring = ring or get_ring()
+  if ring is None:
+    raise ValueError("Ring is not initialized, call init_ring first.")
+  if ring.size == 1:
+    return gradients
+
+  dense = [(g, v) for g, v in zip(gradients, variables)
+           if g is not None and not isinstance(g, tf.IndexedSlices)]
+  sparse = [g for g in gradients if isinstance(g, tf.IndexedSlices)]
+  shapes = [v.get_shape() for _, v in dense]
+  inputs = [tf.concat(
+    [tf.zeros([0], dtype=tf.float32)] +
+    [tf.reshape(tf.cast(g, tf.float32), [-1]) for g, _ in dense], axis=0)]
+  for g in sparse:
+    inputs.extend([tf.to_int64(g.indices), tf.cast(g.values, tf.float32)])
+
+  def _allreduce_mean(flat, *slices):
+    outputs = [ring.allreduce(flat) / ring.size]
+    for i in range(0, len(slices), 2):
+      outputs.append(ring.allgather(slices[i]))
+      outputs.append(ring.allgather(slices[i + 1]) / ring.size)
+    return outputs
+
+  outputs = tf.py_func(
+    _allreduce_mean, inputs, [t.dtype for t in inputs], stateful=True)
+  outputs[0].set_shape(inputs[0].get_shape())
+  for output, t in zip(outputs[1:], inputs[1:]):
+    # rows of all workers
+    output.set_shape(tf.TensorShape([None]).concatenate(t.get_shape()[1:]))
+  reduced = []
+  if shapes:
+    reduced = tf.split(outputs[0], [s.num_elements() for s in shapes])
+
+  dense_outputs = iter(
+    tf.cast(tf.reshape(r, s), g.dtype)
+    for r, s, (g, _) in zip(reduced, shapes, dense))
+  sparse_outputs = iter(
+    tf.IndexedSlices(tf.cast(values, g.values.dtype), indices, g.dense_shape)
+    for indices, values, g in zip(outputs[1::2], outputs[2::2], sparse))
+  results = []
+  for g in gradients:
+    if g is None:
+      results.append(None)
+    elif isinstance(g, tf.IndexedSlices):
+      results.append(next(sparse_outputs))
+    else:
+      results.append(next(dense_outputs))
+  return results
@@ -0,0 +1,131 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import collections
+import sys
+import threading
+
+
+def normalize_source(sentence):
+  """Normalize a source sentence to the key of its translation.
+
+  Sentences are split on whitespace, the same as the input pipeline does, so
+  sentences that only differ in spacing share a key.
+
+  Args:
+    sentence: A string or bytes, source sentence
+
+  Returns:
+    A tuple of tokens
+  """
+  if isinstance(sentence, bytes):
+    sentence = sentence.decode("utf8")
+  return tuple(sentence.split())
+
+
+def _size_of(key, value):
+  """Approximate memory of a cache entry, in bytes."""
+  return (sys.getsizeof(key) + sum(sys.getsizeof(t) for t in key) +
+          sys.getsizeof(value))
+
+
+class TranslationCache(object):
+  """LRU cache of translations, keyed by normalized source tokens.
+
+  Entries are evicted from the least recently used one when the memory of the
+  entries exceeds `max_bytes`. Lookups are counted as hits and misses.
+  """
+
+  def __init__(self, max_bytes):
+    """Init cache.
+
+    Args:
+      max_bytes: A integer, memory cap of the entries, 0 disables the cache
+    """
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.size_bytes = 0
+    self._entries = collections.OrderedDict()
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, key):
+    """Get the translation of `key`, None if it is not cached."""
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        self.misses += 1
+        return None
+      self.hits += 1
+      self._entries.move_to_end(key)
+      return entry[0]
+
+  def get_batch(self, keys):
+    """Get the translations of a batch of keys.
+
+    Each occurrence of a key is a lookup. Duplicates of a key in the batch are
+    counted as hits, they are served by the translation of its first one.
+
+    Args:
+      keys: A list of keys
+
+    Returns:
+      found: A dict of the cached keys to their translations
+      missed: A list of the distinct keys not cached, in order of the batch
+    """
+    found = {}
+    missed = collections.OrderedDict()
+    for key in keys:
+      if key in found or key in missed:
+        with self._lock:
+          self.hits += 1
+        continue
+      translation = self.get(key)
+      if translation is None:
+        missed[key] = None
+      else:
+        found[key] = translation
+    return found, list(missed)
+
+  def put(self, key, value):
+    """Cache the translation `value` of `key`."""
+    size = _size_of(key, value)
+    if size > self.max_bytes:
+      return
+    with self._lock:
+      if key in self._entries:
+        self.size_bytes -= self._entries.pop(key)[1]
+      self._entries[key] = (value, size)
+      self.size_bytes += size
+      while self.size_bytes > self.max_bytes:
+        _, (_, evicted_size) = self._entries.popitem(last=False)
+        self.size_bytes -= evicted_size
+        self.evictions += 1
+
+  def metrics(self):
+    """Counters of the cache, as a dict of name to value."""
+    lookups = self.hits + self.misses
+    return {
+      "translation_cache_hits": self.hits,
+      "translation_cache_misses": self.misses,
+      "translation_cache_hit_rate": self.hits / lookups if lookups else 0.0,
+      "translation_cache_evictions": self.evictions,
+      "translation_cache_entries": len(self._entries),
+      "translation_cache_bytes": self.size_bytes
+    }
@@ -13,11 +13,27 @@
 # limitations under the License.
 # ==============================================================================
 
+import collections
 import os
+import re
+import uuid
+from concurrent import futures
 
 import numpy as np
-import six
 import tensorflow as tf
+from tensorflow.python.ops import io_ops
+
+from naivenmt.utils import ema_utils
+
+# variables only used by training: slots of the optimizers, the counters of
+# dynamic loss scaling and gradient accumulation, and the moving averages
+_TRAINING_VARIABLE_PATTERNS = [
+  r".*/Adam(_1)?$",
+  r"(.*/)?beta[12]_power(_\d+)?$",
+  r"(.*/)?(loss_scale|good_steps|bad_steps)$",
+  r"(.*/)?gradient_accumulation/.*",
+  r".*/%s$" % ema_utils.AVERAGES,
+]
 
 
 # This script is modified version of OpenNMT-tf
@@ -39,13 +55,25 @@ import tensorflow as tf
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-def average_ckpts(out_dir, num_ckpts=5, sess_config=None):
+def average_ckpts(out_dir,
+                  num_ckpts=5,
+                  sess_config=None,
+                  num_threads=4,
+                  max_shard_bytes=0):
   """Average checkpoints for better performance.
 
+  Variables are averaged one at a time, reading the checkpoints in parallel,
+  and by default each is written to its own shard of the averaged checkpoint
+  as soon as it is averaged. Peak memory is about `num_threads` + 1 copies of
+  the largest variable, instead of the whole model.
+
   Args:
     out_dir: models' dir
     num_ckpts: number of checkpoints to average
     sess_config: configs for session
+    num_threads: number of threads reading checkpoints
+    max_shard_bytes: size of the averaged values buffered before written, 0
+      writes each variable as it is averaged
   """
   avg_out_dir = os.path.join(out_dir, "avg_checkpoints")
   if not tf.gfile.Exists(avg_out_dir):
@@ -62,61 +90,243 @@ def average_ckpts(out_dir, num_ckpts=5, sess_config=None):
   num_ave_ckpts = len(checkpoints_path)
   tf.logging.info("Averaging %d checkpoints." % num_ave_ckpts)
 
-  var_list = tf.train.list_variables(checkpoints_path[0])
-  avg_values = {}
-  for name, shape in var_list:
-    if not name.startswith("global_step"):
-      avg_values[name] = np.zeros(shape, dtype=np.float32)
+  readers = [tf.train.load_checkpoint(p) for p in checkpoints_path]
+  dtypes = readers[-1].get_variable_to_dtype_map()
+  latest_step = int(checkpoints_path[-1].split("-")[-1])
+  out_prefix = os.path.join(avg_out_dir, "translate.ckpt-%d" % latest_step)
+  writer = CheckpointWriter(out_prefix, max_shard_bytes, sess_config)
+  with futures.ThreadPoolExecutor(num_threads) as executor:
+    for name in sorted(dtypes):
+      if dtypes[name].is_floating:
+        value = _average_variable(
+          executor, readers, name, dtypes[name], num_threads)
+      else:
+        # e.g. global_step, taken from the latest checkpoint
+        value = readers[-1].get_tensor(name)
+      writer.add(name, value)
+  writer.close()
+  tf.logging.info("Saved new checkpoint to %s" % avg_out_dir)
+  tf.train.update_checkpoint_state(avg_out_dir, out_prefix)
+  return avg_out_dir
 
-  for checkpoint_path in checkpoints_path:
-    tf.logging.info("Loading checkpoint %s" % checkpoint_path)
-    reader = tf.train.load_checkpoint(checkpoint_path)
-    for name in avg_values:
-      avg_values[name] += reader.get_tensor(name) / num_ave_ckpts
 
-  return _save_new_variables(avg_values,
-                             avg_out_dir,
-                             checkpoints_path[-1],
-                             session_config=sess_config)
+def _average_variable(executor, readers, name, dtype, num_threads):
+  """Average variable `name` of `readers`, with at most `num_threads`
+  values read at the same time."""
+  reads = iter(readers)
+  pending = collections.deque(
+    executor.submit(reader.get_tensor, name)
+    for reader, _ in zip(reads, range(num_threads)))
+  acc_dtype = np.float64 if dtype == tf.float64 else np.float32
+  total = None
+  while pending:
+    value = pending.popleft().result()
+    reader = next(reads, None)
+    if reader is not None:
+      pending.append(executor.submit(reader.get_tensor, name))
+    if total is None:
+      total = np.array(value, dtype=acc_dtype)
+    else:
+      total += value
+  total /= len(readers)
+  return total.astype(dtype.as_numpy_dtype)
 
 
-# This script is most copied from
-# https://github.com/OpenNMT/OpenNMT-tf/blob/master/opennmt/utils/checkpoint.py
-def _save_new_variables(variables,
-                        output_dir,
-                        base_checkpoint_path,
-                        session_config=None):
-  if "global_step" in variables:
-    del variables["global_step"]
-  tf_vars = []
-  for name, value in six.iteritems(variables):
-    trainable = True
-    dtype = tf.as_dtype(value.dtype)
-    if name.startswith("words_per_sec"):
-      trainable = False
-      dtype = tf.int64  # TODO: why is the dtype not correct for these variables?
-    tf_vars.append(tf.get_variable(
-      name,
-      shape=value.shape,
-      dtype=dtype,
-      trainable=trainable))
-  placeholders = [tf.placeholder(v.dtype, shape=v.shape) for v in tf_vars]
-  assign_ops = [tf.assign(v, p) for (v, p) in zip(tf_vars, placeholders)]
-
-  latest_step = int(base_checkpoint_path.split("-")[-1])
-  out_base_file = os.path.join(output_dir, "translate.ckpt")
-  global_step = tf.get_variable(
-    "global_step",
-    initializer=tf.constant(latest_step, dtype=tf.int64),
-    trainable=False)
-  saver = tf.train.Saver(tf.global_variables())
-
-  with tf.Session(config=session_config) as sess:
-    sess.run(tf.global_variables_initializer())
-    for p, assign_op, (name, value) in zip(placeholders, assign_ops,
-                                           six.iteritems(variables)):
-      sess.run(assign_op, {p: value})
-    tf.logging.info("Saving new checkpoint to %s" % output_dir)
-    saver.save(sess, out_base_file, global_step=global_step)
-
-  return output_dir
+class CheckpointWriter(object):
+  """Write numpy values to a checkpoint, without a model graph.
+
+  Values are buffered up to `max_shard_bytes` and written as shards by a save
+  op fed by placeholders, which `close` merges to the checkpoint, the same as
+  the sharded `tf.train.Saver` does.
+  """
+
+  def __init__(self, prefix, max_shard_bytes=256 * 1024 * 1024,
+               session_config=None):
+    """Init writer.
+
+    Args:
+      prefix: A string, prefix of the checkpoint, e.g. dir/model.ckpt-100
+      max_shard_bytes: A integer, size of the values buffered before written
+      session_config: A `tf.ConfigProto`, configs for sessions
+    """
+    self._prefix = prefix
+    self._tmp_prefix = "%s_temp_%s/part" % (prefix, uuid.uuid4().hex)
+    self._max_shard_bytes = max_shard_bytes
+    self._session_config = session_config
+    self._shard_prefixes = []
+    self._names = []
+    self._slice_specs = []
+    self._values = []
+    self._num_bytes = 0
+
+  def add(self, name, value, slice_spec=""):
+    """Add variable `name` of numpy `value` to the checkpoint, or a slice of
+    it, e.g. a partition, if `slice_spec` is set."""
+    self._names.append(name)
+    self._slice_specs.append(slice_spec)
+    self._values.append(value)
+    self._num_bytes += value.nbytes
+    if self._num_bytes >= self._max_shard_bytes:
+      self._write_shard()
+
+  def _write_shard(self):
+    if not self._names:
+      return
+    shard_prefix = "%s-%05d" % (self._tmp_prefix, len(self._shard_prefixes))
+    with tf.Graph().as_default():
+      placeholders = [tf.placeholder(tf.as_dtype(v.dtype), shape=v.shape)
+                      for v in self._values]
+      save_op = io_ops.save_v2(
+        shard_prefix, self._names, self._slice_specs, placeholders)
+      with tf.Session(config=self._session_config) as sess:
+        sess.run(save_op, feed_dict=dict(zip(placeholders, self._values)))
+    self._shard_prefixes.append(shard_prefix)
+    self._names, self._slice_specs, self._values = [], [], []
+    self._num_bytes = 0
+
+  def close(self):
+    """Write the buffered values and merge the shards to the checkpoint."""
+    self._write_shard()
+    if not self._shard_prefixes:
+      return
+    with tf.Graph().as_default():
+      merge_op = io_ops.merge_v2_checkpoints(
+        self._shard_prefixes, self._prefix, delete_old_dirs=True)
+      with tf.Session(config=self._session_config) as sess:
+        sess.run(merge_op)
+
+
+def is_training_variable(name):
+  """Whether variable `name` of a checkpoint is only used by training."""
+  return any(re.match(p, name) for p in _TRAINING_VARIABLE_PATTERNS)
+
+
+def export_slim_ckpt(checkpoint_path,
+                     output_dir,
+                     dtype=None,
+                     use_moving_averages=True,
+                     sess_config=None,
+                     max_shard_bytes=256 * 1024 * 1024):
+  """Export an inference only checkpoint of `checkpoint_path`.
+
+  Optimizer slots and the other training variables are dropped, which makes
+  checkpoints of Adam about a third of the size. The global step is kept,
+  estimators need it to restore checkpoints. Prediction and export load the
+  slim checkpoint with `out_dir` set to `output_dir`.
+
+  Args:
+    checkpoint_path: A string, path of the checkpoint, e.g. model.ckpt-100
+    output_dir: A string, dir of the slim checkpoint
+    dtype: A `tf.DType`, e.g. tf.float16, floating weights are cast to it if set
+    use_moving_averages: A boolean, save the moving averages of weights, if
+      the checkpoint has them, in place of the weights
+    sess_config: configs for session
+    max_shard_bytes: size of the values buffered before written
+
+  Returns:
+    The prefix of the slim checkpoint.
+  """
+  if not tf.gfile.Exists(output_dir):
+    tf.gfile.MakeDirs(output_dir)
+  reader = tf.train.load_checkpoint(checkpoint_path)
+  dtypes = reader.get_variable_to_dtype_map()
+  prefix = os.path.join(
+    output_dir, os.path.basename(checkpoint_path.rstrip("/")))
+  writer = CheckpointWriter(prefix, max_shard_bytes, sess_config)
+  num_bytes = 0
+  for name in sorted(dtypes):
+    if is_training_variable(name):
+      continue
+    averages = "%s/%s" % (name, ema_utils.AVERAGES)
+    if use_moving_averages and averages in dtypes:
+      value = reader.get_tensor(averages)
+    else:
+      value = reader.get_tensor(name)
+    if dtype is not None and dtypes[name].is_floating:
+      value = value.astype(dtype.as_numpy_dtype)
+    num_bytes += value.nbytes
+    writer.add(name, value)
+  writer.close()
+  tf.train.update_checkpoint_state(output_dir, prefix)
+  tf.logging.info("Saved slim checkpoint of %d bytes to %s" %
+                  (num_bytes, prefix))
+  return prefix
+
+
+def checkpoint_name_and_slice(variable):
+  """Name and slice spec of `variable` in checkpoints, partitions are slices
+  of the variable of the full name."""
+  if variable._save_slice_info is not None:
+    return variable._save_slice_info.full_name, variable._save_slice_info.spec
+  return variable.op.name, ""
+
+
+class InferenceSaver(tf.train.Saver):
+  """A saver restoring checkpoints to the variables of inference graphs.
+
+  It saves as a plain sharded `tf.train.Saver`, e.g. the variables of exported
+  SavedModels, which reload them as they are. Restoring reads the checkpoint
+  it is given: the moving averages of weights are restored in place of the
+  weights if they are used and the checkpoint has them, which slim checkpoints
+  do not, weights stored in other dtypes, e.g. float16 of slim checkpoints,
+  are cast to the variables' dtypes, and partitions are sliced from their
+  variables. Values are assigned by the initializers of the variables, in a
+  single run, which also works in finalized graphs. A checkpoint having the moving averages of
+  only some of the weights is an error.
+  """
+
+  def __init__(self, use_moving_averages=False):
+    """Init saver of the global variables of the current graph.
+
+    Args:
+      use_moving_averages: A boolean, restore the moving averages or not
+    """
+    super(InferenceSaver, self).__init__(sharded=True)
+    self.use_moving_averages = use_moving_averages
+    self._variables = tf.global_variables()
+    self._trainable_variables = set(tf.trainable_variables())
+
+  def restore(self, sess, save_path):
+    tf.logging.info("Restoring parameters from %s" % save_path)
+    reader = tf.train.load_checkpoint(save_path)
+    dtypes = reader.get_variable_to_dtype_map()
+    names = []
+    averaged, not_averaged = set(), set()
+    for variable in self._variables:
+      name, _ = checkpoint_name_and_slice(variable)
+      averages = "%s/%s" % (name, ema_utils.AVERAGES)
+      if self.use_moving_averages and averages in dtypes:
+        averaged.add(name)
+        name = averages
+      elif variable in self._trainable_variables:
+        not_averaged.add(name)
+      names.append(name)
+    if self.use_moving_averages and not_averaged:
+      if averaged:
+        raise ValueError(
+          "Checkpoint %s has moving averages, but not of %s" %
+          (save_path, sorted(not_averaged)))
+      tf.logging.warning(
+        "Checkpoint %s has no moving averages, restoring the weights in "
+        "place of them" % save_path)
+
+    variables_by_name = collections.OrderedDict()
+    for variable, name in zip(self._variables, names):
+      variables_by_name.setdefault(name, []).append(variable)
+    # the same as `Variable.load`, for all the variables in a single run
+    feed_dict = {}
+    for name, variables in variables_by_name.items():
+      # read once for all the partitions of the variable
+      value = reader.get_tensor(name)
+      for variable in variables:
+        slice_info = variable._save_slice_info
+        if slice_info is not None:
+          part = value[tuple(
+            slice(offset, offset + size)
+            for offset, size in zip(slice_info.var_offset,
+                                    slice_info.var_shape))]
+        else:
+          part = value
+        feed_dict[variable._initializer_op.inputs[1]] = part.astype(
+          variable.dtype.base_dtype.as_numpy_dtype, copy=False)
+    sess.run([v._initializer_op for v in self._variables], feed_dict=feed_dict)
@@ -0,0 +1,81 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Parameter server clusters of asynchronous training.
+
+A cluster is configured by a JSON file of the addresses of its tasks, e.g.
+
+  {"ps": ["localhost:2222", "localhost:2223"],
+   "worker": ["localhost:2224", "localhost:2225"]}
+
+The first worker is the chief of `tf.estimator`, which initializes variables
+and saves checkpoints. With parameter servers in its TF_CONFIG, `tf.estimator`
+builds the graph under a `tf.train.replica_device_setter` of the cluster, which
+places variables, e.g. each partition of the embeddings, on the parameter
+servers round robin, and the other ops on the worker.
+"""
+
+import json
+
+import tensorflow as tf
+
+
+def load_cluster(cluster_file):
+  """Load a cluster of {"ps": [addresses], "worker": [addresses]}."""
+  with open(cluster_file, mode="rt", encoding="utf8") as f:
+    cluster = json.load(f)
+  if not cluster.get("worker"):
+    raise ValueError("Cluster must have at least one worker.")
+  return {
+    "ps": list(cluster.get("ps", [])),
+    "worker": list(cluster["worker"])
+  }
+
+
+def estimator_cluster(cluster):
+  """Cluster of `tf.estimator`, with the first worker as the chief."""
+  jobs = {"chief": cluster["worker"][:1]}
+  if cluster["worker"][1:]:
+    jobs["worker"] = cluster["worker"][1:]
+  if cluster["ps"]:
+    jobs["ps"] = cluster["ps"]
+  return jobs
+
+
+def estimator_task(task_type, task_index):
+  """Task of `tf.estimator` of a task of the cluster."""
+  if task_type == "worker":
+    return ("chief", 0) if task_index == 0 else ("worker", task_index - 1)
+  return task_type, task_index
+
+
+def cluster_spec(cluster):
+  return tf.train.ClusterSpec(estimator_cluster(cluster))
+
+
+def tf_config(cluster, task_type, task_index):
+  """TF_CONFIG environment variable of a task, read by `tf.estimator`."""
+  job, index = estimator_task(task_type, task_index)
+  return json.dumps({
+    "cluster": estimator_cluster(cluster),
+    "task": {"type": job, "index": index}
+  })
+
+
+def device_filters(task_type, task_index):
+  """Devices a task talks to, workers do not wait for each other."""
+  job, index = estimator_task(task_type, task_index)
+  if job == "ps":
+    return ["/job:ps", "/job:chief", "/job:worker"]
+  return ["/job:ps", "/job:%s/task:%d" % (job, index)]
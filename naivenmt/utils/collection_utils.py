@@ -23,7 +23,7 @@ PREDICTIONS = "predictions"
 def add_dict_to_collection(name, tensors_dict):
   keys = name + "_keys"
   values = name + "_values"
-  for k, v in tensors_dict:
+  for k, v in tensors_dict.items():
     tf.add_to_collection(keys, k)
     tf.add_to_collection(values, v)
 
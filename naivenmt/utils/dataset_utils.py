@@ -19,18 +19,88 @@ from naivenmt.utils import collection_utils
 from naivenmt.utils import constants
 
 
-def build_dataset(params, mode):
+def build_dataset(params, mode, time_major=False):
+  """Build (features, labels) of `mode`.
+
+  Args:
+    params: hparams
+    mode: A python string, one of tf.estimator.ModeKeys
+    time_major: A python boolean. If True, the sequences in features and labels
+      are transposed to [T, B] in the input pipeline, otherwise they are [B, T]
+
+  Returns:
+    A (features, labels) tuple.
+  """
   if mode == tf.estimator.ModeKeys.TRAIN:
-    return build_train_dataset(params)
+    return build_train_dataset(params, time_major)
   elif mode == tf.estimator.ModeKeys.EVAL:
-    return build_eval_dataset(params)
+    return build_eval_dataset(params, time_major)
   elif mode == tf.estimator.ModeKeys.PREDICT:
-    return build_predict_dataset(params)
+    return build_predict_dataset(params, time_major)
   else:
     raise ValueError("Invalid mode %s" % mode)
 
 
-def build_train_or_eval_dataset(src_file, tgt_file, params):
+def build_train_or_eval_dataset(src_file,
+                                tgt_file,
+                                params,
+                                num_shards=1,
+                                shard_index=0,
+                                repeat=False,
+                                time_major=False):
+  dataset = _build_train_or_eval_dataset(
+    src_file, tgt_file, params,
+    num_shards=num_shards, shard_index=shard_index, repeat=repeat,
+    time_major=time_major)
+  iterator = dataset.make_initializable_iterator()
+  tf.add_to_collection(collection_utils.ITERATOR, iterator.initializer)
+  # build (features, labels) tuple from input fn
+  return iterator.get_next()
+
+
+def build_replicated_train_dataset(params, num_replicas, time_major=False):
+  """Build a training dataset of (features, labels) for data parallel
+  replicas.
+
+  The training data is sharded by replicas, and the batches of the shards are
+  interleaved, so that each `num_replicas` successive batches, which a
+  distribution strategy feeds to the replicas of a step, come from distinct
+  shards.
+
+  Args:
+    params: hparams
+    num_replicas: A integer, number of replicas
+    time_major: A python boolean, transpose sequences to [T, B] or not
+
+  Returns:
+    A `tf.data.Dataset` of (features, labels).
+  """
+  shards = tuple(
+    _build_train_or_eval_dataset(
+      src_file=params.source_train_file,
+      tgt_file=params.target_train_file,
+      params=params,
+      num_shards=num_replicas,
+      shard_index=i,
+      time_major=time_major)
+    for i in range(num_replicas))
+
+  def _interleave(*batches):
+    dataset = tf.data.Dataset.from_tensors(batches[0])
+    for batch in batches[1:]:
+      dataset = dataset.concatenate(tf.data.Dataset.from_tensors(batch))
+    return dataset
+
+  return tf.data.Dataset.zip(shards).flat_map(_interleave)
+
+
+def _build_train_or_eval_dataset(src_file,
+                                 tgt_file,
+                                 params,
+                                 num_shards=1,
+                                 shard_index=0,
+                                 repeat=False,
+                                 time_major=False):
   # build dataset
   src_dataset = tf.data.TextLineDataset(src_file)
   tgt_dataset = tf.data.TextLineDataset(tgt_file)
@@ -47,39 +117,50 @@ def build_train_or_eval_dataset(src_file, tgt_file, params):
     tgt_max_len=params.tgt_max_len,
     num_parallel_calls=params.num_parallel_calls,
     buffer_size=params.buff_size,
-    skip_count=params.skip_count)
-  iterator = dataset.make_initializable_iterator()
-  tf.add_to_collection(collection_utils.ITERATOR, iterator.initializer)
-  # build (features, labels) tuple from input fn
-  src, tgt_in, tgt_out, src_len, tgt_len = iterator.get_next()
-  features = {
-    constants.FEATURES_INPUTS: src,
-    constants.FEATURES_INPUTS_LENGTH: src_len
-  }
-  labels = {
-    constants.LABELS_INPUTS: tgt_in,
-    constants.LABELS_OUTPUTS: tgt_out,
-    constants.LABELS_OUTPUTS_LENGTH: tgt_len
-  }
-
-  return features, labels
-
-
-def build_train_dataset(params):
+    skip_count=params.skip_count,
+    num_shards=num_shards,
+    shard_index=shard_index,
+    repeat=repeat,
+    pad_to_bucket=params.xla_jit,
+    time_major=time_major)
+
+  def _to_features_and_labels(src, tgt_in, tgt_out, src_len, tgt_len):
+    features = {
+      constants.FEATURES_INPUTS: src,
+      constants.FEATURES_INPUTS_LENGTH: src_len
+    }
+    labels = {
+      constants.LABELS_INPUTS: tgt_in,
+      constants.LABELS_OUTPUTS: tgt_out,
+      constants.LABELS_OUTPUTS_LENGTH: tgt_len
+    }
+    return features, labels
+
+  return dataset.map(_to_features_and_labels)
+
+
+def build_train_dataset(params, time_major=False):
+  # each training worker reads a distinct shard, repeated so that all workers
+  # of the ring run train_steps steps, whatever the size of their shards
   return build_train_or_eval_dataset(
     src_file=params.source_train_file,
     tgt_file=params.target_train_file,
-    params=params)
+    params=params,
+    num_shards=params.num_workers,
+    shard_index=params.worker_index,
+    repeat=params.num_workers > 1,
+    time_major=time_major)
 
 
-def build_eval_dataset(params):
+def build_eval_dataset(params, time_major=False):
   return build_train_or_eval_dataset(
-    src_file=params.source_eval_file,
-    tgt_file=params.target_eval_file,
-    params=params)
+    src_file=params.source_dev_file,
+    tgt_file=params.target_dev_file,
+    params=params,
+    time_major=time_major)
 
 
-def build_predict_dataset(params):
+def build_predict_dataset(params, time_major=False):
   dataset = tf.data.TextLineDataset(params.inference_input_file)
   dataset = dataset.map(lambda src: tf.string_split([src]).values)
 
@@ -98,6 +179,9 @@ def build_predict_dataset(params):
       params.eos,
       0))
 
+  if time_major:
+    dataset = dataset.map(lambda src, src_len: (tf.transpose(src), src_len))
+
   iterator = dataset.make_initializable_iterator()
   tf.add_to_collection(collection_utils.ITERATOR, iterator.initializer)
   src, src_len = iterator.get_next()
@@ -109,6 +193,34 @@ def build_predict_dataset(params):
   return features, None
 
 
+def bucket_width(src_max_len, num_buckets):
+  """Width of the length buckets of batches."""
+  if src_max_len:
+    return (src_max_len + num_buckets - 1) // num_buckets
+  return 10
+
+
+def pad_to_bucket_width(sequences, params, axis):
+  """Pad string sequences with EOS to a multiple of the bucket width.
+
+  Args:
+    sequences: A 2-d string tensor
+    params: hparams
+    axis: A python integer, the time axis of `sequences`
+
+  Returns:
+    A string tensor, padded along `axis`.
+  """
+  width = bucket_width(params.src_max_len, params.num_buckets)
+  shape = tf.shape(sequences)
+  length = shape[axis]
+  num_paddings = (length + width - 1) // width * width - length
+  paddings_shape = tf.concat(
+    [shape[:axis], [num_paddings], shape[axis + 1:]], 0)
+  return tf.concat(
+    [sequences, tf.fill(paddings_shape, tf.constant(params.eos))], axis)
+
+
 def _build_dataset(src_dataset,
                    tgt_dataset,
                    batch_size,
@@ -123,7 +235,10 @@ def _build_dataset(src_dataset,
                    skip_count=None,
                    num_shards=1,
                    shard_index=0,
-                   reshuffle_each_iteration=True):
+                   repeat=False,
+                   reshuffle_each_iteration=True,
+                   pad_to_bucket=False,
+                   time_major=False):
   if not buffer_size:
     buffer_size = batch_size * 1000
 
@@ -133,6 +248,9 @@ def _build_dataset(src_dataset,
   if skip_count:
     dataset = dataset.skip(skip_count)
 
+  if repeat:
+    dataset = dataset.repeat()
+
   dataset = dataset.shuffle(
     buffer_size=buffer_size,
     seed=random_seed,
@@ -173,13 +291,18 @@ def _build_dataset(src_dataset,
       src, tgt_in, tgt_out, tf.size(src), tf.size(tgt_out)),
     num_parallel_calls=num_parallel_calls).prefetch(buffer_size)
 
-  def batching_func(ds):
+  def batching_func(ds, padded_length=None):
+    # sequences are padded to the longest one of the batch by default
+    if padded_length is None:
+      sequence_shape = tf.TensorShape([None])
+    else:
+      sequence_shape = tf.expand_dims(padded_length, 0)
     return ds.padded_batch(
       batch_size=batch_size,
       padded_shapes=(
-        tf.TensorShape([None]),
-        tf.TensorShape([None]),
-        tf.TensorShape([None]),
+        sequence_shape,
+        sequence_shape,
+        sequence_shape,
         tf.TensorShape([]),
         tf.TensorShape([])),
       padding_values=(
@@ -190,16 +313,27 @@ def _build_dataset(src_dataset,
         0))
 
   if num_buckets > 1:
-    def key_func(unused_1, unused_2, unused_3, src_len, tgt_len):
-      if src_max_len:
-        bucket_width = (src_max_len + num_buckets - 1) // num_buckets
-      else:
-        bucket_width = 10
+    width = bucket_width(src_max_len, num_buckets)
 
-      bucket_id = tf.maximum(src_len // bucket_width, tgt_len // bucket_width)
+    def key_func(unused_1, unused_2, unused_3, src_len, tgt_len):
+      bucket_id = tf.maximum(src_len // width, tgt_len // width)
       return tf.to_int64(tf.minimum(num_buckets, bucket_id))
 
-    def reduce_func(unused_key, windowed_data):
+    def bucket_length(bucket_id):
+      # sequences of bucket k are shorter than (k + 1) * width, the last
+      # bucket holds the longer ones, up to the max lengths if any
+      if src_max_len and tgt_max_len:
+        last_length = max(src_max_len, tgt_max_len + 1)
+      else:
+        last_length = -1
+      return tf.where(bucket_id < num_buckets,
+                      (bucket_id + 1) * width,
+                      tf.constant(last_length, dtype=tf.int64))
+
+    def reduce_func(key, windowed_data):
+      if pad_to_bucket:
+        # static sequence shapes per bucket, e.g. for XLA
+        return batching_func(windowed_data, bucket_length(key))
       return batching_func(windowed_data)
 
     batched_dataset = dataset.apply(
@@ -208,4 +342,13 @@ def _build_dataset(src_dataset,
   else:
     batched_dataset = batching_func(dataset)
 
+  if time_major:
+    # transpose the batches in the input pipeline, so that the model consumes
+    # time major sequences without transposing them on every step
+    batched_dataset = batched_dataset.map(
+      lambda src, tgt_in, tgt_out, src_len, tgt_len: (
+        tf.transpose(src), tf.transpose(tgt_in), tf.transpose(tgt_out),
+        src_len, tgt_len),
+      num_parallel_calls=num_parallel_calls)
+
   return batched_dataset
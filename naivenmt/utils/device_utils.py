@@ -0,0 +1,52 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+
+import contextlib
+
+import tensorflow as tf
+
+
+def parse_devices(devices):
+  """Parse comma separated devices, e.g. "/cpu:0,/cpu:1", to a list."""
+  return [d.strip() for d in devices.split(",") if d.strip()]
+
+
+def layer_device(devices, layer_id):
+  """Device of layer `layer_id`, layers are placed round robin on `devices`.
+
+  Args:
+    devices: A list of devices
+    layer_id: A integer, index of the layer
+
+  Returns:
+    A device string, empty if `devices` is empty, which keeps the device
+      of the enclosing scope.
+  """
+  if not devices:
+    return ""
+  return devices[layer_id % len(devices)]
+
+
+@contextlib.contextmanager
+def _no_scope():
+  yield
+
+
+def jit_scope(xla_jit):
+  """Scope compiling its ops with XLA if `xla_jit`, else a no-op scope."""
+  if xla_jit:
+    return tf.contrib.compiler.jit.experimental_jit_scope(compile_ops=True)
+  return _no_scope()
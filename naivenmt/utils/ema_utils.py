@@ -0,0 +1,70 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Exponential moving averages of weights, maintained in training.
+
+The averages are saved in checkpoints, next to the variables, and restored in
+place of the variables in evaluation, prediction and export.
+"""
+
+import tensorflow as tf
+
+# name of the moving averages, averages are named "<variable name>/AVERAGES"
+AVERAGES = "ExponentialMovingAverage"
+
+
+def apply_moving_average(train_op,
+                         variables,
+                         decay,
+                         global_step,
+                         applied=None):
+  """Update the moving averages of `variables` after `train_op`.
+
+  The decay warms up as min(decay, (1 + step) / (10 + step)), so the averages
+  forget the initial weights quickly. With gradient accumulation, the averages
+  are only moved by the runs which apply the gradients, the other runs update
+  them with a decay of 1, which leaves them as they are. The averages are named
+  "<variable name>/AVERAGES", whatever the variable scope of the caller.
+
+  Args:
+    train_op: A train op
+    variables: A list of variables to average
+    decay: A float, decay of the moving averages
+    global_step: A variable, the global step
+    applied: A boolean tensor, whether `train_op` updated the variables, e.g.
+      the train op of `gradient_utils.accumulate_gradients`, None if it always
+      does
+
+  Returns:
+    A train op, which runs `train_op` and then updates the averages.
+  """
+  with tf.control_dependencies([train_op]):
+    step = tf.to_float(tf.identity(global_step))
+    decay = tf.minimum(decay, (1.0 + step) / (10.0 + step))
+    if applied is not None:
+      decay = tf.where(applied, decay, 1.0)
+    ema = tf.train.ExponentialMovingAverage(decay, name=AVERAGES)
+    # not in the scope of the caller, e.g. the variable scope of a model, which
+    # would prefix the names of the averages
+    with tf.variable_scope(tf.VariableScope(reuse=False, name="")):
+      return ema.apply(variables)
+
+
+def averaged_variables_to_restore():
+  """Names in checkpoints of the variables of the current graph, the moving
+  averages for the trainable variables and the variables' own names for the
+  others, as a dict of `tf.train.Saver`'s var_list."""
+  # the decay does not matter to the names of the averages
+  ema = tf.train.ExponentialMovingAverage(1.0, name=AVERAGES)
+  return ema.variables_to_restore()
@@ -0,0 +1,81 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import tensorflow as tf
+
+
+def accumulate_gradients(opt, grads_and_vars, global_step, accumulate_steps):
+  """Apply the mean of the gradients of `accumulate_steps` micro-batches.
+
+  Gradients are summed into accumulator variables at each step, and applied
+  once every `accumulate_steps` steps, which also increments `global_step`,
+  so the global step counts updates, the same as without accumulation.
+
+  Args:
+    opt: A `tf.train.Optimizer`
+    grads_and_vars: A list of (gradient, variable) pairs of a micro-batch
+    global_step: A variable, incremented when the gradients are applied
+    accumulate_steps: A integer, number of micro-batches of an update
+
+  Returns:
+    A train op, which accumulates and, every `accumulate_steps` runs, applies
+      the gradients. It is a boolean tensor, whether the gradients were
+      applied by this run.
+  """
+  grads_and_vars = [(g, v) for g, v in grads_and_vars if g is not None]
+  with tf.variable_scope("gradient_accumulation"):
+    accumulators = [
+      tf.get_variable(
+        "accumulator_%d" % i,
+        shape=v.get_shape(),
+        dtype=v.dtype.base_dtype,
+        initializer=tf.zeros_initializer(),
+        trainable=False,
+        collections=[tf.GraphKeys.GLOBAL_VARIABLES])
+      for i, (_, v) in enumerate(grads_and_vars)]
+    counter = tf.get_variable(
+      "counter",
+      shape=[],
+      dtype=tf.int32,
+      initializer=tf.zeros_initializer(),
+      trainable=False,
+      collections=[tf.GraphKeys.GLOBAL_VARIABLES])
+
+  accumulate_ops = []
+  for accumulator, (g, _) in zip(accumulators, grads_and_vars):
+    if isinstance(g, tf.IndexedSlices):
+      # only the looked up rows of embeddings
+      accumulate_ops.append(
+        tf.scatter_add(accumulator, g.indices, g.values))
+    else:
+      accumulate_ops.append(tf.assign_add(accumulator, g))
+  with tf.control_dependencies(accumulate_ops):
+    count = tf.assign_add(counter, 1)
+
+  def _apply():
+    apply_op = opt.apply_gradients(
+      [(accumulator / accumulate_steps, v)
+       for accumulator, (_, v) in zip(accumulators, grads_and_vars)],
+      global_step)
+    with tf.control_dependencies([apply_op]):
+      reset_ops = [tf.assign(a, tf.zeros_like(a)) for a in accumulators]
+      reset_ops.append(tf.assign(counter, 0))
+    with tf.control_dependencies(reset_ops):
+      return tf.constant(True)
+
+  return tf.cond(tf.equal(count, accumulate_steps),
+                 _apply,
+                 lambda: tf.constant(False),
+                 name="accumulate_gradients_cond")
@@ -0,0 +1,84 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Mixed precision training, https://arxiv.org/abs/1710.03740.
+
+Models constructed with a reduced precision dtype compute in it in training,
+while their variables are stored in float32, the master weights which
+optimizers update. Evaluation and inference compute in float32.
+"""
+
+import tensorflow as tf
+
+REDUCED_PRECISION_DTYPES = (tf.float16, tf.bfloat16)
+
+
+def compute_dtype(precision):
+  """Dtype of activations of `precision`, float32, float16 or bfloat16."""
+  dtype = tf.as_dtype(precision)
+  if dtype != tf.float32 and dtype not in REDUCED_PRECISION_DTYPES:
+    raise ValueError("Unknown precision %s" % precision)
+  return dtype
+
+
+def is_reduced_precision(dtype):
+  return dtype is not None and (
+    tf.as_dtype(dtype).base_dtype in REDUCED_PRECISION_DTYPES)
+
+
+def variable_dtype(dtype):
+  """Dtype of variables of a model computing in `dtype`."""
+  return tf.float32 if is_reduced_precision(dtype) else dtype
+
+
+def float32_variable_getter(getter, *args, **kwargs):
+  """Custom getter creating variables of reduced precision in float32.
+
+  The float32 variable is read as a tensor of the requested dtype, so the
+  ops using it compute in reduced precision, and its gradients flow back to
+  the float32 variable through the cast.
+  """
+  dtype = kwargs.get("dtype")
+  if not is_reduced_precision(dtype):
+    return getter(*args, **kwargs)
+  kwargs["dtype"] = tf.float32
+  variable = getter(*args, **kwargs)
+  return tf.cast(variable, dtype)
+
+
+def loss_scale_optimizer(opt,
+                         init_loss_scale=2 ** 15,
+                         incr_every_n_steps=2000):
+  """Wrap `opt` with dynamic loss scaling.
+
+  The loss is scaled up before computing gradients, so the small gradients of
+  reduced precision activations do not underflow, and gradients are scaled
+  back before applied. Steps of non-finite gradients are skipped and halve the
+  loss scale, which doubles after `incr_every_n_steps` finite steps.
+
+  Args:
+    opt: A `tf.train.Optimizer`
+    init_loss_scale: A float, initial loss scale
+    incr_every_n_steps: A integer, number of finite steps to double the scale
+
+  Returns:
+    A `tf.contrib.mixed_precision.LossScaleOptimizer`.
+  """
+  manager = tf.contrib.mixed_precision.ExponentialUpdateLossScaleManager(
+    init_loss_scale=init_loss_scale,
+    incr_every_n_steps=incr_every_n_steps,
+    decr_every_n_nan_or_inf=1,
+    incr_ratio=2,
+    decr_ratio=0.5)
+  return tf.contrib.mixed_precision.LossScaleOptimizer(opt, manager)
@@ -0,0 +1,53 @@
+# Copyright 2018 luozhouyang
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import tensorflow as tf
+from tensorflow.python.util import nest
+
+
+def recompute_grad(fn, *inputs):
+  """Call `fn(*inputs)` without keeping its activations for backprop.
+
+  The activations inside `fn` are dropped after the forward pass and `fn` is
+  called again to recompute them when gradients are computed.
+
+  `fn` must create its variables with `tf.get_variable`. They are created as
+  resource variables under the current variable scope and reused by the
+  recomputation. Random ops in `fn` (e.g. dropout) must have an explicit seed,
+  so that the recomputation draws the same values as the forward pass.
+
+  Gradients only flow back to `inputs` and the variables of `fn`, so every
+  tensor that needs a gradient must be passed in `inputs` instead of being
+  captured by `fn`.
+
+  Args:
+    fn: A function that takes tensors and returns a tensor or a nested
+      structure of tensors
+    *inputs: Tensors, the inputs of `fn`
+
+  Returns:
+    The outputs of `fn`, with the same structure.
+  """
+  output_structure = []
+
+  def _flat_fn(*args):
+    outputs = fn(*args)
+    if not output_structure:
+      output_structure.append(outputs)
+    return tuple(nest.flatten(outputs))
+
+  with tf.variable_scope(tf.get_variable_scope(), use_resource=True):
+    flat_outputs = tf.contrib.layers.recompute_grad(_flat_fn)(*inputs)
+  return nest.pack_sequence_as(output_structure[0], list(flat_outputs))
@@ -48,6 +48,34 @@ def get_predictions(predictions, tgt_eos, subword_option):
   return translation
 
 
+def get_translation(output, tgt_eos, subword_option):
+  """Decode the output strings of a single example to text.
+
+  Args:
+    output: A numpy array of tokens, shape is [T], or [T, beam_width] for
+      beam search, whose first beam is used
+    tgt_eos: target sentence's eod-of-sentence symbol.
+    subword_option: subword option
+
+  Returns:
+    Text of the translation.
+  """
+  if tgt_eos:
+    tgt_eos = tgt_eos.encode("utf8")
+  if output.ndim > 1:
+    output = output[:, 0]
+  output = output.tolist()
+
+  if tgt_eos and tgt_eos in output:
+    output = output[:output.index(tgt_eos)]
+
+  if subword_option == "bpe":  # BPE
+    return format_bpe_text(output)
+  elif subword_option == "spm":  # SPM
+    return format_spm_text(output)
+  return format_text(output)
+
+
 # The three functions behind is copied from tensorflow/nmt project.
 
 # Copyright 2017 Google Inc. All Rights Reserved.
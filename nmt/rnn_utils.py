@@ -1,7 +1,6 @@
 import tensorflow as tf
 
 
-# TODO(luozhouyang): ensure MultiRNNCell accepts block RNN cells
 def build_rnn_cells(
         num_layers,
         num_residual_layers,
@@ -10,7 +9,7 @@ def build_rnn_cells(
         dropout,
         forget_bias,
         residual_fn=None):
-    # cudnn cells and block cell are not supported yet.
+    # cudnn cells are not supported yet.
     # if unit_type == "cudnn_lstm":
     #     cells = tf.contrib.cudnn_rnn.CudnnLSTM(num_layers, num_units)
     #     return cells
@@ -26,12 +25,12 @@ def build_rnn_cells(
             cell = tf.nn.rnn_cell.LSTMCell(num_units=num_units, forget_bias=forget_bias)
         elif unit_type == "layer_norm_lstm":
             cell = tf.contrib.rnn.LayerNormBasicLSTMCell(num_units, forget_bias, layer_norm=True)
-        # elif unit_type == "lstm_block_fused_cell":
-        #     cell = tf.contrib.rnn.LSTMBlockFusedCell(num_units=num_units, forget_bias=forget_bias)
-        # elif unit_type == "lstm_block_cell":
-        #     cell = tf.contrib.rnn.LSTMBlockCell(num_units=num_units, forget_bias=forget_bias)
-        # elif unit_type == "gru_block_cell":
-        #     cell = tf.contrib.rnn.GRUBlockCellV2(num_units=num_units)
+        elif unit_type in ["lstm_block", "lstm_block_fused"]:
+            # LSTMBlockFusedCell can not be stepped by MultiRNNCell,
+            # LSTMBlockCell has the same variables.
+            cell = tf.contrib.rnn.LSTMBlockCell(num_units=num_units, forget_bias=forget_bias)
+        elif unit_type == "gru_block":
+            cell = tf.contrib.rnn.GRUBlockCellV2(num_units=num_units)
         elif unit_type == "gru":
             cell = tf.nn.rnn_cell.GRUCell(num_units=num_units)
         elif unit_type == "nas":
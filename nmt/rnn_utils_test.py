@@ -10,9 +10,9 @@ class RNNUtilsTest(unittest.TestCase):
         # cell0 = rnn_utils.build_rnn_cells(2, 1, "cudnn_lstm", 16, 0.5, 1.0, None)
         cell0 = rnn_utils.build_rnn_cells(2, 1, "gru", 16, 0.5, 1.0, None)
         # cell0 = rnn_utils.build_rnn_cells(2, 1, "cudnn_gru", 16, 0.5, 1.0, None)
-        # cell0 = rnn_utils.build_rnn_cells(2, 1, "lstm_block_cell", 16, 0.5, 1.0, None)
-        # cell0 = rnn_utils.build_rnn_cells(2, 1, "lstm_block_fused_cell", 16, 0.5, 1.0, None)
-        # cell0 = rnn_utils.build_rnn_cells(2, 1, "gru_block_cell", 16, 0.5, 1.0, None)
+        cell0 = rnn_utils.build_rnn_cells(2, 1, "lstm_block", 16, 0.5, 1.0, None)
+        cell0 = rnn_utils.build_rnn_cells(2, 1, "lstm_block_fused", 16, 0.5, 1.0, None)
+        cell0 = rnn_utils.build_rnn_cells(2, 1, "gru_block", 16, 0.5, 1.0, None)
         cell0 = rnn_utils.build_rnn_cells(2, 1, "nas", 16, 0.5, 1.0, None)
 
 